@@ -53,6 +53,7 @@ setup(
     extras_require=dict(
         provider_deps_map,
         dev=["twine", "wheel"],
+        fast=["orjson"],
         test=["mypy>=0.780", "coverage>=5.0", "pytest>=6.0", "pylint>=2.6.0", "black==19.10b0"],
         alldns=all_deps_of_all_providers,
     ),
@@ -0,0 +1,102 @@
+"aio.py - AsyncClient, an asyncio driver for certificate orders"
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .client import Client
+from .protocol import AsyncDriver
+
+
+class AsyncClient:
+    """
+    The asyncio counterpart of Client.  It wraps a Client (made from the same
+    arguments, or passed in as client) which supplies the order's protocol
+    core and its bookkeeping, but every wait - status polling, Retry-After,
+    propagation - is an asyncio.sleep, so a single event loop can have
+    thousands of orders waiting at once:
+
+        acme = AcmeSession(account=acct)
+        certs = await asyncio.gather(
+            *(AsyncClient(acme.order(domain_name=n, cert_key=..., provider=p)).get_certificate()
+              for n in names)
+        )
+
+    Orders sharing an AcmeSession share its registration, nonces and
+    connection pool, as with Client.
+
+    This is NOT asynchronous I/O.  Each HTTP request is Client's blocking
+    make_signed_acme_request, and each provider call (setup, unpropagated,
+    clear) the provider's blocking method, run in executor - by default the
+    loop's, which has only a handful of threads.  A thread is tied up for
+    as long as a request is on the wire, so the executor's size is the cap
+    on requests in flight; size it (and the AcmeSession's ACME_POOL_SIZE)
+    for the concurrency wanted.
+    """
+
+    def __init__(
+        self, client: Optional[Client] = None, *, executor: Optional[Executor] = None, **kwargs: Any
+    ) -> None:
+        if client is None:
+            client = Client(**kwargs)
+        elif kwargs:
+            raise ValueError("AsyncClient was passed both a client and Client arguments")
+        self.client = client
+        self.executor = executor
+        self.logger = client.logger
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        "run blocking func(*args) in the executor"
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def get_certificate(self) -> str:
+        "Client.get_certificate's order flow (the sans-IO OrderProtocol), run by an AsyncDriver"
+
+        return await self.issue(finalize=True)
+
+    async def prevalidate(self) -> Dict[str, Any]:
+        "as Client.prevalidate: get the order ready, but don't finalize it"
+
+        return await self.issue(finalize=False)
+
+    async def issue(self, finalize: bool) -> Any:
+        c = self.client
+        c.logger.debug("get_certificate (async)")
+        await self.run(c.acme_register)
+        protocol = await self.run(c.order_protocol)
+        driver = AsyncDriver(
+            send=lambda req: self.run(
+                c.make_signed_acme_request, req.url, req.payload, req.needs_jwk
+            ),
+            provider=c.provider,
+            record=c.protocol_event,
+            executor=self.executor,
+            deadline=c.deadline,
+            cleanup=c.cleanup,
+        )
+        try:
+            return await driver.run(protocol.issue(finalize))
+        except Exception as e:
+            c.logger.error("Error: Unable to issue certificate. error={0}".format(str(e)[:100]))
+            raise
+        finally:
+            c.journal_release()
+
+
+async def get_certificates(clients: Iterable[AsyncClient], *, limit: int = 0) -> List[Any]:
+    """
+    Run many orders concurrently on the current loop, at most limit (if
+    non-zero) at a time.  Returns the certificates, or the exceptions of the
+    orders that failed, in the same order as clients.
+    """
+
+    semaphore = asyncio.Semaphore(limit) if limit else None
+
+    async def one(client: AsyncClient) -> str:
+        if semaphore is None:
+            return await client.get_certificate()
+        async with semaphore:
+            return await client.get_certificate()
+
+    return await asyncio.gather(*(one(c) for c in clients), return_exceptions=True)
@@ -1,11 +1,20 @@
-from typing import Any, Dict, Optional, Sequence, Tuple, Union, cast
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union, cast
 
+import requests
+
+from .clock import Clock, REAL_CLOCK
 from .lib import create_logger, LoggerType
+from .suffix import registered_domain
+from .transport import new_session, PROVIDER_RETRY_METHODS
+from .zones import ZoneIndex, ZoneListType
 
 ChalItemType = Dict[str, str]
 ChalListType = Sequence[ChalItemType]
 ErrataItemType = Tuple[str, str, ChalItemType]
 ErrataListType = Sequence[ErrataItemType]
+ZoneRecordsType = Dict[str, List[ChalItemType]]
 
 
 class ProviderBase:
@@ -22,6 +31,9 @@ class ProviderBase:
         prop_delay: int = 0,
         prop_timeout: int = 0,
         prop_sleep_times: Union[Sequence[int], int] = (1, 2, 4, 8),
+        clock: Optional[Clock] = None,
+        http_timeout: float = 65,
+        http_retries: int = 2,
     ) -> None:
 
         # TypeError if missing, still check that it's a sequencey value; non-str vals, meh
@@ -45,6 +57,36 @@ class ProviderBase:
         else:
             self.prop_sleep_times = (int(cast(int, prop_sleep_times)),)
 
+        # all of the driver's waiting (and the Client's propagation checks) go by this clock
+        self.clock = clock if clock else REAL_CLOCK
+
+        # the driver's own API calls: see the http property
+        self.http_timeout = float(http_timeout)
+        self.http_retries = int(http_retries)
+        self._http: Optional[requests.Session] = None
+        self._http_lock = threading.Lock()
+
+    @property
+    def http(self) -> requests.Session:
+        """
+        A keep-alive requests.Session for the driver's calls to its service's
+        API, created on first use.  Connections are pooled (enough for the
+        driver's max_concurrency), every request gets http_timeout seconds
+        unless it passes its own timeout, and connection errors and 502-504
+        responses to GET, HEAD, PUT and DELETE are retried (http_retries
+        times, with backoff).  POST and PATCH are never retried.
+        """
+
+        with self._http_lock:
+            if self._http is None:
+                self._http = new_session(
+                    pool_size=max(10, getattr(self, "max_concurrency", 1)),
+                    retries=self.http_retries,
+                    methods=PROVIDER_RETRY_METHODS,
+                    timeout=self.http_timeout,
+                )
+            return self._http
+
     def setup(self, challenges: ChalListType) -> ErrataListType:
         raise NotImplementedError("setup method not implemented by %s" % self.__class__)
 
@@ -76,13 +118,40 @@ class DNSProviderBase(ProviderBase):
 
     Accepts the alias optional argument and adds cname_domain and target_domain
     to support the implementation of aliasing in drivers that inherit from it.
+
+    setup and clear group the challenges by zone and then by target name, and
+    hand them to the driver's hooks: the bulk hooks setup_zone and clear_zone
+    get all of a zone's records at once, and if the driver doesn't implement
+    those, the per-record hooks setup_record and clear_record are called for
+    each challenge.  Up to max_concurrency zones (or target names) are worked
+    on at once; a driver declares the limit on its class, and the
+    max_concurrency argument overrides that.
+
+    A driver that implements list_zones gets zone_for from a ZoneIndex of
+    its zones, listed once and then kept for zone_ttl seconds (and in the
+    zone_cache file, if that's given).
     """
 
-    def __init__(self, *, alias: str = "", **kwargs: Any) -> None:
+    max_concurrency = 1
+
+    def __init__(
+        self,
+        *,
+        alias: str = "",
+        max_concurrency: Optional[int] = None,
+        zone_ttl: float = 3600,
+        zone_cache: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
         if "chal_types" not in kwargs:
             kwargs["chal_types"] = ["dns-01"]
         super().__init__(**kwargs)
         self.alias = alias
+        if max_concurrency is not None:
+            self.max_concurrency = max(1, int(max_concurrency))
+        self.zone_index = ZoneIndex(
+            self.list_zones, ttl=float(zone_ttl), path=zone_cache, clock=self.clock
+        )
 
     ### support for using a DNS alias
 
@@ -96,3 +165,146 @@ class DNSProviderBase(ProviderBase):
 
         d = chal["ident_value"]
         return "_acme-challenge." + d if not self.alias else d + "." + self.alias
+
+    ### grouping by zone
+
+    def list_zones(self) -> ZoneListType:
+        "returns {zone name: zone id} for all the zones the driver can change"
+
+        raise NotImplementedError("list_zones method not implemented by %s" % self.__class__)
+
+    def zone_for(self, target: str) -> Any:
+        """
+        returns the zone that target is in, as the driver's hooks want it (a
+        name or the service's zone id).  If the driver implements list_zones
+        this is the id from the listing of the zone with the longest matching
+        suffix; otherwise it assumes the zone is target's registered domain.
+        """
+
+        if not self._implements("list_zones"):
+            return registered_domain(target)
+        found = self.zone_index.lookup(target)
+        if found is None:
+            raise ValueError("No DNS zone found for %s" % target)
+        return found[1]
+
+    def records_by_zone(self, challenges: ChalListType) -> Dict[str, ZoneRecordsType]:
+        "returns {zone: {target: [challenge, ...]}}, keeping the order they were given in"
+
+        zones: Dict[str, ZoneRecordsType] = {}
+        for chal in challenges:
+            target = self.target_domain(chal)
+            zones.setdefault(self.zone_for(target), {}).setdefault(target, []).append(chal)
+        return zones
+
+    def setup(self, challenges: ChalListType) -> ErrataListType:
+        return self._by_zone("setup", challenges, stop_on_failure=True)
+
+    def clear(self, challenges: ChalListType) -> ErrataListType:
+        return self._by_zone("clear", challenges, stop_on_failure=False)
+
+    ### driver hooks - implement the bulk hooks, or the per-record ones
+
+    def setup_zone(self, zone: str, records: ZoneRecordsType) -> ErrataListType:
+        "publish the TXT records for all of records' {target: challenges} in zone"
+
+        raise NotImplementedError("setup_zone method not implemented by %s" % self.__class__)
+
+    def clear_zone(self, zone: str, records: ZoneRecordsType) -> ErrataListType:
+        "remove the TXT records for all of records' {target: challenges} in zone"
+
+        raise NotImplementedError("clear_zone method not implemented by %s" % self.__class__)
+
+    def setup_record(self, target: str, chal: ChalItemType) -> None:
+        "publish one challenge's TXT at target; raises on failure"
+
+        raise NotImplementedError("setup_record method not implemented by %s" % self.__class__)
+
+    def clear_record(self, target: str, chal: ChalItemType) -> None:
+        "remove one challenge's TXT from target; raises on failure"
+
+        raise NotImplementedError("clear_record method not implemented by %s" % self.__class__)
+
+    def _implements(self, hook: str) -> bool:
+        return getattr(type(self), hook) is not getattr(DNSProviderBase, hook)
+
+    def _by_zone(
+        self, action: str, challenges: ChalListType, *, stop_on_failure: bool
+    ) -> List[ErrataItemType]:
+        """
+        Hand the challenges to the bulk hooks (one task per zone) if they're
+        implemented, otherwise to the per-record hooks (one task per target,
+        so a wildcard and its base domain are done one after the other).
+        Exceptions become "failed" errata; with stop_on_failure, challenges
+        not yet started when one fails are returned as "skipped".
+        """
+
+        if not challenges:
+            return []
+        bulk = self._implements(action + "_zone")
+        if not bulk and not self._implements(action + "_record"):
+            raise NotImplementedError("%s method not implemented by %s" % (action, self.__class__))
+
+        failed = threading.Event()
+        errata: List[ErrataItemType] = []
+
+        # as records_by_zone, but a name with no zone fails rather than the lot
+        zones: Dict[str, ZoneRecordsType] = {}
+        for chal in challenges:
+            target = self.target_domain(chal)
+            try:
+                zone = self.zone_for(target)
+            except Exception as exc:
+                failed.set()
+                self.logger.warning("zone lookup failed for %s: %s", target, exc)
+                errata.append(("failed", str(exc), chal))
+                continue
+            zones.setdefault(zone, {}).setdefault(target, []).append(chal)
+
+        def skipped(chals: ChalListType) -> List[ErrataItemType]:
+            return [("skipped", "skipped after an earlier failure", chal) for chal in chals]
+
+        def zone_task(zone: str, records: ZoneRecordsType) -> List[ErrataItemType]:
+            chals = [chal for target_chals in records.values() for chal in target_chals]
+            if stop_on_failure and failed.is_set():
+                return skipped(chals)
+            try:
+                errata = list(getattr(self, action + "_zone")(zone, records))
+            except Exception as exc:
+                self.logger.warning("%s_zone failed for %s: %s", action, zone, exc)
+                errata = [("failed", str(exc), chal) for chal in chals]
+            if any(status == "failed" for status, _, _ in errata):
+                failed.set()
+            return errata
+
+        def target_task(target: str, chals: List[ChalItemType]) -> List[ErrataItemType]:
+            errata: List[ErrataItemType] = []
+            for chal in chals:
+                if stop_on_failure and failed.is_set():
+                    errata.extend(skipped([chal]))
+                    continue
+                try:
+                    getattr(self, action + "_record")(target, chal)
+                except Exception as exc:
+                    failed.set()
+                    self.logger.warning("%s_record failed for %s: %s", action, target, exc)
+                    errata.append(("failed", str(exc), chal))
+            return errata
+
+        task: Callable[..., List[ErrataItemType]]
+        units: List[Tuple[str, Any]]
+        if bulk:
+            task, units = zone_task, list(zones.items())
+        else:
+            task = target_task
+            units = [item for records in zones.values() for item in records.items()]
+
+        workers = min(self.max_concurrency, len(units))
+        if workers <= 1:
+            for unit in units:
+                errata.extend(task(*unit))
+            return errata
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sewer-dns") as pool:
+            for unit_errata in pool.map(lambda unit: task(*unit), units):
+                errata.extend(unit_errata)
+        return errata
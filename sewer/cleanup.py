@@ -0,0 +1,196 @@
+"cleanup.py - clearing challenges in the background, off get_certificate's critical path"
+
+import atexit, contextlib, json, logging, os, queue, threading, uuid
+from typing import Any, Iterator, List, Optional, Set
+
+from .auth import ChalListType, ErrataListType, ProviderBase
+from .clock import Clock, REAL_CLOCK
+from .lib import create_logger, LoggerType
+from .store import atomic_write, StateType
+
+# fcntl is Unix-only; elsewhere runs sharing a root aren't kept from doing the same cleanup
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+
+def provider_name(provider: ProviderBase) -> str:
+    "what a persisted cleanup is filed under, so a later run can find those it can do"
+
+    return "%s.%s" % (provider.__class__.__module__, provider.__class__.__qualname__)
+
+
+class CleanupQueue:
+    """
+    Challenges handed over by get_certificate (defer) are cleared by a
+    worker thread, which retries the provider's clear - up to attempts
+    times, backing off from backoff seconds - for those that failed.  The
+    certificate is returned as soon as it's downloaded.
+
+    With root set the queue is persistent: each deferred cleanup is written
+    to <root>/cleanup/<id>.json before it's queued and removed once done, so
+    any that are still pending when the process ends (crash, or retries
+    used up) can be picked up by a later run with recover(provider).  The
+    worker claims each one with a lock on its file before it clears it, so
+    runs sharing root never do the same cleanup at once.
+
+    Pending cleanups are flushed on exit, waiting up to exit_timeout seconds.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        *,
+        attempts: int = 3,
+        backoff: float = 2,
+        exit_timeout: float = 60,
+        clock: Optional[Clock] = None,
+        logger: Optional[LoggerType] = None,
+    ) -> None:
+        self.root = root
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.exit_timeout = exit_timeout
+        self.clock = clock if clock else REAL_CLOCK
+        self.logger = logger if logger else create_logger(__name__, logging.INFO)
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._queued: Set[str] = set()
+        self.failed: List[StateType] = []
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(str(self.root), "cleanup", "%s.json" % job_id)
+
+    def defer(self, provider: ProviderBase, challenges: ChalListType) -> ErrataListType:
+        """
+        queue challenges to be cleared by provider; returns at once.  The
+        result is in the form of provider.clear's, and always empty: the
+        challenges are the queue's to clear now.  (Those of a memory-only
+        queue are lost if the process dies before they're done.)
+        """
+
+        if not challenges:
+            return []
+        job_id = uuid.uuid4().hex
+        job: StateType = {
+            "id": job_id,
+            "provider": provider_name(provider),
+            "challenges": challenges,
+        }
+        if self.root:
+            atomic_write(self._path(job_id), json.dumps(job).encode())
+        self._put(provider, job)
+        return []
+
+    def recover(self, provider: ProviderBase) -> int:
+        """
+        Queue the persisted cleanups (from this or earlier runs) that provider
+        can do.  Returns how many were queued.
+        """
+
+        if not self.root:
+            return 0
+        dirname = os.path.join(self.root, "cleanup")
+        try:
+            names = sorted(n for n in os.listdir(dirname) if n.endswith(".json"))
+        except OSError:
+            return 0
+        count = 0
+        for name in names:
+            try:
+                with open(os.path.join(dirname, name), "r") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if job.get("provider") == provider_name(provider) and job["id"] not in self._queued:
+                self._put(provider, job)
+                count += 1
+        return count
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        "wait for the queue to drain; returns False if timeout ran out first"
+
+        done = threading.Event()
+        self._queue.put(done)
+        self._start()
+        return done.wait(timeout)
+
+    ### the worker
+
+    def _put(self, provider: ProviderBase, job: StateType) -> None:
+        self._queued.add(job["id"])
+        self._queue.put((provider, job))
+        self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._work, name="sewer-cleanup", daemon=True
+                )
+                self._worker.start()
+                atexit.register(self.flush, self.exit_timeout)
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if isinstance(item, threading.Event):
+                item.set()
+            else:
+                self._clear(*item)
+
+    def _clear(self, provider: ProviderBase, job: StateType) -> None:
+        try:
+            with self._claim(job) as claimed:
+                if claimed:
+                    self._run(provider, job)
+        finally:
+            self._queued.discard(job["id"])
+
+    @contextlib.contextmanager
+    def _claim(self, job: StateType) -> Iterator[bool]:
+        "whether this run gets to do job: a persisted one is locked (and must still be there)"
+
+        if not self.root or fcntl is None:
+            yield True
+            return
+        try:
+            f = open(self._path(job["id"]), "r")
+        except OSError:
+            # done, and removed, by another run
+            yield False
+            return
+        with f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            # it may have been done between the open and the lock
+            yield os.fstat(f.fileno()).st_nlink > 0
+
+    def _run(self, provider: ProviderBase, job: StateType) -> None:
+        challenges = job["challenges"]
+        delay = self.backoff
+        for attempt in range(self.attempts):
+            if attempt:
+                self.clock.sleep(delay)
+                delay *= 2
+            try:
+                challenges = [err[2] for err in provider.clear(challenges)]
+            except Exception as exc:
+                self.logger.warning("deferred clear failed: %s", str(exc)[:100])
+            if not challenges:
+                if self.root:
+                    with contextlib.suppress(OSError):
+                        os.unlink(self._path(job["id"]))
+                return
+        self.logger.warning(
+            "deferred clear gave up after %s attempts: %s", self.attempts, challenges
+        )
+        job = dict(job, challenges=challenges)
+        self.failed.append(job)
+        if self.root:
+            atomic_write(self._path(job["id"]), json.dumps(job).encode())
@@ -4,6 +4,9 @@ from . import client, config, lib
 
 from .catalog import ProviderCatalog
 from .crypto import AcmeKey, AcmeAccount, key_type_choices
+from .cleanup import CleanupQueue
+from .coalesce import Coalescer
+from .store import AccountStore, AuthzCache, OrderJournal, default_state_dir
 
 
 DEFAULT_KEY_TYPE = "rsa3072"
@@ -59,6 +62,40 @@ def setup_parser(catalog):
 
     parser.add_argument("--email", help="Email to be used for registration of an ACME account.")
 
+    parser.add_argument(
+        "--state_dir",
+        default=default_state_dir(),
+        help=(
+            "Directory where registered accounts, valid authorizations and orders in progress\n"
+            "are kept between runs.  Default is $SEWER_STATE_DIR or ~/.sewer.  Without\n"
+            "--acct_key the stored account is used."
+        ),
+    )
+
+    parser.add_argument(
+        "--no_state",
+        action="store_true",
+        help="Don't use or update the accounts, authorizations and orders in --state_dir.",
+    )
+
+    parser.add_argument(
+        "--prevalidate",
+        action="store_true",
+        help=(
+            "Only place the order and get its names validated; it's kept in --state_dir,\n"
+            "and a later run for the same names just finalizes it and downloads the certificate."
+        ),
+    )
+
+    parser.add_argument(
+        "--defer_cleanup",
+        action="store_true",
+        help=(
+            "Write out the certificate before the challenges are cleared, rather than after.\n"
+            "Cleanups that fail are kept in --state_dir and retried by the next such run."
+        ),
+    )
+
     parser.add_argument(
         "--is_new_acct",
         action="store_true",
@@ -333,6 +370,11 @@ def main():
     parser = setup_parser(catalog)
     args = parser.parse_args()
 
+    if args.prevalidate and args.no_state:
+        parser.error(
+            "--prevalidate keeps the order in --state_dir, so it can't be used with --no_state"
+        )
+
     loglevel = args.loglevel
     logger = lib.create_logger(None, loglevel)
 
@@ -359,30 +401,55 @@ def main():
     if not os.access(out_dir, os.W_OK):
         raise OSError("The dir '{0}' is not writable".format(out_dir))
 
+    if endpoint == "staging":
+        ACME_DIRECTORY_URL = config.ACME_DIRECTORY_URL_STAGING
+    else:
+        ACME_DIRECTORY_URL = config.ACME_DIRECTORY_URL_PRODUCTION
+
+    account_store = None if args.no_state else AccountStore(args.state_dir)
+    authz_cache = AuthzCache(None if args.no_state else args.state_dir)
+    order_journal = None if args.no_state else OrderJournal(args.state_dir)
+
+    # a stored account comes with its kid, so it needn't be looked up (or registered) again
+    stored = None
+    if not args.acct_key_file and account_store is not None:
+        stored = account_store.load(ACME_DIRECTORY_URL)
     if args.acct_key_file:
-        account = AcmeAccount.from_pem(args.acct_key_file.read())
+        account = AcmeAccount.from_key_bytes(args.acct_key_file.read())
         is_new_acct = args.is_new_acct
+        if account_store is not None:
+            account_store.recall(ACME_DIRECTORY_URL, account)
+    elif stored is not None:
+        account = stored
+        is_new_acct = not account.has_kid()
+        logger.info("using stored account %s", account.kid if account.has_kid() else "(no kid)")
     else:
         account = AcmeAccount.create(args.acct_key_type)
         is_new_acct = True
 
+    # concurrent runs for the same names share one order, and so its key - unless a key was given
+    coalescer = None
     if args.cert_key_file:
-        cert_key = AcmeKey.from_pem(args.cert_key.read())
+        cert_key = AcmeKey.from_pem(args.cert_key_file.read())
     else:
         cert_key = AcmeKey.create(args.cert_key_type)
+        if not args.no_state:
+            coalescer = Coalescer(args.state_dir)
 
     if bundle_name:
         file_name = bundle_name
     else:
         file_name = "{0}".format(domain)
 
-    if endpoint == "staging":
-        ACME_DIRECTORY_URL = config.ACME_DIRECTORY_URL_STAGING
-    else:
-        ACME_DIRECTORY_URL = config.ACME_DIRECTORY_URL_PRODUCTION
-
     dns_class = get_provider(provider_name, provider_kwargs, catalog, logger)
 
+    cleanup = None
+    if args.defer_cleanup:
+        cleanup = CleanupQueue(None if args.no_state else args.state_dir, logger=logger)
+        recovered = cleanup.recover(dns_class)
+        if recovered:
+            logger.info("retrying %s cleanups left by earlier runs", recovered)
+
     acme_client = client.Client(
         provider=dns_class,
         domain_name=domain,
@@ -394,6 +461,11 @@ def main():
         ACME_DIRECTORY_URL=ACME_DIRECTORY_URL,
         LOG_LEVEL=loglevel,
         ACME_REQUEST_TIMEOUT=args.acme_timeout,
+        account_store=account_store,
+        authz_cache=authz_cache,
+        order_journal=order_journal,
+        coalescer=coalescer,
+        cleanup=cleanup,
     )
 
     # prepare file path
@@ -401,16 +473,35 @@ def main():
     crt_file_path = os.path.join(out_dir, "{0}.crt".format(file_name))
     crt_key_file_path = os.path.join(out_dir, "{0}.key".format(file_name))
 
-    # write out account_key in out_dir directory
-    account.write_pem(account_key_file_path)
+    # write out account_key in out_dir directory (and again below, once its kid is known)
+    account.write_key(account_key_file_path)
     logger.info("account key succesfully written to {0}.".format(account_key_file_path))
 
+    if args.prevalidate:
+        order = acme_client.prevalidate()
+        account.write_key(account_key_file_path)
+        if account_store is not None:
+            account_store.save(ACME_DIRECTORY_URL, account)
+        logger.info(
+            "order for {0} is {1}; run again to finalize it.".format(domain, order["status"])
+        )
+        if cleanup is not None:
+            cleanup.flush(cleanup.exit_timeout)
+        return
+
     certificate = acme_client.get_certificate()
 
+    account.write_key(account_key_file_path)
+    if account_store is not None:
+        account_store.save(ACME_DIRECTORY_URL, account)
+
     # write out certificate and certificate key in out_dir directory
     with open(crt_file_path, "w") as certificate_file:
         certificate_file.write(certificate)
     logger.info("certificate succesfully written to {0}.".format(crt_file_path))
 
-    cert_key.write_pem(crt_key_file_path)
+    acme_client.cert_key.write_pem(crt_key_file_path)
     logger.info("certificate key succesfully written to {0}.".format(crt_key_file_path))
+
+    if cleanup is not None and not cleanup.flush(cleanup.exit_timeout):
+        logger.warning("challenge cleanup is still running; it will be retried by a later run")
@@ -1,13 +1,21 @@
-import json, time, platform
-from hashlib import sha256
-from typing import Dict, Sequence, Tuple, Union
+import threading
+from typing import Any, cast, Dict, IO, Optional, Sequence, Tuple
 
 import requests
 
 from .auth import ChalListType, ErrataListType, ProviderBase
+from .cleanup import CleanupQueue
+from .clock import Clock, Deadline, REAL_CLOCK
+from .coalesce import Coalescer, flight_key
 from .config import ACME_DIRECTORY_URL_PRODUCTION
 from .crypto import AcmeCsr, AcmeKey, AcmeAccount
-from .lib import create_logger, log_response, safe_base64, sewer_meta, AcmeRegistrationError
+from .directory import DirectoryType
+from .lib import create_logger, sewer_meta
+from .poll import Poller
+from .protocol import chal_identifier, Event, OrderProtocol, SyncDriver
+from .retry import RetryPolicy
+from .session import AcmeSession
+from .store import AccountStore, AuthzCache, OrderJournal, rfc3339
 
 
 class Client:
@@ -19,20 +27,37 @@ class Client:
         self,
         *,
         domain_name: str,
-        account: AcmeAccount,
         cert_key: AcmeKey,
+        account: Optional[AcmeAccount] = None,
+        acme_session: Optional[AcmeSession] = None,
         is_new_acct=False,
-        dns_class: ProviderBase = None,
-        domain_alt_names: Sequence[str] = None,
-        contact_email: str = None,
-        provider: ProviderBase = None,
+        dns_class: Optional[ProviderBase] = None,
+        domain_alt_names: Optional[Sequence[str]] = None,
+        contact_email: Optional[str] = None,
+        provider: Optional[ProviderBase] = None,
         ACME_REQUEST_TIMEOUT: int = 7,
         ACME_AUTH_STATUS_WAIT_PERIOD: int = 8,
         ACME_AUTH_STATUS_MAX_CHECKS: int = 3,
+        ACME_MAX_WORKERS: int = 4,
+        stream_challenges: bool = False,
         ACME_DIRECTORY_URL: str = ACME_DIRECTORY_URL_PRODUCTION,
         ACME_VERIFY: bool = True,
+        ACME_DIRECTORY_TTL: int = 3600,
+        ACME_DIRECTORY_CACHE_DIR: Optional[str] = None,
+        ACME_NONCE_PREFETCH: int = 0,
+        ACME_POOL_SIZE: int = 10,
+        ACME_RETRIES: int = 2,
+        session: Optional[requests.Session] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        account_store: Optional[AccountStore] = None,
+        authz_cache: Optional[AuthzCache] = None,
+        order_journal: Optional[OrderJournal] = None,
+        coalescer: Optional[Coalescer] = None,
+        cleanup: Optional[CleanupQueue] = None,
+        clock: Optional[Clock] = None,
+        deadline: Optional[Deadline] = None,
         LOG_LEVEL: str = "INFO",
-    ):
+    ) -> None:
 
         ### do some type checking of some parameters
 
@@ -56,9 +81,12 @@ class Client:
                 "Client was passed both the DEPRECATED dns_class argument and provider."
             )
 
-        if not isinstance(account, AcmeAccount):
+        if acme_session is None and not isinstance(account, AcmeAccount):
             raise TypeError("The account argument must be an AcmeAccount.")
 
+        if acme_session is not None and account is not None and account is not acme_session.account:
+            raise ValueError("Client was passed an account that isn't the acme_session's account.")
+
         if not isinstance(cert_key, AcmeKey):
             raise TypeError("The argument cert_key must be an AcmeKey.")
 
@@ -72,33 +100,77 @@ class Client:
         elif isinstance(dns_class, ProviderBase):
             self.provider = dns_class
 
+        # every wait - polling, propagation, retries - goes by the provider's clock unless given one
+        self.clock = clock if clock else getattr(self.provider, "clock", REAL_CLOCK)
+
+        # the whole issuance's time budget (none by default) and its cancellation
+        self.deadline = deadline if deadline else Deadline(clock=self.clock)
+
         if not domain_alt_names:
             domain_alt_names = []
         self.domain_alt_names = list(set(domain_alt_names))
-        self.contact_email = contact_email
-        self.ACME_REQUEST_TIMEOUT = ACME_REQUEST_TIMEOUT
         self.ACME_AUTH_STATUS_WAIT_PERIOD = ACME_AUTH_STATUS_WAIT_PERIOD
         self.ACME_AUTH_STATUS_MAX_CHECKS = ACME_AUTH_STATUS_MAX_CHECKS
-        self.ACME_DIRECTORY_URL = ACME_DIRECTORY_URL
-        self.ACME_VERIFY = ACME_VERIFY
+        self.ACME_MAX_WORKERS = max(1, int(ACME_MAX_WORKERS))
+        self.stream_challenges = stream_challenges
+        self.order_url = ""
+
+        # the old fixed sleep between checks is now the cap on the backoff between them
+        self.poller = Poller(
+            maximum=ACME_AUTH_STATUS_WAIT_PERIOD,
+            max_checks=ACME_AUTH_STATUS_MAX_CHECKS,
+            timeout=ACME_AUTH_STATUS_MAX_CHECKS * ACME_AUTH_STATUS_WAIT_PERIOD,
+            sleep=self.deadline.sleep,
+            now=self.clock.monotonic,
+        )
         self.LOG_LEVEL = LOG_LEVEL.upper()
-
-        self.account = account
         self.cert_key = cert_key
-        self.is_new_acct = is_new_acct
 
         self.logger = create_logger(__name__, LOG_LEVEL)
 
+        # a Client on its own is a session of one order
+        if acme_session is None:
+            acme_session = AcmeSession(
+                account=cast(AcmeAccount, account),
+                is_new_acct=is_new_acct,
+                contact_email=contact_email,
+                ACME_REQUEST_TIMEOUT=ACME_REQUEST_TIMEOUT,
+                ACME_DIRECTORY_URL=ACME_DIRECTORY_URL,
+                ACME_VERIFY=ACME_VERIFY,
+                ACME_DIRECTORY_TTL=ACME_DIRECTORY_TTL,
+                ACME_DIRECTORY_CACHE_DIR=ACME_DIRECTORY_CACHE_DIR,
+                ACME_NONCE_PREFETCH=ACME_NONCE_PREFETCH,
+                ACME_POOL_SIZE=ACME_POOL_SIZE,
+                ACME_RETRIES=ACME_RETRIES,
+                session=session,
+                retry_policy=retry_policy,
+                account_store=account_store,
+                authz_cache=authz_cache,
+                order_journal=order_journal,
+                coalescer=coalescer,
+                cleanup=cleanup,
+                clock=self.clock,
+                logger=self.logger,
+            )
+        self.acme = acme_session
+        self.journal = acme_session.order_journal
+        self.coalescer = coalescer if coalescer else acme_session.coalescer
+        self.cleanup = cleanup if cleanup else acme_session.cleanup
+        self.journal_record: Optional[Dict[str, Any]] = None
+        self.journal_claim: Optional[IO[str]] = None
+        # streamed challenges are journaled from the protocol's parallel steps
+        self._journal_lock = threading.Lock()
+
+        # these are the session's, copied here for compatibility
+        self.account = acme_session.account
+        self.is_new_acct = acme_session.is_new_acct
+        self.contact_email = acme_session.contact_email
+        self.ACME_REQUEST_TIMEOUT = acme_session.ACME_REQUEST_TIMEOUT
+        self.ACME_DIRECTORY_URL = acme_session.ACME_DIRECTORY_URL
+        self.ACME_VERIFY = acme_session.ACME_VERIFY
+
         try:
             self.all_domain_names = [self.domain_name] + self.domain_alt_names
-            self.User_Agent = self.get_user_agent()
-            acme_endpoints = self.get_acme_endpoints().json()
-            self.ACME_GET_NONCE_URL = acme_endpoints["newNonce"]
-            self.ACME_TOS_URL = acme_endpoints["meta"]["termsOfService"]
-            self.ACME_KEY_CHANGE_URL = acme_endpoints["keyChange"]
-            self.ACME_NEW_ACCOUNT_URL = acme_endpoints["newAccount"]
-            self.ACME_NEW_ORDER_URL = acme_endpoints["newOrder"]
-            self.ACME_REVOKE_CERT_URL = acme_endpoints["revokeCert"]
 
             self.acme_csr = AcmeCsr(cn=domain_name, san=domain_alt_names, key=self.cert_key)
 
@@ -121,129 +193,61 @@ class Client:
             self.logger.error("Unable to intialise Client. error={0}".format(str(e)[:100]))
             raise e
 
-    def GET(self, url: str) -> requests.Response:
-        """
-        wrap requests.get (and post and head, below) to allow:
-          * injection of e.g. UserAgent header in one place rather than all over
-          * hides requests itself to allow for change (unlikely) or use of Session
-          * paves the way to inject the verify option, required to use pebble
-        """
+    ### the account, directory and transport all belong to the (possibly shared) AcmeSession
 
-        return self._request("GET", url)
+    @property
+    def directory(self) -> DirectoryType:
+        return self.acme.get_directory(self.deadline)
 
-    # HEAD is still waiting for the test rewrite to let it be used... very low priority :-(
-    def HEAD(self, url: str) -> requests.Response:
-        return self._request("HEAD", url)
+    @property
+    def ACME_GET_NONCE_URL(self) -> str:
+        return self.directory["newNonce"]
 
-    def POST(
-        self, url: str, *, data: bytes = None, headers: Dict[str, str] = None
-    ) -> requests.Response:
-        return self._request("POST", url, data=data, headers=headers)
+    @property
+    def ACME_TOS_URL(self) -> str:
+        return self.directory.get("meta", {}).get("termsOfService", "")
 
-    def _request(
-        self, method: str, url: str, *, data: bytes = None, headers: Dict[str, str] = None
-    ) -> requests.Response:
-        """
-        shared implementation for GET, POST and HEAD
-        * injects standard request options unless they are already given in headers
-          * header:UserAgent, timeout
-          * verify - this is a hack to make sewer accept pebble's intentionally bogus cert
-        """
+    @property
+    def ACME_KEY_CHANGE_URL(self) -> str:
+        return self.directory["keyChange"]
 
-        if headers is None:
-            headers = {}
+    @property
+    def ACME_NEW_ACCOUNT_URL(self) -> str:
+        return self.directory["newAccount"]
 
-        if "UserAgent" not in headers:
-            headers["UserAgent"] = self.User_Agent
+    @property
+    def ACME_NEW_ORDER_URL(self) -> str:
+        return self.directory["newOrder"]
 
-        kwargs = {"timeout": self.ACME_REQUEST_TIMEOUT}  # type: Dict[str, Union[str, int]]
+    @property
+    def ACME_REVOKE_CERT_URL(self) -> str:
+        return self.directory["revokeCert"]
 
-        ### FIX ME ### can get current bogus cert from pebble, figure out how to use it here?
+    @property
+    def User_Agent(self) -> str:
+        return self.acme.User_Agent
 
-        # if ACME_VERIFY is false, disable certificate check in request
-        if not self.ACME_VERIFY:
-            kwargs["verify"] = False
+    def GET(self, url: str, *, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        return self.acme.GET(url, headers=headers, deadline=self.deadline)
 
-        # this is what we'd do if damn near every test didn't mock requests.{get,post}
-        # response = requests.request(method, url, headers=headers, **kwargs)
-
-        # awkward implementation to maintain compatibility with current mocked tests
-        if method == "GET":
-            # mypy seems to be confused if params isn't explicitly passed, wtf?
-            response = requests.get(url, params=None, headers=headers, **kwargs)
-        elif method == "HEAD":
-            response = requests.head(url, headers=headers, **kwargs)
-        elif method == "POST":
-            response = requests.post(url, data, headers=headers, **kwargs)
+    def HEAD(self, url: str) -> requests.Response:
+        return self.acme.HEAD(url, deadline=self.deadline)
 
-        return response
+    def POST(
+        self, url: str, *, data: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None
+    ) -> requests.Response:
+        return self.acme.POST(url, data=data, headers=headers, deadline=self.deadline)
 
-    @staticmethod
-    def get_user_agent():
-        return "python-requests/{requests_version} ({system}: {machine}) sewer {sewer_version} ({sewer_url})".format(
-            requests_version=requests.__version__,
-            system=platform.system(),
-            machine=platform.machine(),
-            sewer_version=sewer_meta("version"),
-            sewer_url=sewer_meta("url"),
-        )
+    get_user_agent = staticmethod(AcmeSession.get_user_agent)
 
     def get_acme_endpoints(self):
-        self.logger.debug("get_acme_endpoints")
-        get_acme_endpoints = self.GET(self.ACME_DIRECTORY_URL)
-        self.logger.debug(
-            "get_acme_endpoints_response. status_code={0}".format(get_acme_endpoints.status_code)
-        )
-        if get_acme_endpoints.status_code not in [200, 201]:
-            raise ValueError(
-                "Error while getting Acme endpoints: status_code={status_code} response={response}".format(
-                    status_code=get_acme_endpoints.status_code,
-                    response=log_response(get_acme_endpoints),
-                )
-            )
-        return get_acme_endpoints
-
-    ### FIX ME ### this is a kludge to fix Alec's needs until there's time to do the Acme* refactor
+        return self.acme.get_acme_endpoints()
 
     def acme_register(self):
+        "registration (or lookup of the kid) is done once per AcmeSession"
 
-        self.logger.info("acme_register%s" % " (is new account)" if self.is_new_acct else "")
-
-        if self.account.has_kid():
-            self.logger.info("acme_register: key was already registered")
-            return None
-
-        if not self.is_new_acct:
-            payload = {"onlyReturnExisting": True}
-        elif self.contact_email:
-            payload = {
-                "termsOfServiceAgreed": True,
-                "contact": ["mailto:{0}".format(self.contact_email)],
-            }
-        else:
-            payload = {"termsOfServiceAgreed": True}
-
-        url = self.ACME_NEW_ACCOUNT_URL
-        response = self.make_signed_acme_request(
-            url=url, payload=json.dumps(payload), needs_jwk=True
-        )
-        self.logger.debug(
-            "response. status_code={0}. response={1}".format(
-                response.status_code, log_response(response)
-            )
-        )
-
-        if response.status_code not in [201, 200, 409]:
-            raise AcmeRegistrationError(
-                "Error while registering: status_code={status_code} response={response}".format(
-                    status_code=response.status_code, response=log_response(response),
-                )
-            )
-
-        self.account.set_kid(response.headers["Location"])
-
-        self.logger.info("acme_register_success")
-        return response
+        self.deadline.check("registration")
+        return self.acme.register(self.deadline)
 
     def apply_for_cert_issuance(self):
         """
@@ -264,34 +268,7 @@ class Client:
         in the ACME draft spec; https://tools.ietf.org/html/draft-ietf-acme-acme#section-7.4
         """
         self.logger.info("apply_for_cert_issuance (newOrder)")
-        identifiers = []
-        for domain_name in self.all_domain_names:
-            identifiers.append({"type": "dns", "value": domain_name})
-
-        payload = {"identifiers": identifiers}
-        url = self.ACME_NEW_ORDER_URL
-        apply_for_cert_issuance_response = self.make_signed_acme_request(
-            url=url, payload=json.dumps(payload)
-        )
-        self.logger.debug(
-            "apply_for_cert_issuance_response. status_code={0}. response={1}".format(
-                apply_for_cert_issuance_response.status_code,
-                log_response(apply_for_cert_issuance_response),
-            )
-        )
-
-        if apply_for_cert_issuance_response.status_code != 201:
-            raise ValueError(
-                "Error applying for certificate issuance: status_code={status_code} response={response}".format(
-                    status_code=apply_for_cert_issuance_response.status_code,
-                    response=log_response(apply_for_cert_issuance_response),
-                )
-            )
-
-        apply_for_cert_issuance_response_json = apply_for_cert_issuance_response.json()
-        finalize_url = apply_for_cert_issuance_response_json["finalize"]
-        authorizations = apply_for_cert_issuance_response_json["authorizations"]
-
+        authorizations, finalize_url, self.order_url = self.protocol_step("apply_for_cert_issuance")
         self.logger.info("apply_for_cert_issuance_success")
         return authorizations, finalize_url
 
@@ -307,50 +284,16 @@ class Client:
         This is also where we get the challenges/tokens.
         """
         self.logger.info("get_identifier_authorization for %s" % auth_url)
-        response = self.make_signed_acme_request(auth_url, payload="")
-
-        self.logger.debug(
-            "get_identifier_authorization_response. status_code={0}. response={1}".format(
-                response.status_code, log_response(response)
-            )
-        )
-        if response.status_code not in [200, 201]:
-            raise ValueError(
-                "Error getting identifier authorization: status_code={status_code} response={response}".format(
-                    status_code=response.status_code, response=log_response(response)
-                )
-            )
-        response_json = response.json()
-        domain = response_json["identifier"]["value"]
-        wildcard = response_json.get("wildcard")
-
-        for i in response_json["challenges"]:
-            if i["type"] in self.provider.chal_types:
-                challenge = i
-                challenge_token = challenge["token"]
-                challenge_url = challenge["url"]
-
-                identifier_auth = {
-                    "domain": domain,
-                    "url": auth_url,
-                    "wildcard": wildcard,
-                    "token": challenge_token,
-                    "challenge_url": challenge_url,
-                }
-
-        self.logger.debug(
-            "get_identifier_authorization_success. identifier_auth={0}".format(identifier_auth)
-        )
+        identifier_auth = self.protocol_step("get_identifier_authorization", auth_url)
         self.logger.info(
-            "get_identifier_authorization got %s, token=%s" % (challenge_url, challenge_token)
+            "get_identifier_authorization got %s, token=%s"
+            % (identifier_auth["challenge_url"], identifier_auth["token"])
         )
         return identifier_auth
 
     def get_keyauthorization(self, token):
         self.logger.debug("get_keyauthorization")
-        acme_header_jwk_json = json.dumps(self.account.jwk(), sort_keys=True, separators=(",", ":"))
-        acme_thumbprint = safe_base64(sha256(acme_header_jwk_json.encode("utf8")).digest())
-        acme_keyauthorization = "{0}.{1}".format(token, acme_thumbprint)
+        acme_keyauthorization = "{0}.{1}".format(token, self.account.thumbprint())
 
         return acme_keyauthorization
 
@@ -371,31 +314,24 @@ class Client:
         """
         self.logger.debug("check_authorization_status")
         desired_status = desired_status or ["pending", "valid"]
-        number_of_checks = 0
-        while True:
-            time.sleep(self.ACME_AUTH_STATUS_WAIT_PERIOD)
-            response = self.make_signed_acme_request(authorization_url, payload="")
-            authorization_status = response.json()["status"]
-            number_of_checks = number_of_checks + 1
-            self.logger.debug(
-                "response. status_code={0}. response={1}".format(
-                    response.status_code, log_response(response),
-                )
-            )
-            if authorization_status in desired_status:
-                break
-            if number_of_checks == self.ACME_AUTH_STATUS_MAX_CHECKS:
-                raise StopIteration(
-                    "Checks done={0}. Max checks allowed={1}. Interval between checks={2}seconds.".format(
-                        number_of_checks,
-                        self.ACME_AUTH_STATUS_MAX_CHECKS,
-                        self.ACME_AUTH_STATUS_WAIT_PERIOD,
-                    )
-                )
-
+        response = self.protocol_step("poll_authorization", authorization_url, desired_status)
         self.logger.debug("check_authorization_status_success")
         return response
 
+    def poll_order(self, desired_status=None):
+        """
+        https://tools.ietf.org/html/rfc8555#section-7.4
+        Once all of the order's authorizations are valid the order becomes
+        "ready" for finalization; after finalization it goes through
+        "processing" to "valid".  Polling the one order resource, rather than
+        each of its authorizations, is the frugal way to wait for either.
+        Returns the order (JSON) once its status is one of desired_status.
+        """
+        self.logger.debug("poll_order")
+        order = self.protocol_step("poll_order", desired_status or ["ready", "valid"])
+        self.logger.debug("poll_order_success: %s" % order["status"])
+        return order
+
     def respond_to_challenge(self, acme_keyauthorization, challenge_url):
         """
         https://tools.ietf.org/html/draft-ietf-acme-acme#section-7.5.1
@@ -414,17 +350,9 @@ class Client:
         self.logger.info(
             "respond_to_challenge for %s at %s" % (acme_keyauthorization, challenge_url)
         )
-        payload = json.dumps({"keyAuthorization": "{0}".format(acme_keyauthorization)})
-        respond_to_challenge_response = self.make_signed_acme_request(challenge_url, payload)
-        self.logger.debug(
-            "respond_to_challenge_response. status_code={0}. response={1}".format(
-                respond_to_challenge_response.status_code,
-                log_response(respond_to_challenge_response),
-            )
-        )
-
+        response = self.protocol_step("respond_to_challenge", acme_keyauthorization, challenge_url)
         self.logger.info("respond_to_challenge_success")
-        return respond_to_challenge_response
+        return response
 
     def send_csr(self, finalize_url):
         """
@@ -438,153 +366,238 @@ class Client:
         A valid request to finalize an order will return the order to be finalized.
         The client should begin polling the order by sending a
         GET request to the order resource to obtain its current state.
+
+        The CA may issue asynchronously, returning the order as "processing"
+        with no certificate URL yet.  Then we poll the order (after any
+        Retry-After the finalize response gave) until it is "valid".
         """
         self.logger.info("send_csr")
-        payload = {"csr": safe_base64(self.acme_csr.public_bytes())}
-        send_csr_response = self.make_signed_acme_request(
-            url=finalize_url, payload=json.dumps(payload)
-        )
-        self.logger.debug(
-            "send_csr_response. status_code={0}. response={1}".format(
-                send_csr_response.status_code, log_response(send_csr_response)
-            )
-        )
-
-        if send_csr_response.status_code not in [200, 201]:
-            raise ValueError(
-                "Error sending csr: status_code={status_code} response={response}".format(
-                    status_code=send_csr_response.status_code,
-                    response=log_response(send_csr_response),
-                )
-            )
-        send_csr_response_json = send_csr_response.json()
-        certificate_url = send_csr_response_json["certificate"]
-
+        certificate_url = self.protocol_step("finalize", finalize_url)
         self.logger.info("send_csr_success")
         return certificate_url
 
     def download_certificate(self, certificate_url: str) -> str:
         self.logger.info("download_certificate")
-
-        response = self.make_signed_acme_request(certificate_url, payload="")
-        self.logger.debug(
-            "download_certificate_response. status_code={0}. response={1}".format(
-                response.status_code, log_response(response)
-            )
-        )
-        if response.status_code not in [200, 201]:
-            raise ValueError(
-                "Error fetching signed certificate: status_code={status_code} response={response}".format(
-                    status_code=response.status_code, response=log_response(response)
-                )
-            )
-        pem_certificate = response.content.decode("utf-8")
+        pem_certificate = self.protocol_step("download", certificate_url)
         self.logger.info("download_certificate_success")
         return pem_certificate
 
     def get_nonce(self):
+        return self.acme.get_nonce(self.deadline)
+
+    def get_acme_header(self, url, needs_jwk=False):
+        return self.acme.get_acme_header(url, needs_jwk)
+
+    def make_signed_acme_request(self, url, payload, needs_jwk=False):
+        return self.acme.make_signed_acme_request(url, payload, needs_jwk, deadline=self.deadline)
+
+    def remember_authorization(self, name: str, auth_url: str, expires: str) -> None:
+        "record a valid authorization in the authz cache (if its expiry is known)"
+
+        try:
+            self.acme.authz_cache.put(self.account.kid, name, auth_url, rfc3339(expires))
+        except ValueError:
+            self.logger.debug("authorization for %s has no usable expiry: %r" % (name, expires))
+
+    ### crash-safe order journal (see store.OrderJournal); all no-ops without one
+
+    def journal_update(self, **changes: Any) -> None:
+        with self._journal_lock:
+            if self.journal is not None and self.journal_record is not None:
+                self.journal_record.update(changes)
+                self.journal.write(self.journal_record)
+
+    def journal_challenge(self, chal: Dict[str, Any]) -> None:
+        "add one challenge to those journaled (replacing any for the same identifier)"
+
+        with self._journal_lock:
+            if self.journal is not None and self.journal_record is not None:
+                challenges = [
+                    c
+                    for c in self.journal_record.get("challenges") or []
+                    if chal_identifier(c) != chal_identifier(chal)
+                ]
+                self.journal_record["challenges"] = challenges + [chal]
+                self.journal.write(self.journal_record)
+
+    def journal_done(self) -> None:
+        with self._journal_lock:
+            if self.journal is not None and self.journal_record is not None:
+                self.journal.remove(self.journal_record)
+            self.journal_record = None
+
+    def journal_release(self) -> None:
+        "give up the claim on the order's record, taken by order_protocol"
+
+        if self.journal is not None and self.journal_claim is not None:
+            self.journal.release(self.journal_claim)
+        self.journal_claim = None
+
+    ### the order flow is the sans-IO protocol core (see protocol.py), driven by this Client
+
+    def order_protocol(self) -> OrderProtocol:
         """
-        https://tools.ietf.org/html/draft-ietf-acme-acme#section-6.4
-        Each request to an ACME server must include a fresh unused nonce
-        in order to protect against replay attacks.
+        An OrderProtocol for this order, to be run by any driver:
+
+            client.protocol_driver().run(client.order_protocol().issue())
+
+        Any I/O it needs is done here: the directory, and the journal record.
+        The record is claimed, so that no other run takes it for an orphan,
+        until journal_release().  If another live run has it, this order is
+        not journaled at all.
         """
-        self.logger.debug("get_nonce")
-        response = self.GET(self.ACME_GET_NONCE_URL)
-        nonce = response.headers["Replay-Nonce"]
-        return nonce
 
-    def get_acme_header(self, url, needs_jwk=False):
+        self.journal_record = None
+        if self.journal is not None and self.journal_claim is None:
+            self.journal_claim = self.journal.claim(self.account.kid, self.all_domain_names)
+            if self.journal_claim is None:
+                self.logger.info("an order for %s is in progress elsewhere", self.all_domain_names)
+        if self.journal is not None and self.journal_claim is not None:
+            self.journal_record = self.journal.load(self.account.kid, self.all_domain_names)
+        return self.new_protocol(
+            directory=self.directory,
+            known_valid=self.acme.authz_cache.valid_urls(self.account.kid, self.all_domain_names),
+            journal=self.journal_record,
+            stream=self.stream_challenges,
+        )
+
+    def new_protocol(self, **kwargs: Any) -> OrderProtocol:
+        "an OrderProtocol with this Client's inputs (kwargs adds the rest)"
+
+        return OrderProtocol(
+            identifiers=self.all_domain_names,
+            chal_types=self.provider.chal_types,
+            key_authorization=self.get_keyauthorization,
+            csr=self.acme_csr.public_bytes(),
+            csr_key=self.cert_key.fingerprint(),
+            poller=self.poller,
+            prop_delay=self.provider.prop_delay,
+            prop_timeout=self.provider.prop_timeout,
+            prop_sleep_times=self.provider.prop_sleep_times,
+            now=self.clock.time,
+            **kwargs,
+        )
+
+    def protocol_step(self, step: str, *args: Any) -> Any:
         """
-        https://tools.ietf.org/html/draft-ietf-acme-acme#section-6.2
-        The JWS Protected Header MUST include the following fields:
-        - "alg" (Algorithm)
-        - "jwk" (JSON Web Key, only for requests to new-account and revoke-cert resources)
-        - "kid" (Key ID, for all other requests). gotten from self.ACME_NEW_ACCOUNT_URL
-        - "nonce". gotten from self.ACME_GET_NONCE_URL
-        - "url"
+        run one of the protocol's steps (OrderProtocol.<step>(*args)) on its
+        own, as the methods above do: the protocol has the one implementation
+        of each, which issue() uses too.  The step shares this Client's order
+        URL, which finalizing may discover.
         """
-        self.logger.debug("get_acme_header")
-        header = {"alg": self.account.key_desc.alg, "nonce": self.get_nonce(), "url": url}
 
-        if needs_jwk:
-            header["jwk"] = self.account.jwk()
-        else:
-            header["kid"] = self.account.kid
+        # only newOrder needs the directory, which may take a request to get
+        directory = self.directory if step == "apply_for_cert_issuance" else {}
+        protocol = self.new_protocol(directory=directory)
+        protocol.order_url = self.order_url
+        try:
+            return self.protocol_driver().run(getattr(protocol, step)(*args))
+        finally:
+            self.order_url = protocol.order_url
+
+    def protocol_event(self, event: Event) -> None:
+        "record the protocol's progress in the journal and authz cache"
+
+        if event.name == "order":
+            self.logger.info("new order %s", event.data["order_url"])
+            self.order_url = event.data["order_url"]
+            if self.journal is not None and self.journal_claim is not None:
+                self.journal_record = self.journal.new(self.account.kid, self.all_domain_names)
+            self.journal_update(status="pending", **event.data)
+        elif event.name == "resume":
+            self.logger.info("resuming %s order %s", event.data["status"], event.data["order_url"])
+            self.order_url = event.data["order_url"]
+        elif event.name == "journal":
+            self.journal_update(**event.data)
+        elif event.name == "challenge":
+            self.journal_challenge(event.data["challenge"])
+        elif event.name == "done":
+            self.journal_done()
+        elif event.name == "authz_valid":
+            self.remember_authorization(
+                event.data["name"], event.data["url"], event.data["expires"]
+            )
+        elif event.name == "authz_distrust":
+            self.acme.authz_cache.discard(self.account.kid, self.all_domain_names)
 
-        return header
+    def protocol_driver(self) -> SyncDriver:
+        """
+        a SyncDriver that does the protocol's I/O the way this Client does:
+        its steps go through the methods of the same name (so overriding
+        or mocking, eg., get_identifier_authorization still works), and
+        everything is bounded by the Client's deadline.
+        """
 
-    def make_signed_acme_request(self, url, payload, needs_jwk=False):
-        self.logger.debug("make_signed_acme_request")
-        headers = {}
-        payload64 = safe_base64(payload)
-        protected = self.get_acme_header(url, needs_jwk)
-        protected64 = safe_base64(json.dumps(protected))
-        message = ("%s.%s" % (protected64, payload64)).encode("utf-8")
-        #        signature = self.sign_message(message="{0}.{1}".format(protected64, payload64))  # bytes
-        #        signature64 = safe_base64(signature)  # str
-        signature64 = safe_base64(self.account.sign_message(message))
-        data = json.dumps(
-            {"protected": protected64, "payload": payload64, "signature": signature64}
+        return SyncDriver(
+            send=lambda req: self.make_signed_acme_request(req.url, req.payload, req.needs_jwk),
+            provider=self.provider,
+            record=self.protocol_event,
+            sleep=self.poller.sleep,
+            max_workers=self.ACME_MAX_WORKERS,
+            cleanup=self.cleanup,
+            hooks={
+                "apply_for_cert_issuance": lambda: (
+                    tuple(self.apply_for_cert_issuance()) + (self.order_url,)
+                ),
+                "get_identifier_authorization": self.get_identifier_authorization,
+                "propagation_delay": self.propagation_delay,
+                "check_authorization_status": self.check_authorization_status,
+                "respond_to_challenge": self.respond_to_challenge,
+                "send_csr": self.send_csr,
+                "download_certificate": self.download_certificate,
+            },
+            deadline=self.deadline,
         )
-        headers.update({"Content-Type": "application/jose+json"})
-        response = self.POST(url, data=data.encode("utf8"), headers=headers)
-        return response
 
     def get_certificate(self):
-        self.logger.debug("get_certificate")
-        challenges = []
+        """
+        Issue the certificate.  With a coalescer, an order for the same names
+        and type of key that's already in flight is joined instead: the
+        certificate is the one it gets, and cert_key is replaced by its key.
+        """
+
+        if self.coalescer is None:
+            return self.issue_certificate()
+
+        own_key = self.cert_key.to_pem().decode()
+        result = self.coalescer.run(
+            flight_key(
+                self.acme.ACME_DIRECTORY_URL,
+                self.all_domain_names,
+                self.cert_key.key_desc.type_name,
+            ),
+            lambda: {"certificate": self.issue_certificate(), "key": own_key},
+            self.deadline,
+        )
+        if result["key"] != own_key:
+            self.logger.info("joined an order already in flight for %s", self.all_domain_names)
+            self.cert_key = AcmeKey.from_pem(result["key"].encode())
+        return result["certificate"]
+
+    def prevalidate(self) -> Dict[str, Any]:
+        """
+        The slow first half of get_certificate: place the order (or resume
+        the journaled one) and get all of its authorizations valid, then
+        stop.  The order is left in the journal, "ready", and the valid
+        authorizations in the authz cache, so that a later get_certificate
+        for the same names - with this account - need only finalize and
+        download; or, if the order has expired, place a new one that reuses
+        the valid authorizations.  Both need persistent state to outlive the
+        process (an OrderJournal and an AuthzCache with a root).
+
+        Returns the order's state: status, order_url, finalize_url and
+        authorizations.
+        """
+
+        return self.issue_certificate(finalize=False)
 
+    def issue_certificate(self, finalize: bool = True):
+        "the order itself, as OrderProtocol.issue run by this Client's protocol_driver"
+
+        self.logger.debug("get_certificate")
         try:
             self.acme_register()
-            authorizations, finalize_url = self.apply_for_cert_issuance()
-
-            for auth_url in authorizations:
-                identifier_auth = self.get_identifier_authorization(auth_url)
-                token = identifier_auth["token"]
-                challenge = {
-                    "ident_value": identifier_auth["domain"],
-                    "token": token,
-                    "key_auth": self.get_keyauthorization(token),  # responder acme_keyauth..
-                    "wildcard": identifier_auth["wildcard"],
-                    "auth_url": auth_url,  # responder auth.._url
-                    "chal_url": identifier_auth["challenge_url"],  # responder challenge_url
-                }
-                challenges.append(challenge)
-
-            # any errors in setup are fatal (here - they are all necessary for same cert)
-            failures = self.provider.setup(challenges)
-            if failures:
-                raise RuntimeError("get_certificate: challenge setup failed for %s" % failures)
-
-            ### FIX ME ### should abort cert and try to clear on error
-
-            error, errata_list = self.propagation_delay(challenges)
-
-            # for a case where you want certificates for *.example.com and example.com
-            # you have to create both auth records AND then respond to the challenge.
-            # see issues/83
-            for chal in challenges:
-                # Make sure the authorization is in a status where we can submit a challenge
-                # response. The authorization can be in the "valid" state before submitting
-                # a challenge response if there was a previous authorization for these hosts
-                # that was successfully validated, still cached by the server.
-                auth_status_response = self.check_authorization_status(chal["auth_url"])
-                if auth_status_response.json()["status"] == "pending":
-                    self.respond_to_challenge(chal["key_auth"], chal["chal_url"])
-
-            ### TO DO ### this is the obfuscated timeout loop.  Clean this mess up!
-            ### # # # ### it also keeps trying even when the auth is failed :-(
-
-            ### FIX? ### shouldn't this be checking the ORDER's status for completion?
-            #            that is at least the most frugal of queries approach...
-
-            for chal in challenges:
-                # Before sending a CSR, we need to make sure the server has completed the
-                # validation for all the authorizations
-                self.check_authorization_status(chal["auth_url"], ["valid"])
-
-            certificate_url = self.send_csr(finalize_url)
-            certificate = self.download_certificate(certificate_url)
+            return self.protocol_driver().run(self.order_protocol().issue(finalize))
 
         ### FIX ME ### [:100] is a bandaid to reduce spew during tests
 
@@ -592,10 +605,7 @@ class Client:
             self.logger.error("Error: Unable to issue certificate. error={0}".format(str(e)[:100]))
             raise e
         finally:
-            # best-effort attempt to clear challenges
-            failures = self.provider.clear(challenges)
-
-        return certificate
+            self.journal_release()
 
     def sleep_iter(self):
         "returns values from list, then repeats last value forever"
@@ -617,39 +627,7 @@ class Client:
         See docs/unpropagated.md for the details.
         """
 
-        if self.provider.prop_delay:
-            time.sleep(self.provider.prop_delay)
-
-        if self.provider.prop_timeout:
-            unready = challenges
-            end_time = time.time() + self.provider.prop_timeout
-            sleep_time = self.sleep_iter()
-            num_checks = 0
-
-            while unready:
-                errata = self.provider.unpropagated(unready)
-                num_checks += 1
-
-                # right idea, but details aren't yet nailed down?
-                # failed = [e for e in errata if e['status'].startswith("FAIL")]
-
-                if errata:
-                    poll_time = time.time()
-                    # intentional: do an "extra" check rather than running short
-                    if end_time < poll_time:
-                        break
-                    # wait a while to let more propagation happen
-                    time.sleep(next(sleep_time))
-
-                unready = [err[2] for err in errata]
-
-            if unready:
-                ### FIX ME ### might be good for mock tests, but really should try to clear, eh?
-                # return ("timeout", unready)
-                raise RuntimeError(
-                    "propagation_delay: time out after %s probes: %s" % (num_checks, unready)
-                )
-
+        self.protocol_step("propagation_delay", challenges)
         return ("", [])
 
     def cert(self):
@@ -0,0 +1,182 @@
+"clock.py - the time source and sleeper used by Client, AcmeSession and the providers"
+
+import threading, time
+from typing import Any, Callable, List, Optional
+
+from .lib import AcmeCancelledError, AcmeDeadlineError
+
+
+class Clock:
+    """
+    What sewer needs of time: wall-clock time() for expiry dates and
+    deadlines, monotonic() for measuring intervals, and sleep().  Pass a
+    clock to a provider, Client or AcmeSession to change how they wait.
+    """
+
+    def time(self) -> float:
+        raise NotImplementedError("time method not implemented by %s" % self.__class__)
+
+    def monotonic(self) -> float:
+        raise NotImplementedError("monotonic method not implemented by %s" % self.__class__)
+
+    def sleep(self, seconds: float) -> None:
+        raise NotImplementedError("sleep method not implemented by %s" % self.__class__)
+
+    def wait(self, event: threading.Event, seconds: float) -> bool:
+        "sleep until event is set, but no more than seconds; returns event.is_set()"
+
+        raise NotImplementedError("wait method not implemented by %s" % self.__class__)
+
+
+class RealClock(Clock):
+    "the time module's clocks, and a sleep that really sleeps"
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, event: threading.Event, seconds: float) -> bool:
+        return event.wait(max(0.0, seconds))
+
+
+REAL_CLOCK = RealClock()
+
+
+class VirtualClock(Clock):
+    """
+    A clock that only moves when it's told to: sleep(n) returns at once,
+    having advanced the clock by n seconds.  A whole issuance, timeouts and
+    all, runs at CPU speed and takes the same path every time.  Every sleep
+    is recorded in sleeps, for tests that care about the schedule.
+
+    Thread-safe, but sleeps in different threads don't overlap as real ones
+    would: the clock advances by their sum.
+    """
+
+    def __init__(self, start: float = 1600000000.0) -> None:
+        self.start = start
+        self.elapsed = 0.0
+        self.sleeps: List[float] = []
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self.start + self.elapsed
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def sleep(self, seconds: float) -> None:
+        with self._lock:
+            self.sleeps.append(seconds)
+            self.elapsed += max(0.0, seconds)
+
+    def wait(self, event: threading.Event, seconds: float) -> bool:
+        "an event that's set ends the wait at once; otherwise it's a sleep"
+
+        if not event.is_set():
+            self.sleep(seconds)
+        return event.is_set()
+
+    def advance(self, seconds: float) -> None:
+        "move the clock forward without recording a sleep"
+
+        with self._lock:
+            self.elapsed += max(0.0, seconds)
+
+
+class Deadline:
+    """
+    A time budget for one issuance, and the means to cancel it.
+
+        deadline = Deadline(300)
+        client = Client(..., deadline=deadline)
+        # and from any thread, should it be needed
+        deadline.cancel()
+
+    Every request is given a timeout no longer than the time remaining, and
+    every wait is cut short at the deadline or by cancel() (which also wakes
+    it at once).  Once the budget is spent, or the issuance is cancelled, the
+    next request or wait raises AcmeDeadlineError (AcmeCancelledError),
+    which get_certificate handles like any other error: the challenges are
+    still cleared.  A budget of None is unlimited, but can still be
+    cancelled.
+    """
+
+    def __init__(self, budget: Optional[float] = None, *, clock: Optional[Clock] = None) -> None:
+        self.clock = clock if clock else REAL_CLOCK
+        self.budget = budget
+        self.expires = None if budget is None else self.clock.monotonic() + budget
+        self.reason = ""
+        self._cancelled = threading.Event()
+        self._on_cancel: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        "seconds left (never less than zero), or None if there's no limit"
+
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - self.clock.monotonic())
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str = "") -> None:
+        self.reason = reason
+        with self._lock:
+            self._cancelled.set()
+            callbacks = list(self._on_cancel)
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """
+        have cancel() call callback (at once, if it's already been called), for
+        waits that aren't on a threading.Event.  Returns the function that
+        undoes this.
+        """
+
+        with self._lock:
+            cancelled = self._cancelled.is_set()
+            if not cancelled:
+                self._on_cancel.append(callback)
+        if cancelled:
+            callback()
+
+        def remove() -> None:
+            with self._lock:
+                if callback in self._on_cancel:
+                    self._on_cancel.remove(callback)
+
+        return remove
+
+    def check(self, what: str = "") -> None:
+        "raise if it's been cancelled or the budget is spent"
+
+        if self._cancelled.is_set():
+            reason = ": " + self.reason if self.reason else ""
+            raise AcmeCancelledError("%s cancelled%s" % (what or "issuance", reason))
+        if self.remaining() == 0:
+            raise AcmeDeadlineError(
+                "%s out of time: budget of %s seconds spent" % (what or "issuance", self.budget)
+            )
+
+    def clip(self, seconds: float, what: str = "") -> float:
+        "check, then return seconds cut down to the time remaining"
+
+        self.check(what)
+        left = self.remaining()
+        return seconds if left is None else min(seconds, left)
+
+    def sleep(self, seconds: float) -> None:
+        "sleep, but not past the deadline nor after cancel(); raise if either cut it short"
+
+        self.clock.wait(self._cancelled, self.clip(seconds, "wait"))
+        self.check("wait")
@@ -0,0 +1,161 @@
+"coalesce.py - single-flight issuance: concurrent orders for the same names share one"
+
+import contextlib, json, os, threading, time, uuid
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .clock import Deadline
+from .store import atomic_write, url_hash
+
+# fcntl is Unix-only; elsewhere only orders within one process are coalesced
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+ResultType = Dict[str, Any]
+
+
+def flight_key(directory_url: str, names: Iterable[str], key_type: str) -> str:
+    "the CA, the key type and the (normalized) set of names, as a filename-safe string"
+
+    normalized = sorted(set(name.strip().lower().rstrip(".") for name in names))
+    return url_hash("\n".join([directory_url, key_type] + normalized))
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[ResultType] = None
+        self.error: Optional[BaseException] = None
+
+
+class Coalescer:
+    """
+    Runs at most one issuance at a time for each flight key; anyone asking
+    for the same key while it is in flight waits for it and gets the same
+    result (or exception) rather than placing an order of their own.
+
+    Within a process the waiters share the leader's result directly.  With
+    root set, orders in other processes on the host are coalesced too: the
+    leader holds a lock on <root>/flights/<key>.lock while it works.  Each
+    process waiting on it holds a lock on a file of its own in
+    <root>/flights/<key>.waiting (locked before it's renamed into place), and the leader leaves its result in
+    <root>/flights/<key>.json (mode 0600, since it includes the certificate
+    key) only if someone is still waiting.  A process that was waiting on the
+    lock takes that result if it was finished after it started waiting, and
+    otherwise (eg., the leader failed) issues for itself; whoever leaves last
+    removes the result.
+    """
+
+    def __init__(self, root: Optional[str] = None, *, lock_poll: float = 0.25) -> None:
+        self.root = root
+        self.lock_poll = lock_poll
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+
+    def run(
+        self, key: str, issue: Callable[[], ResultType], deadline: Optional[Deadline] = None
+    ) -> ResultType:
+        """
+        issue() if no one else is issuing for key, otherwise wait for their
+        result.  Waiting is bounded by deadline, if one's given.
+        """
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            while not flight.done.is_set():
+                if deadline is None:
+                    flight.done.wait()
+                else:
+                    deadline.clock.wait(
+                        flight.done, deadline.clip(self.lock_poll, "coalesced order")
+                    )
+            if flight.error is not None:
+                raise flight.error
+            return flight.result  # type: ignore
+
+        try:
+            flight.result = self._across_processes(key, issue, deadline)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def _across_processes(
+        self, key: str, issue: Callable[[], ResultType], deadline: Optional[Deadline]
+    ) -> ResultType:
+        if not self.root or fcntl is None:
+            return issue()
+
+        path = os.path.join(self.root, "flights", "%s.json" % key)
+        waiting = path[:-5] + ".waiting"
+        os.makedirs(waiting, exist_ok=True)
+        # the waiting file is locked before it's given its name, so that no one can take
+        # it for the file of a waiter that died; only then does this one count as arrived
+        mine = os.path.join(waiting, uuid.uuid4().hex)
+        with open(mine + ".tmp", "a") as me, open(path[:-5] + ".lock", "a") as lock:
+            fcntl.flock(me.fileno(), fcntl.LOCK_EX)
+            os.rename(me.name, mine)
+            arrived = time.time()
+            # non-blocking attempts, so that a deadline still bounds the wait
+            while True:
+                try:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if deadline is None:
+                        time.sleep(self.lock_poll)
+                    else:
+                        deadline.sleep(self.lock_poll)
+            issued = None
+            try:
+                os.unlink(mine)
+                record = self._read(path)
+                if record is not None and record.get("finished", 0) >= arrived:
+                    return record["result"]
+                result = issue()
+                issued = {"finished": time.time(), "result": result}
+                return result
+            finally:
+                # the result holds the certificate key: it's kept only for those still waiting
+                if not self._waiting(waiting):
+                    with contextlib.suppress(OSError):
+                        os.unlink(path)
+                elif issued is not None:
+                    atomic_write(path, json.dumps(issued).encode())
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _waiting(self, waiting: str) -> bool:
+        "is anyone still waiting?  The files of waiters that died are removed on the way"
+
+        found = False
+        for name in os.listdir(waiting):
+            path = os.path.join(waiting, name)
+            try:
+                # a .tmp is a waiter yet to lock it, unless it's been there a while
+                if name.endswith(".tmp") and time.time() - os.stat(path).st_mtime < 60:
+                    continue
+                with open(path, "a") as f:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.unlink(path)
+            except BlockingIOError:
+                found = True
+            except OSError:
+                pass
+        return found
+
+    def _read(self, path: str) -> Optional[ResultType]:
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
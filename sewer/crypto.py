@@ -1,4 +1,5 @@
-import time
+import json, time
+from hashlib import sha256
 
 from cryptography import x509
 from cryptography.x509.oid import NameOID
@@ -9,6 +10,7 @@ from cryptography.hazmat.primitives.serialization import (
     Encoding,
     NoEncryption,
     PrivateFormat,
+    PublicFormat,
 )
 from cryptography.hazmat.backends import default_backend, openssl
 
@@ -235,6 +237,12 @@ class AcmeKey:
     def sign_message(self, message: bytes) -> bytes:
         return self.key_desc.sign(self.pk, message)
 
+    def fingerprint(self) -> str:
+        "hex SHA256 of the public key (DER SubjectPublicKeyInfo), to recognize the key later"
+
+        der = self.pk.public_key().public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo)
+        return sha256(der).hexdigest()
+
 
 ### An ACME account is identified by a key.  When registered there is a Key ID as well.
 
@@ -251,6 +259,8 @@ class AcmeAccount(AcmeKey):
         self.__kid: Optional[str] = None
         self._timestamp: Optional[float] = None
         self.__jwk: Optional[Dict[str, str]] = None
+        self.__thumbprint: Optional[str] = None
+        self.__jws_fragments: Dict[bool, bytes] = {}
 
     ### kid's descriptor methods
 
@@ -259,7 +269,7 @@ class AcmeAccount(AcmeKey):
             raise AcmeKidError("Attempt to access a Key ID that hasn't been set.  Register key?")
         return self.__kid
 
-    def set_kid(self, kid: str, timestamp: float = None) -> None:
+    def set_kid(self, kid: str, timestamp: Optional[float] = None) -> None:
         "The kid can be set only once, but we overlook exact duplicate set calls"
 
         if self.__kid and self.__kid != kid:
@@ -270,6 +280,7 @@ class AcmeAccount(AcmeKey):
     def del_kid(self) -> None:
         "Doesn't actually del the hidden attribute, just resets the value to None (empty)"
         self.__kid = None
+        self.__jws_fragments.pop(False, None)
 
     kid = property(get_kid, set_kid, del_kid)
 
@@ -299,6 +310,38 @@ class AcmeAccount(AcmeKey):
             self.__jwk = jwk
         return self.__jwk
 
+    def thumbprint(self) -> str:
+        """
+        Returns the RFC7638 JWK thumbprint (base64url), as used in key authorizations
+
+        CACHES result.  The JWK has only the required members, so sorting its
+        keys is all the canonicalization needed.
+        """
+
+        if self.__thumbprint is None:
+            canonical = json.dumps(self.jwk(), sort_keys=True, separators=(",", ":"))
+            self.__thumbprint = safe_base64(sha256(canonical.encode("utf8")).digest())
+        return self.__thumbprint
+
+    def jws_fragment(self, needs_jwk: bool = False) -> bytes:
+        """
+        Returns the unchanging part of the JWS protected header, pre-encoded
+        as JSON members: the alg, plus either the jwk or the kid.  Only the
+        nonce and url have to be added for each request.
+
+        CACHES result; the kid version once the kid is known.
+        """
+
+        frag = self.__jws_fragments.get(needs_jwk)
+        if frag is None:
+            if needs_jwk:
+                key, val = "jwk", json.dumps(self.jwk(), separators=(",", ":"))
+            else:
+                key, val = "kid", json.dumps(self.kid)
+            frag = ('"alg":%s,"%s":%s' % (json.dumps(self.key_desc.alg), key, val)).encode()
+            self.__jws_fragments[needs_jwk] = frag
+        return frag
+
     ### TODO ### store & load file format with kid, timestamp and pk.
     #
     # RFC7568 says that at least most implementations accept text outside the
@@ -317,16 +360,27 @@ class AcmeAccount(AcmeKey):
         "Like write_pem but prepends the KID and timestamp if those are present"
 
         with open(filename, "wb") as f:
-            if self.__kid:
-                f.write(("KID: %s\n" % self.__kid).encode())
-                if self._timestamp:
-                    f.write(("Timestamp: %s\n" % self._timestamp).encode())
-            f.write(self.to_pem())
+            f.write(self.to_key_bytes())
+
+    def to_key_bytes(self) -> bytes:
+        "to_pem with the KID and timestamp prefix, if those are present"
+
+        prefix = b""
+        if self.__kid:
+            prefix = ("KID: %s\n" % self.__kid).encode()
+            if self._timestamp:
+                prefix += ("Timestamp: %s\n" % self._timestamp).encode()
+        return prefix + self.to_pem()
 
     @classmethod
     def read_key(cls: Type["AcmeAccount"], filename: str) -> "AcmeAccount":
         with open(filename, "rb") as f:
-            data = f.read()
+            return cls.from_key_bytes(f.read())
+
+    @classmethod
+    def from_key_bytes(cls: Type["AcmeAccount"], data: bytes) -> "AcmeAccount":
+        "Like from_pem but accepts (and loads) the optional KID and timestamp prefix"
+
         prefix = b""
         n = data.find(b"-----BEGIN")
         if 0 < n:
@@ -0,0 +1,152 @@
+"directory.py - cache of ACME directory documents, in memory and optionally on disk"
+
+import hashlib, json, os, tempfile, threading
+from typing import Any, Callable, Dict, Optional
+
+from .clock import Clock, REAL_CLOCK
+from .lib import log_response
+
+DirectoryType = Dict[str, Any]
+FetchType = Callable[[str, Dict[str, str]], Any]
+
+
+class _Entry:
+    def __init__(
+        self, directory: DirectoryType, etag: str = "", last_modified: str = "", fetched: float = 0
+    ) -> None:
+        self.directory = directory
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = fetched
+
+    def to_json(self, url: str) -> Dict[str, Any]:
+        return {
+            "url": url,
+            "directory": self.directory,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "fetched": self.fetched,
+        }
+
+
+class DirectoryCache:
+    """
+    Caches the directory document for each ACME_DIRECTORY_URL.  An entry
+    younger than ttl seconds is used without any I/O at all; an older one is
+    revalidated with a conditional GET (If-None-Match / If-Modified-Since)
+    so that an unchanged directory costs only a 304.  With cache_dir set,
+    entries are also kept on disk so that separate runs share them.
+
+    The fetch callable does the actual request: fetch(url, headers) -> response
+    Ages go by the clock passed to get (the cache is shared by sessions that
+    may each have their own).  A fetch only holds up lookups of the same url.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
+        self.cache_dir = cache_dir
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+
+    def get(
+        self, url: str, fetch: FetchType, ttl: float = 3600, clock: Optional[Clock] = None
+    ) -> DirectoryType:
+        "return the directory for url, fetching or revalidating only if necessary"
+
+        clock = clock if clock else REAL_CLOCK
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            with self._lock:
+                entry = self._entries.get(url) or self._load(url)
+            if entry is not None and clock.time() - entry.fetched < ttl:
+                return entry.directory
+
+            headers = {}
+            if entry is not None:
+                if entry.etag:
+                    headers["If-None-Match"] = entry.etag
+                if entry.last_modified:
+                    headers["If-Modified-Since"] = entry.last_modified
+
+            response = fetch(url, headers)
+            if response.status_code == 304 and entry is not None:
+                entry.fetched = clock.time()
+            elif response.status_code in [200, 201]:
+                entry = _Entry(
+                    response.json(),
+                    response.headers.get("ETag", ""),
+                    response.headers.get("Last-Modified", ""),
+                    clock.time(),
+                )
+            else:
+                raise ValueError(
+                    "Error while getting Acme endpoints: status_code={status_code} response={response}".format(
+                        status_code=response.status_code, response=log_response(response)
+                    )
+                )
+            with self._lock:
+                self._entries[url] = entry
+            self._save(url, entry)
+            return entry.directory
+
+    def clear(self, url: Optional[str] = None) -> None:
+        "forget one (or all) in-memory entries; disk entries are left alone"
+
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
+
+    ### disk persistence - errors are not fatal, the cache is only an optimization
+
+    def _path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode("utf8")).hexdigest()[:24]
+        return os.path.join(str(self.cache_dir), "directory-%s.json" % name)
+
+    def _load(self, url: str) -> Optional[_Entry]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(url), "r") as f:
+                data = json.load(f)
+            if data["url"] != url:
+                return None
+            entry = _Entry(data["directory"], data["etag"], data["last_modified"], data["fetched"])
+        except (OSError, ValueError, KeyError):
+            return None
+        self._entries[url] = entry
+        return entry
+
+    def _save(self, url: str, entry: _Entry) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry.to_json(url), f)
+            os.replace(tmp, self._path(url))
+        except OSError:
+            pass
+
+
+_caches: Dict[Optional[str], DirectoryCache] = {}
+_caches_lock = threading.Lock()
+
+
+def directory_cache(cache_dir: Optional[str] = None) -> DirectoryCache:
+    "returns the process-wide DirectoryCache for cache_dir (None is memory-only)"
+
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = _caches[cache_dir] = DirectoryCache(cache_dir)
+    return cache
+
+
+def clear_directory_caches() -> None:
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.clear()
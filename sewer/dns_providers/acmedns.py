@@ -1,7 +1,5 @@
 import urllib.parse
 
-import requests
-
 from dns.resolver import Resolver
 
 from . import common
@@ -9,6 +7,8 @@ from ..lib import log_response
 
 
 class AcmeDnsDns(common.BaseDns):
+    max_concurrency = 4
+
     def __init__(self, ACME_DNS_API_USER, ACME_DNS_API_KEY, ACME_DNS_API_BASE_URL, **kwargs):
         self.ACME_DNS_API_USER = ACME_DNS_API_USER
         self.ACME_DNS_API_KEY = ACME_DNS_API_KEY
@@ -31,7 +31,7 @@ class AcmeDnsDns(common.BaseDns):
         url = urllib.parse.urljoin(self.ACME_DNS_API_BASE_URL, "update")
         headers = {"X-Api-User": self.ACME_DNS_API_USER, "X-Api-Key": self.ACME_DNS_API_KEY}
         body = {"subdomain": subdomain, "txt": domain_dns_value}
-        update_acmedns_dns_record_response = requests.post(
+        update_acmedns_dns_record_response = self.http.post(
             url, headers=headers, json=body, timeout=self.HTTP_TIMEOUT
         )
         self.logger.debug(
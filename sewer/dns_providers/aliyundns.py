@@ -9,6 +9,7 @@ from aliyunsdkalidns.request.v20150109 import (
 )
 
 from . import common
+from ..suffix import split_domain
 
 
 class _ResponseForAliyun(object):
@@ -28,6 +29,8 @@ class _ResponseForAliyun(object):
 
 
 class AliyunDns(common.BaseDns):
+    max_concurrency = 2
+
     def __init__(self, key, secret, endpoint="cn-beijing", debug=False, **kwargs):
         """
         aliyun dns client
@@ -145,14 +148,8 @@ class AliyunDns(common.BaseDns):
         :param str domain_name: the value sewer client passed in, like *.menduo.example.com
         :return tuple: root, zone, acme_txt
         """
-        if domain_name.count(".") > 1:
-            zone, middle, last = str(domain_name).rsplit(".", 2)
-            root = ".".join([middle, last])
-            acme_txt = "_acme-challenge.%s" % zone
-        else:
-            zone = ""
-            root = domain_name
-            acme_txt = "_acme-challenge"
+        zone, root = split_domain(domain_name)
+        acme_txt = "_acme-challenge.%s" % zone if zone else "_acme-challenge"
         return root, zone, acme_txt
 
     def create_dns_record(self, domain_name, domain_dns_value):
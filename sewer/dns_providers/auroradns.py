@@ -2,12 +2,11 @@
 # https://www.pcextreme.nl/aurora/dns
 # Aurora uses libcloud from apache
 # https://libcloud.apache.org/
-import tldextract
-
 from libcloud.dns.providers import get_driver  # type: ignore
 from libcloud.dns.types import Provider, RecordType  # type: ignore
 
 from . import common
+from ..suffix import split_domain
 
 
 class AuroraDns(common.BaseDns):
@@ -16,6 +15,8 @@ class AuroraDns(common.BaseDns):
     facilitate better tests.
     """
 
+    max_concurrency = 2
+
     def __init__(self, AURORA_API_KEY, AURORA_SECRET_KEY, **kwargs):
         self.AURORA_API_KEY = AURORA_API_KEY
         self.AURORA_SECRET_KEY = AURORA_SECRET_KEY
@@ -24,13 +25,12 @@ class AuroraDns(common.BaseDns):
     def create_dns_record(self, domain_name, domain_dns_value):
         self.logger.info("create_dns_record")
 
-        extractedDomain = tldextract.extract(domain_name)
-        domainSuffix = extractedDomain.domain + "." + extractedDomain.suffix
+        subdomain, domainSuffix = split_domain(domain_name)
 
-        if extractedDomain.subdomain == "":
+        if subdomain == "":
             subDomain = "_acme-challenge"
         else:
-            subDomain = "_acme-challenge." + extractedDomain.subdomain
+            subDomain = "_acme-challenge." + subdomain
 
         cls = get_driver(Provider.AURORADNS)
         driver = cls(key=self.AURORA_API_KEY, secret=self.AURORA_SECRET_KEY)
@@ -43,13 +43,12 @@ class AuroraDns(common.BaseDns):
     def delete_dns_record(self, domain_name, domain_dns_value):
         self.logger.info("delete_dns_record")
 
-        extractedDomain = tldextract.extract(domain_name)
-        domainSuffix = extractedDomain.domain + "." + extractedDomain.suffix
+        subdomain, domainSuffix = split_domain(domain_name)
 
-        if extractedDomain.subdomain == "":
+        if subdomain == "":
             subDomain = "_acme-challenge"
         else:
-            subDomain = "_acme-challenge." + extractedDomain.subdomain
+            subDomain = "_acme-challenge." + subdomain
 
         cls = get_driver(Provider.AURORADNS)
         driver = cls(key=self.AURORA_API_KEY, secret=self.AURORA_SECRET_KEY)
@@ -1,12 +1,12 @@
 import urllib.parse
 
-import requests
-
 from . import common
 from ..lib import log_response
 
 
 class CloudFlareDns(common.BaseDns):
+    max_concurrency = 8
+
     def __init__(
         self,
         CLOUDFLARE_EMAIL=None,
@@ -38,45 +38,50 @@ class CloudFlareDns(common.BaseDns):
 
         super().__init__(**kwargs)
 
-    def find_dns_zone(self, domain_name):
-        self.logger.debug("find_dns_zone")
-        url = urllib.parse.urljoin(self.CLOUDFLARE_API_BASE_URL, "zones?status=active")
+    def list_zones(self):
+        self.logger.debug("list_zones")
+        url = urllib.parse.urljoin(self.CLOUDFLARE_API_BASE_URL, "zones")
         headers = self._get_auth_header()
-        find_dns_zone_response = requests.get(url, headers=headers, timeout=self.HTTP_TIMEOUT)
-        self.logger.debug(
-            "find_dns_zone_response. status_code={0}".format(find_dns_zone_response.status_code)
-        )
-        if find_dns_zone_response.status_code != 200:
-            raise ValueError(
-                "Error creating cloudflare dns record: status_code={status_code} response={response}".format(
-                    status_code=find_dns_zone_response.status_code,
-                    response=log_response(find_dns_zone_response),
-                )
+        zones, page, pages = {}, 1, 1
+        while page <= pages:
+            params = {"status": "active", "per_page": 50, "page": page}
+            list_zones_response = self.http.get(
+                url, params=params, headers=headers, timeout=self.HTTP_TIMEOUT
             )
-
-        result = find_dns_zone_response.json()["result"]
-        for i in result:
-            if i["name"] in domain_name:
-                setattr(self, "CLOUDFLARE_DNS_ZONE_ID", i["id"])
-        if isinstance(self.CLOUDFLARE_DNS_ZONE_ID, type(None)):
-            raise ValueError(
-                "No DNS zone for %s: status = %s, response=%s"
-                % (
-                    domain_name,
-                    find_dns_zone_response.status_code,
-                    log_response(find_dns_zone_response),
-                )
+            self.logger.debug(
+                "list_zones_response. status_code={0}".format(list_zones_response.status_code)
             )
+            if list_zones_response.status_code != 200:
+                raise ValueError(
+                    "Error listing cloudflare dns zones: status_code={status_code} response={response}".format(
+                        status_code=list_zones_response.status_code,
+                        response=log_response(list_zones_response),
+                    )
+                )
+            body = list_zones_response.json()
+            zones.update((zone["name"], zone["id"]) for zone in body["result"])
+            pages = body.get("result_info", {}).get("total_pages", 1)
+            page += 1
+        return zones
+
+    def find_dns_zone(self, domain_name):
+        "returns the id of the zone holding domain_name"
 
+        self.logger.debug("find_dns_zone")
+        found = self.zone_index.lookup(domain_name)
+        if found is None:
+            raise ValueError("No DNS zone for %s" % domain_name)
+        # the attribute is kept for compatibility; concurrent calls must use the return value
+        self.CLOUDFLARE_DNS_ZONE_ID = found[1]
         self.logger.debug("find_dns_zone_success")
+        return found[1]
 
     def create_dns_record(self, domain_name, domain_dns_value):
         self.logger.info("create_dns_record")
-        self.find_dns_zone(domain_name)
+        zone_id = self.find_dns_zone(domain_name)
 
         url = urllib.parse.urljoin(
-            self.CLOUDFLARE_API_BASE_URL,
-            "zones/{0}/dns_records".format(self.CLOUDFLARE_DNS_ZONE_ID),
+            self.CLOUDFLARE_API_BASE_URL, "zones/{0}/dns_records".format(zone_id)
         )
         headers = self._get_auth_header()
         body = {
@@ -84,7 +89,7 @@ class CloudFlareDns(common.BaseDns):
             "name": "_acme-challenge" + "." + domain_name + ".",
             "content": "{0}".format(domain_dns_value),
         }
-        create_cloudflare_dns_record_response = requests.post(
+        create_cloudflare_dns_record_response = self.http.post(
             url, headers=headers, json=body, timeout=self.HTTP_TIMEOUT
         )
         self.logger.debug(
@@ -118,15 +123,15 @@ class CloudFlareDns(common.BaseDns):
 
         delete_dns_record_response = MockResponse()
         headers = self._get_auth_header()
+        zone_id = self.find_dns_zone(domain_name)
 
         dns_name = "_acme-challenge" + "." + domain_name
         list_dns_payload = {"type": "TXT", "name": dns_name}
         list_dns_url = urllib.parse.urljoin(
-            self.CLOUDFLARE_API_BASE_URL,
-            "zones/{0}/dns_records".format(self.CLOUDFLARE_DNS_ZONE_ID),
+            self.CLOUDFLARE_API_BASE_URL, "zones/{0}/dns_records".format(zone_id)
         )
 
-        list_dns_response = requests.get(
+        list_dns_response = self.http.get(
             list_dns_url, params=list_dns_payload, headers=headers, timeout=self.HTTP_TIMEOUT
         )
 
@@ -134,10 +139,10 @@ class CloudFlareDns(common.BaseDns):
             dns_record_id = list_dns_response.json()["result"][i]["id"]
             url = urllib.parse.urljoin(
                 self.CLOUDFLARE_API_BASE_URL,
-                "zones/{0}/dns_records/{1}".format(self.CLOUDFLARE_DNS_ZONE_ID, dns_record_id),
+                "zones/{0}/dns_records/{1}".format(zone_id, dns_record_id),
             )
             headers = self._get_auth_header()
-            delete_dns_record_response = requests.delete(
+            delete_dns_record_response = self.http.delete(
                 url, headers=headers, timeout=self.HTTP_TIMEOUT
             )
             self.logger.debug(
@@ -1,23 +1,20 @@
 from cloudns_api import record  # type: ignore
 
 from . import common
-
-
-### FIX ME ### this assumes there are only two levels above the host (no bbc.co.uk eg.)
+from ..suffix import split_domain
 
 
 def _split_domain_name(domain_name):
     """ClouDNS requires the domain name and host to be split."""
-    full_domain_name = "_acme-challenge.{}".format(domain_name)
-    domain_parts = full_domain_name.split(".")
-
-    domain_name = ".".join(domain_parts[-2:])
-    host = ".".join(domain_parts[:-2])
+    subdomain, domain_name = split_domain(domain_name)
+    host = "_acme-challenge" + ("." + subdomain if subdomain else "")
 
     return domain_name, host
 
 
 class ClouDNSDns(common.BaseDns):
+    max_concurrency = 4
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -1,12 +1,19 @@
 from typing import Any, Dict, Sequence
 
-from ..auth import ErrataItemType, DNSProviderBase
+from ..auth import ChalItemType, ErrataItemType, DNSProviderBase
 from ..lib import dns_challenge
 
 
 class BaseDns(DNSProviderBase):
     """
     Shim for legacy DNS provider interface.
+
+    The legacy methods are called through DNSProviderBase's per-record hooks,
+    so setup and clear make up to max_concurrency of them at once.  A driver
+    declares how many concurrent calls it (and its service) can take by
+    setting max_concurrency on its class; the default of 1 keeps an
+    undeclared driver serial.  A legacy driver may implement the bulk hooks
+    (setup_zone, clear_zone) instead, to change a whole zone in one request.
     """
 
     def __init__(self, **kwargs: Any) -> None:
@@ -18,18 +25,14 @@ class BaseDns(DNSProviderBase):
 
     ### shim methods
 
-    def setup(self, challenges: Sequence[Dict[str, str]]) -> Sequence[ErrataItemType]:
-        for chal in challenges:
-            self.create_dns_record(chal["ident_value"], dns_challenge(chal["key_auth"]))
-        return []
+    def setup_record(self, target: str, chal: ChalItemType) -> None:
+        self.create_dns_record(chal["ident_value"], dns_challenge(chal["key_auth"]))
 
     def unpropagated(self, challenges: Sequence[Dict[str, str]]) -> Sequence[ErrataItemType]:
         return []
 
-    def clear(self, challenges: Sequence[Dict[str, str]]) -> Sequence[ErrataItemType]:
-        for chal in challenges:
-            self.delete_dns_record(chal["ident_value"], dns_challenge(chal["key_auth"]))
-        return []
+    def clear_record(self, target: str, chal: ChalItemType) -> None:
+        self.delete_dns_record(chal["ident_value"], dns_challenge(chal["key_auth"]))
 
     ### legacy DNS methods
 
@@ -1,11 +1,12 @@
 import urllib.parse
 
-import requests
-
 from . import common
+from ..suffix import split_domain
 
 
 class DNSPodDns(common.BaseDns):
+    max_concurrency = 2
+
     def __init__(
         self, DNSPOD_ID, DNSPOD_API_KEY, DNSPOD_API_BASE_URL="https://dnsapi.cn/", **kwargs
     ):
@@ -24,17 +25,9 @@ class DNSPodDns(common.BaseDns):
     def create_dns_record(self, domain_name, domain_dns_value):
         self.logger.info("create_dns_record")
 
-        ### FIX ME   ### domain is exactly last two parts (service has list of zones API?)
-        ### YUCK     ### Odd, unpythonic implementation
-        ### REFACTOR ### duplicated code (here and delete_dns_record)
-
-        subd = ""
-        if domain_name.count(".") != 1:  # not top level domain
-            pos = domain_name.rfind(".", 0, domain_name.rfind("."))
-            subd = domain_name[:pos]
-            domain_name = domain_name[pos + 1 :]
-            if subd != "":
-                subd = "." + subd
+        subd, domain_name = split_domain(domain_name)
+        if subd != "":
+            subd = "." + subd
 
         url = urllib.parse.urljoin(self.DNSPOD_API_BASE_URL, "Record.Create")
         body = {
@@ -46,7 +39,7 @@ class DNSPodDns(common.BaseDns):
             "format": "json",
             "login_token": self.DNSPOD_LOGIN,
         }
-        create_dnspod_dns_record_response = requests.post(
+        create_dnspod_dns_record_response = self.http.post(
             url, data=body, timeout=self.HTTP_TIMEOUT
         ).json()
         self.logger.debug(
@@ -69,13 +62,9 @@ class DNSPodDns(common.BaseDns):
     def delete_dns_record(self, domain_name, domain_dns_value):
         self.logger.info("delete_dns_record")
 
-        subd = ""
-        if domain_name.count(".") != 1:  # not top level domain
-            pos = domain_name.rfind(".", 0, domain_name.rfind("."))
-            subd = domain_name[:pos]
-            domain_name = domain_name[pos + 1 :]
-            if subd != "":
-                subd = "." + subd
+        subd, domain_name = split_domain(domain_name)
+        if subd != "":
+            subd = "." + subd
 
         url = urllib.parse.urljoin(self.DNSPOD_API_BASE_URL, "Record.List")
         # pos = domain_name.rfind(".",0, domain_name.rfind("."))
@@ -88,7 +77,7 @@ class DNSPodDns(common.BaseDns):
             "subdomain": subdomain,
             "record_type": "TXT",
         }
-        list_dns_response = requests.post(url, data=body, timeout=self.HTTP_TIMEOUT).json()
+        list_dns_response = self.http.post(url, data=body, timeout=self.HTTP_TIMEOUT).json()
         if list_dns_response["status"]["code"] != "1":
             self.logger.error(
                 "list_dns_record_response. status_code={0}. message={1}".format(
@@ -104,7 +93,7 @@ class DNSPodDns(common.BaseDns):
                 "domain": rootdomain,
                 "record_id": rid,
             }
-            delete_dns_record_response = requests.post(
+            delete_dns_record_response = self.http.post(
                 urlr, data=bodyr, timeout=self.HTTP_TIMEOUT
             ).json()
             if delete_dns_record_response["status"]["code"] != "1":
@@ -1,7 +1,5 @@
 import urllib.parse
 
-import requests
-
 from . import common
 
 
@@ -27,7 +25,7 @@ class DuckDNSDns(common.BaseDns):
         url = urllib.parse.urljoin(self.DUCKDNS_API_BASE_URL, "update")
 
         payload = dict([("domains", domain_name), ("token", self.duckdns_token), payload_end_arg])
-        update_duckdns_dns_record_response = requests.get(
+        update_duckdns_dns_record_response = self.http.get(
             url, params=payload, timeout=self.HTTP_TIMEOUT
         )
 
@@ -1,24 +1,24 @@
 import os
 from itertools import chain
 
-import requests
-
 from . import common
+from ..suffix import split_domain
 
 
 class GandiDns(common.BaseDns):
+    max_concurrency = 4
+
     def __init__(
         self,
         GANDI_API_KEY=None,
         GANDI_API_BASE_URL="https://dns.api.gandi.net/api/v5/",
         DEFAULT_TTL=10800,
-        requests_lib=requests,
+        requests_lib=None,
         **kwargs,
     ):
         self.GANDI_API_KEY = GANDI_API_KEY
         self.HTTP_TIMEOUT = 65  # seconds
         self.RECORD_TTL = DEFAULT_TTL
-        self.requests = requests_lib
 
         if GANDI_API_BASE_URL[-1] != "/":
             self.GANDI_API_BASE_URL = GANDI_API_BASE_URL + "/"
@@ -33,6 +33,14 @@ class GandiDns(common.BaseDns):
         self.POST_HEADERS = {"X-Api-Key": self.GANDI_API_KEY, "Content-Type": "application/json"}
 
         super().__init__(**kwargs)
+        # requests_lib is for tests; it stands in for the pooled session
+        self.requests_lib = requests_lib
+
+    @property
+    def requests(self):
+        "requests_lib if one was given, else the pooled session (created on first use)"
+
+        return self.requests_lib if self.requests_lib is not None else self.http
 
     def create_dns_record(self, domain_name, domain_dns_value):
         [subdomain, base_domain] = GandiDns.split_domain(domain_name)
@@ -105,18 +113,12 @@ class GandiDns(common.BaseDns):
 
     @staticmethod
     def split_domain(domain_name):
-        def has_second_level_domain(split_domains):
-            return len(split_domains) >= 2
-
-        split_domains = domain_name.split(".")
-        if not has_second_level_domain(split_domains):
+        if len(domain_name.split(".")) < 2:
             raise RuntimeError(
                 "domain: " + str(domain_name) + "does not have a second level domain"
             )
 
-        separator = "."
-        base_domain = separator.join(split_domains[-2:])
-        subdomain = separator.join(split_domains[0:-2])
+        subdomain, base_domain = split_domain(domain_name)
         if not subdomain:
             subdomain = "@"
 
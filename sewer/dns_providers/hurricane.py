@@ -6,6 +6,7 @@ import json
 import HurricaneDNS as _hurricanedns  # type: ignore
 
 from . import common
+from ..suffix import split_domain
 
 
 class _Response(object):
@@ -36,14 +37,8 @@ class HurricaneDns(common.BaseDns):
         :param str domain_name: the value sewer client passed in, like *.menduo.example.com
         :return tuple: root, zone, acme_txt
         """
-        if domain_name.count(".") > 1:
-            zone, middle, last = str(domain_name).rsplit(".", 2)
-            root = ".".join([middle, last])
-            acme_txt = "_acme-challenge.%s" % zone
-        else:
-            zone = ""
-            root = domain_name
-            acme_txt = "_acme-challenge"
+        zone, root = split_domain(domain_name)
+        acme_txt = "_acme-challenge.%s" % zone if zone else "_acme-challenge"
         return root, zone, acme_txt
 
     def create_dns_record(self, domain_name, domain_dns_value):
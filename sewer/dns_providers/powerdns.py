@@ -3,6 +3,7 @@ import json
 import requests
 
 from . import common
+from ..lib import dns_challenge
 
 
 class PowerDNSDns(common.BaseDns):
@@ -18,38 +19,42 @@ class PowerDNSDns(common.BaseDns):
 
     So, we must be smart about stripping out subdomains as part of the URL passed
     to `requests.patch`, but must maintain the FQDN in the `name` field of the `payload`.
+
+    setup and clear use the bulk hooks: all of a zone's TXT rrsets go in one PATCH,
+    and a name with several challenges (a wildcard and its base) gets all of them.
     """
 
-    def __init__(self, powerdns_api_key, powerdns_api_url, *kwargs):
+    max_concurrency = 4
+
+    def __init__(self, powerdns_api_key, powerdns_api_url, **kwargs):
         self.powerdns_api_key = powerdns_api_key
         self.powerdns_api_url = powerdns_api_url
-        super().__init__(*kwargs)
+        super().__init__(**kwargs)
+
+    def list_zones(self):
+        "the server's zones; the id is the name as it goes in the URL"
+
+        response = self.http.get(
+            self.powerdns_api_url, headers={"X-API-Key": self.powerdns_api_key}
+        )
+        if response.status_code != 200:
+            raise ValueError(
+                "Could not list PowerDNS zones: status_code=%s response=%s"
+                % (response.status_code, response.text)
+            )
+        names = (zone["name"].rstrip(".") for zone in response.json())
+        return {name: name for name in names}
 
     def validate_powerdns_zone(self, domain_name):
         """
-        Walk `domain_name` backwards, trying to find the apex domain.
-        E.g.: For `fu.bar.baz.domain.com`, `response.status_code` will only be
-        `200` for `domain.com`
+        Find the apex domain of `domain_name` in the server's zones.
+        E.g.: For `fu.bar.baz.domain.com` it's `domain.com`, if that's the
+        longest zone name that's a suffix of it.
         """
-        d = "."
-        count = domain_name.count(d)
-
-        while True:
-            url = self.powerdns_api_url + "/" + domain_name
-            response = requests.get(url, headers={"X-API-Key": self.powerdns_api_key})
-
-            if response.status_code == 200:
-                return domain_name
-            elif count <= 0:
-                raise ValueError(
-                    "Could not determine apex domain: (count: %s, domain_name: %s)"
-                    % (count, domain_name)
-                )
-            else:
-                split = domain_name.split(d)
-                split.pop(0)
-                domain_name = d.join(split)
-                count -= 1
+        found = self.zone_index.lookup(domain_name)
+        if found is None:
+            raise ValueError("Could not determine apex domain: (domain_name: %s)" % domain_name)
+        return found[1]
 
     def _common_dns_record(self, domain_name, domain_dns_value, changetype):
         if changetype not in ("REPLACE", "DELETE"):
@@ -69,13 +74,15 @@ class PowerDNSDns(common.BaseDns):
         self.logger.debug("PowerDNS domain name: %s", domain_name)
         self.logger.debug("PowerDNS payload: %s", payload)
 
-        apex_domain = self.validate_powerdns_zone(domain_name)
+        self._patch_zone(self.validate_powerdns_zone(domain_name), payload)
+
+    def _patch_zone(self, apex_domain, payload):
         url = self.powerdns_api_url + "/" + apex_domain
         self.logger.debug("apex_domain: %s", apex_domain)
         self.logger.debug("url: %s", url)
 
         try:
-            response = requests.patch(
+            response = self.http.patch(
                 url, data=json.dumps(payload), headers={"X-API-Key": self.powerdns_api_key}
             )
             self.logger.debug("PowerDNS response: %s, %s", response.status_code, response.text)
@@ -90,6 +97,34 @@ class PowerDNSDns(common.BaseDns):
         if response.status_code != 204:
             raise ValueError("Error creating or deleting PowerDNS record: %s" % response.text)
 
+    ### bulk hooks
+
+    def setup_zone(self, zone, records):
+        rrsets = [
+            {
+                "name": target + ".",
+                "type": "TXT",
+                "ttl": 60,
+                "changetype": "REPLACE",
+                "records": [
+                    {"content": '"%s"' % dns_challenge(chal["key_auth"]), "disabled": False}
+                    for chal in chals
+                ],
+            }
+            for target, chals in records.items()
+        ]
+        self._patch_zone(zone, {"rrsets": rrsets})
+        return []
+
+    def clear_zone(self, zone, records):
+        rrsets = [
+            {"name": target + ".", "type": "TXT", "changetype": "DELETE"} for target in records
+        ]
+        self._patch_zone(zone, {"rrsets": rrsets})
+        return []
+
+    ### legacy DNS methods
+
     def create_dns_record(self, domain_name, domain_dns_value):
         self._common_dns_record(domain_name, domain_dns_value, "REPLACE")
 
@@ -1,12 +1,14 @@
-import time, urllib.parse
-
-import requests, tldextract
+import urllib.parse
 
 from . import common
 from ..lib import log_response
+from ..suffix import registered_domain
 
 
 class RackspaceDns(common.BaseDns):
+    max_concurrency = 4
+    poll_interval = 1  # seconds between callback URL polls
+
     def __init__(self, RACKSPACE_USERNAME, RACKSPACE_API_KEY, **kwargs):
         self.RACKSPACE_DNS_ZONE_ID = None
         self.RACKSPACE_USERNAME = RACKSPACE_USERNAME
@@ -30,7 +32,7 @@ class RackspaceDns(common.BaseDns):
                 }
             }
         }
-        find_rackspace_api_details_response = requests.post(RACKSPACE_IDENTITY_URL, json=payload)
+        find_rackspace_api_details_response = self.http.post(RACKSPACE_IDENTITY_URL, json=payload)
         self.logger.debug(
             "find_rackspace_api_details_response. status_code={0}".format(
                 find_rackspace_api_details_response.status_code
@@ -58,46 +60,38 @@ class RackspaceDns(common.BaseDns):
 
     def get_dns_zone(self, domain_name):
         self.logger.debug("get_dns_zone")
-        extracted_domain = tldextract.extract(domain_name)
-        self.RACKSPACE_DNS_ZONE = ".".join([extracted_domain.domain, extracted_domain.suffix])
+        self.RACKSPACE_DNS_ZONE = registered_domain(domain_name)
+        return self.RACKSPACE_DNS_ZONE
 
-    def find_dns_zone_id(self, domain_name):
-        self.logger.debug("find_dns_zone_id")
-        self.get_dns_zone(domain_name)
+    def list_zones(self):
+        self.logger.debug("list_zones")
         url = self.RACKSPACE_API_BASE_URL + "domains"
-        find_dns_zone_id_response = requests.get(url, headers=self.RACKSPACE_HEADERS)
+        list_zones_response = self.http.get(url, headers=self.RACKSPACE_HEADERS)
         self.logger.debug(
-            "find_dns_zone_id_response. status_code={0}".format(
-                find_dns_zone_id_response.status_code
-            )
+            "list_zones_response. status_code={0}".format(list_zones_response.status_code)
         )
-        if find_dns_zone_id_response.status_code != 200:
+        if list_zones_response.status_code != 200:
             raise ValueError(
                 "Error getting rackspace dns domain info: status_code={status_code} response={response}".format(
-                    status_code=find_dns_zone_id_response.status_code,
-                    response=log_response(find_dns_zone_id_response),
-                )
-            )
-        result = find_dns_zone_id_response.json()
-        domain_data = next(
-            (item for item in result["domains"] if item["name"] == self.RACKSPACE_DNS_ZONE), None
-        )
-        if domain_data is None:
-            raise ValueError(
-                "Error finding information for {dns_zone} in dns response data:\n{response_data})".format(
-                    dns_zone=self.RACKSPACE_DNS_ZONE,
-                    response_data=log_response(find_dns_zone_id_response),
+                    status_code=list_zones_response.status_code,
+                    response=log_response(list_zones_response),
                 )
             )
-        dns_zone_id = domain_data["id"]
+        return {item["name"]: item["id"] for item in list_zones_response.json()["domains"]}
+
+    def find_dns_zone_id(self, domain_name):
+        self.logger.debug("find_dns_zone_id")
+        found = self.zone_index.lookup(domain_name)
+        if found is None:
+            raise ValueError("Error finding a rackspace dns domain for {0}".format(domain_name))
         self.logger.debug("find_dns_zone_id_success")
-        return dns_zone_id
+        return found[1]
 
     def find_dns_record_id(self, domain_name, domain_dns_value):
         self.logger.debug("find_dns_record_id")
-        self.RACKSPACE_DNS_ZONE_ID = self.find_dns_zone_id(domain_name)
-        url = self.RACKSPACE_API_BASE_URL + "domains/{0}/records".format(self.RACKSPACE_DNS_ZONE_ID)
-        find_dns_record_id_response = requests.get(url, headers=self.RACKSPACE_HEADERS)
+        dns_zone_id = self.find_dns_zone_id(domain_name)
+        url = self.RACKSPACE_API_BASE_URL + "domains/{0}/records".format(dns_zone_id)
+        find_dns_record_id_response = self.http.get(url, headers=self.RACKSPACE_HEADERS)
         self.logger.debug(
             "find_dns_record_id_response. status_code={0}".format(
                 find_dns_record_id_response.status_code
@@ -107,7 +101,7 @@ class RackspaceDns(common.BaseDns):
         if find_dns_record_id_response.status_code != 200:
             raise ValueError(
                 "Error finding dns records for {dns_zone}: status_code={status_code} response={response}".format(
-                    dns_zone=self.RACKSPACE_DNS_ZONE,
+                    dns_zone=dns_zone_id,
                     status_code=find_dns_record_id_response.status_code,
                     response=log_response(find_dns_record_id_response),
                 )
@@ -129,10 +123,11 @@ class RackspaceDns(common.BaseDns):
         return record_id
 
     def poll_callback_url(self, callback_url):
-        start_time = time.time()
+        # by the provider's clock, so a VirtualClock (or the caller's) bounds the polling
+        start_time = self.clock.monotonic()
         while True:
-            callback_url_response = requests.get(callback_url, headers=self.RACKSPACE_HEADERS)
-            if time.time() > start_time + self.HTTP_TIMEOUT:
+            callback_url_response = self.http.get(callback_url, headers=self.RACKSPACE_HEADERS)
+            if self.clock.monotonic() > start_time + self.HTTP_TIMEOUT:
                 raise ValueError(
                     "Timed out polling callbackurl for dns record status.  Last status_code={status_code} last response={response}".format(
                         status_code=callback_url_response.status_code,
@@ -155,18 +150,19 @@ class RackspaceDns(common.BaseDns):
                 )
             if callback_url_response.json()["status"] == "COMPLETED":
                 break
+            self.clock.sleep(self.poll_interval)
 
     def create_dns_record(self, domain_name, domain_dns_value):
         self.logger.info("create_dns_record")
-        self.RACKSPACE_DNS_ZONE_ID = self.find_dns_zone_id(domain_name)
+        dns_zone_id = self.find_dns_zone_id(domain_name)
         record_name = "_acme-challenge." + domain_name
         url = urllib.parse.urljoin(
-            self.RACKSPACE_API_BASE_URL, "domains/{0}/records".format(self.RACKSPACE_DNS_ZONE_ID)
+            self.RACKSPACE_API_BASE_URL, "domains/{0}/records".format(dns_zone_id)
         )
         body = {
             "records": [{"name": record_name, "type": "TXT", "data": domain_dns_value, "ttl": 3600}]
         }
-        create_rackspace_dns_record_response = requests.post(
+        create_rackspace_dns_record_response = self.http.post(
             url, headers=self.RACKSPACE_HEADERS, json=body, timeout=self.HTTP_TIMEOUT
         )
         self.logger.debug(
@@ -195,12 +191,12 @@ class RackspaceDns(common.BaseDns):
     def delete_dns_record(self, domain_name, domain_dns_value):
         self.logger.info("delete_dns_record")
         record_name = "_acme-challenge." + domain_name
-        self.RACKSPACE_DNS_ZONE_ID = self.find_dns_zone_id(domain_name)
-        self.RACKSPACE_RECORD_ID = self.find_dns_record_id(domain_name, domain_dns_value)
+        dns_zone_id = self.find_dns_zone_id(domain_name)
+        record_id = self.find_dns_record_id(domain_name, domain_dns_value)
         url = self.RACKSPACE_API_BASE_URL + "domains/{domain_id}/records/?id={record_id}".format(
-            domain_id=self.RACKSPACE_DNS_ZONE_ID, record_id=self.RACKSPACE_RECORD_ID
+            domain_id=dns_zone_id, record_id=record_id
         )
-        delete_dns_record_response = requests.delete(url, headers=self.RACKSPACE_HEADERS)
+        delete_dns_record_response = self.http.delete(url, headers=self.RACKSPACE_HEADERS)
         # After sending a delete request, if all goes well, we get a 202 from the server and a URL that we can poll
         # to see when the job is done
         self.logger.debug(
@@ -4,10 +4,12 @@ import boto3  # type: ignore
 from botocore.client import Config  # type: ignore
 
 from . import common
+from ..lib import dns_challenge
 
 
 # most code of this class is copy from certbot's route53 dns plugin.
 class Route53Dns(common.BaseDns):
+    max_concurrency = 2
     ttl = 10
     connect_timeout = 30
     read_timeout = 30
@@ -47,32 +49,84 @@ class Route53Dns(common.BaseDns):
         challenge_domain = "_acme-challenge" + "." + domain_name + "."
         return self._change_txt_record("DELETE", challenge_domain, domain_dns_value)
 
+    ### bulk hooks: one ChangeBatch per hosted zone
+
+    def setup_zone(self, zone, records):
+        # the tracked records are only updated once Route53 has taken the change
+        changes, updated = [], {}
+        for target, chals in records.items():
+            name = target + "."
+            rrecords = self._resource_records[name] + [
+                {"Value": '"%s"' % dns_challenge(c["key_auth"])} for c in chals
+            ]
+            changes.append(self._txt_change("UPSERT", name, rrecords))
+            updated[name] = rrecords
+        self._change_batch(zone, "UPSERT", changes)
+        self._resource_records.update(updated)
+        return []
+
+    def clear_zone(self, zone, records):
+        changes, updated = [], {}
+        for target, chals in records.items():
+            name = target + "."
+            removed = [{"Value": '"%s"' % dns_challenge(c["key_auth"])} for c in chals]
+            rrecords = list(self._resource_records[name])
+            for challenge in removed:
+                if challenge in rrecords:
+                    rrecords.remove(challenge)
+            if rrecords:
+                # Need to update instead, as we're not deleting the rrset
+                changes.append(self._txt_change("UPSERT", name, rrecords))
+            else:
+                changes.append(self._txt_change("DELETE", name, removed))
+            updated[name] = rrecords
+        self._change_batch(zone, "DELETE", changes)
+        self._resource_records.update(updated)
+        return []
+
+    def _txt_change(self, action, name, rrecords):
+        return {
+            "Action": action,
+            "ResourceRecordSet": {
+                "Name": name,
+                "Type": "TXT",
+                "TTL": self.ttl,
+                "ResourceRecords": list(rrecords),
+            },
+        }
+
+    def _change_batch(self, zone_id, action, changes):
+        response = self.r53.change_resource_record_sets(
+            HostedZoneId=zone_id,
+            ChangeBatch={
+                "Comment": "certbot-dns-route53 certificate validation " + action,
+                "Changes": changes,
+            },
+        )
+        return response["ChangeInfo"]["Id"]
+
+    ### legacy DNS methods' helpers
+
+    def list_zones(self):
+        "the public hosted zones, by name"
+
+        paginator = self.r53.get_paginator("list_hosted_zones")
+        zones = {}
+        for page in paginator.paginate():
+            for zone in page["HostedZones"]:
+                if not zone["Config"]["PrivateZone"]:
+                    zones[zone["Name"].rstrip(".")] = zone["Id"]
+        return zones
+
     def _find_zone_id_for_domain(self, domain):
         """Find the zone id responsible a given FQDN.
            That is, the id for the zone whose name is the longest parent of the
            domain.
         """
-        paginator = self.r53.get_paginator("list_hosted_zones")
-        zones = []
-        target_labels = domain.rstrip(".").split(".")
-        for page in paginator.paginate():
-            for zone in page["HostedZones"]:
-                if zone["Config"]["PrivateZone"]:
-                    continue
-
-                candidate_labels = zone["Name"].rstrip(".").split(".")
-                if candidate_labels == target_labels[-len(candidate_labels) :]:
-                    zones.append((zone["Name"], zone["Id"]))
-
-        if not zones:
+        found = self.zone_index.lookup(domain)
+        if found is None:
             raise RuntimeError("Unable to find a Route53 hosted zone for {0}".format(domain))
-
-        # Order the zones that are suffixes for our desired to domain by
-        # length, this puts them in an order like:
-        # ["foo.bar.baz.com", "bar.baz.com", "baz.com", "com"]
-        # And then we choose the first one, which will be the most specific.
-        zones.sort(key=lambda z: len(z[0]), reverse=True)
-        return zones[0][1]
+        return found[1]
 
     def _change_txt_record(self, action, domain_name, domain_dns_value):
         zone_id = self._find_zone_id_for_domain(domain_name)
@@ -91,21 +145,6 @@ class Route53Dns(common.BaseDns):
         else:
             rrecords.append(challenge)
 
-        response = self.r53.change_resource_record_sets(
-            HostedZoneId=zone_id,
-            ChangeBatch={
-                "Comment": "certbot-dns-route53 certificate validation " + action,
-                "Changes": [
-                    {
-                        "Action": action,
-                        "ResourceRecordSet": {
-                            "Name": domain_name,
-                            "Type": "TXT",
-                            "TTL": self.ttl,
-                            "ResourceRecords": rrecords,
-                        },
-                    }
-                ],
-            },
+        return self._change_batch(
+            zone_id, action, [self._txt_change(action, domain_name, rrecords)]
         )
-        return response["ChangeInfo"]["Id"]
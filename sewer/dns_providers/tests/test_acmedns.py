@@ -18,8 +18,8 @@ class Testacmedns(TestCase):
         self.acmedns_API_KEY = "mock-api-key"
         self.acmedns_API_BASE_URL = "https://some-mock-url.com"
 
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
             mock_requests_post.return_value = test_utils.MockResponse()
             mock_requests_get.return_value = test_utils.MockResponse()
@@ -33,7 +33,7 @@ class Testacmedns(TestCase):
         pass
 
     def test_acmedns_is_called_by_create_dns_record(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
             "sewer.dns_providers.acmedns.AcmeDnsDns.delete_dns_record"
         ) as mock_delete_dns_record, mock.patch("dns.resolver.Resolver.query") as mock_dns_resolver:
             mock_requests_post.return_value = (
@@ -55,7 +55,7 @@ class Testacmedns(TestCase):
             )
 
     def test_acmedns_is_not_called_by_delete_dns_record(self):
-        with mock.patch("requests.post") as mock_requests_post:
+        with mock.patch("requests.Session.post") as mock_requests_post:
             mock_requests_post.return_value = test_utils.MockResponse()
             self.dns_class.delete_dns_record(
                 domain_name=self.domain_name, domain_dns_value=self.domain_dns_value
@@ -19,8 +19,8 @@ class TestCloudflare(TestCase):
         self.CLOUDFLARE_API_BASE_URL = "https://some-mock-url.com"
         self.CLOUDFLARE_TOKEN = "mock-token"
 
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
             mock_requests_post.return_value = test_utils.MockResponse()
             mock_requests_get.return_value = test_utils.MockResponse()
@@ -30,8 +30,8 @@ class TestCloudflare(TestCase):
                 CLOUDFLARE_API_BASE_URL=self.CLOUDFLARE_API_BASE_URL,
             )
 
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
             mock_requests_post.return_value = test_utils.MockResponse()
             mock_requests_get.return_value = test_utils.MockResponse()
@@ -44,9 +44,11 @@ class TestCloudflare(TestCase):
         pass
 
     def test_delete_dns_record_is_not_called_by_create_dns_record(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
-        ) as mock_requests_get, mock.patch("requests.delete") as mock_requests_delete, mock.patch(
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
+        ) as mock_requests_get, mock.patch(
+            "requests.Session.delete"
+        ) as mock_requests_delete, mock.patch(
             "sewer.dns_providers.cloudflare.CloudFlareDns.delete_dns_record"
         ) as mock_delete_dns_record:
             mock_requests_post.return_value = (
@@ -66,9 +68,11 @@ class TestCloudflare(TestCase):
             self.assertFalse(mock_delete_dns_record.called)
 
     def test_cloudflare_is_called_by_create_dns_record(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
-        ) as mock_requests_get, mock.patch("requests.delete") as mock_requests_delete, mock.patch(
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
+        ) as mock_requests_get, mock.patch(
+            "requests.Session.delete"
+        ) as mock_requests_delete, mock.patch(
             "sewer.dns_providers.cloudflare.CloudFlareDns.delete_dns_record"
         ) as mock_delete_dns_record:
             mock_requests_post.return_value = (
@@ -111,9 +115,9 @@ class TestCloudflare(TestCase):
             )
 
     def test_cloudflare_is_called_by_delete_dns_record(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
-        ) as mock_requests_get, mock.patch("requests.delete") as mock_requests_delete:
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
+        ) as mock_requests_get, mock.patch("requests.Session.delete") as mock_requests_delete:
             mock_requests_post.return_value = (
                 mock_requests_delete.return_value
             ) = test_utils.MockResponse()
@@ -134,7 +138,7 @@ class TestCloudflare(TestCase):
             }
             self.assertDictEqual(expected, mock_requests_delete.call_args[1])
             self.assertIn(
-                "https://some-mock-url.com/zones/None/dns_records/some-mock-dns-zone-id",
+                "https://some-mock-url.com/zones/some-mock-dns-zone-id/dns_records/some-mock-dns-zone-id",
                 str(mock_requests_delete.call_args),
             )
 
@@ -149,7 +153,7 @@ class TestCloudflare(TestCase):
             }
             self.assertDictEqual(expected, mock_requests_delete.call_args[1])
             self.assertIn(
-                "https://some-mock-url.com/zones/None/dns_records/some-mock-dns-zone-id",
+                "https://some-mock-url.com/zones/some-mock-dns-zone-id/dns_records/some-mock-dns-zone-id",
                 str(mock_requests_delete.call_args),
             )
 
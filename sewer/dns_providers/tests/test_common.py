@@ -1,3 +1,4 @@
+import threading, time
 from unittest import mock, TestCase
 
 import sewer.dns_providers.common
@@ -47,3 +48,62 @@ class TestCommon(TestCase):
         with mock.patch("sewer.dns_providers.common.BaseDns.delete_dns_record") as ddr:
             self.dns_class.clear(self.challenges)
             self.assertTrue(ddr.called)
+
+    def test_setup_concurrent_up_to_limit(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def slow_create(domain_name, domain_dns_value):
+            with lock:
+                running.append(domain_name)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(domain_name)
+
+        challenges = [
+            {"ident_value": "n%s.example.com" % i, "key_auth": "abcdefgh12345678"} for i in range(8)
+        ]
+        dns_class = sewer.dns_providers.common.BaseDns(max_concurrency=3)
+        with mock.patch.object(dns_class, "create_dns_record", side_effect=slow_create) as cdr:
+            self.assertEqual(dns_class.setup(challenges), [])
+        self.assertEqual(cdr.call_count, 8)
+        self.assertEqual(max(peak), 3)
+
+    def test_clear_failures_become_errata(self):
+        challenges = [
+            {"ident_value": "n%s.example.com" % i, "key_auth": "abcdefgh12345678"} for i in range(4)
+        ]
+
+        def delete(domain_name, domain_dns_value):
+            if domain_name == "n1.example.com":
+                raise ValueError("no such record")
+
+        dns_class = sewer.dns_providers.common.BaseDns(max_concurrency=4)
+        with mock.patch.object(dns_class, "delete_dns_record", side_effect=delete) as ddr:
+            errata = dns_class.clear(challenges)
+        self.assertEqual(ddr.call_count, 4)
+        self.assertEqual(errata, [("failed", "no such record", challenges[1])])
+
+    def test_setup_same_name_is_serial_and_skips_after_failure(self):
+        challenges = [
+            {"ident_value": "example.com", "key_auth": "abcdefgh12345678"},
+            {"ident_value": "example.com", "key_auth": "12345678abcdefgh"},
+        ]
+        dns_class = sewer.dns_providers.common.BaseDns(max_concurrency=4)
+        with mock.patch.object(
+            dns_class, "create_dns_record", side_effect=ValueError("quota exceeded")
+        ) as cdr:
+            errata = dns_class.setup(challenges)
+        self.assertEqual(cdr.call_count, 1)
+        self.assertEqual([e[0] for e in errata], ["failed", "skipped"])
+        self.assertEqual([e[2] for e in errata], challenges)
+
+    def test_max_concurrency_declared_by_driver(self):
+        class Declared(sewer.dns_providers.common.BaseDns):
+            max_concurrency = 6
+
+        self.assertEqual(self.dns_class.max_concurrency, 1)
+        self.assertEqual(Declared().max_concurrency, 6)
+        self.assertEqual(Declared(max_concurrency="2").max_concurrency, 2)
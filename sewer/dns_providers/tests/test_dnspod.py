@@ -37,8 +37,8 @@ class TestDNSPod(TestCase):
             },
         ]
 
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
             mock_requests_post.return_value = test_utils.MockResponse()
             mock_requests_get.return_value = test_utils.MockResponse()
@@ -54,8 +54,8 @@ class TestDNSPod(TestCase):
     def test_delete_dns_record_is_not_called_by_create_dns_record(
         self,
     ):  # actually I don't know the purpose of this.
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get, mock.patch(
             "sewer.dns_providers.dnspod.DNSPodDns.delete_dns_record"
         ) as mock_delete_dns_record:
@@ -70,9 +70,11 @@ class TestDNSPod(TestCase):
             self.assertFalse(mock_delete_dns_record.called)
 
     def test_dnspod_is_called_by_create_dns_record(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
-        ) as mock_requests_get, mock.patch("requests.delete") as mock_requests_delete, mock.patch(
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
+        ) as mock_requests_get, mock.patch(
+            "requests.Session.delete"
+        ) as mock_requests_delete, mock.patch(
             "sewer.dns_providers.dnspod.DNSPodDns.delete_dns_record"
         ) as mock_delete_dns_record:
             for test_data in self.test_datas:
@@ -99,9 +101,9 @@ class TestDNSPod(TestCase):
                 self.assertDictEqual(expected, mock_requests_post.call_args[1]["data"])
 
     def test_dnspod_is_called_by_delete_dns_record(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
-        ) as mock_requests_get, mock.patch("requests.delete") as mock_requests_delete:
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
+        ) as mock_requests_get, mock.patch("requests.Session.delete") as mock_requests_delete:
             for test_data in self.test_datas:
                 mock_resp = {
                     "status": {"code": "1", "message": "Action completed successful"},
@@ -132,9 +134,11 @@ class TestDNSPod(TestCase):
                 )
 
     def test_exception_is_raised_if_unsuccessful(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
-        ) as mock_requests_get, mock.patch("requests.delete") as mock_requests_delete, mock.patch(
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
+        ) as mock_requests_get, mock.patch(
+            "requests.Session.delete"
+        ) as mock_requests_delete, mock.patch(
             "sewer.dns_providers.dnspod.DNSPodDns.delete_dns_record"
         ) as mock_delete_dns_record:
             for test_data in self.test_datas:
@@ -13,7 +13,7 @@ class TestDuckDNS(TestCase):
         self.duckdns_API_BASE_URL = "https://some-mock-url.com"
 
         self.duck_mresponse = test_utils.MockResponse(content="OK")
-        with mock.patch("requests.get") as mock_requests_get:
+        with mock.patch("requests.Session.get") as mock_requests_get:
             mock_requests_get.return_value = self.duck_mresponse
             self.dns_class = DuckDNSDns(
                 duckdns_token=self.duckdns_API_KEY, DUCKDNS_API_BASE_URL=self.duckdns_API_BASE_URL
@@ -23,7 +23,7 @@ class TestDuckDNS(TestCase):
         pass
 
     def test_duckdns_is_called_by_create_dns_record(self):
-        with mock.patch("requests.get") as mock_requests_get, mock.patch(
+        with mock.patch("requests.Session.get") as mock_requests_get, mock.patch(
             "sewer.dns_providers.duckdns.DuckDNSDns.delete_dns_record"
         ) as mock_delete_dns_record:
 
@@ -43,7 +43,7 @@ class TestDuckDNS(TestCase):
             )
 
     def test_duckdns_is_called_by_delete_dns_record(self):
-        with mock.patch("requests.get") as mock_requests_get:
+        with mock.patch("requests.Session.get") as mock_requests_get:
             mock_requests_get.return_value = self.duck_mresponse
             self.dns_class.delete_dns_record(
                 domain_name=self.domain_name, domain_dns_value=self.domain_dns_value
@@ -169,3 +169,8 @@ class TestGandiDns(TestCase):
         self.assertEqual(post_calls[0][1]["json"]["rrset_ttl"], 10800)
         self.assertEqual(post_calls[0][1]["json"]["rrset_name"], "_acme-challenge.subdomain")
         self.assertEqual(post_calls[0][1]["json"]["rrset_values"], ["val"])
+
+    def test_session_created_on_first_use(self):
+        gandi_dns = GandiDns(GANDI_API_KEY=MOCK_GANDI_API_KEY)
+        self.assertIsNone(gandi_dns._http)
+        self.assertIs(gandi_dns.requests, gandi_dns.http)
@@ -1,3 +1,4 @@
+import json
 from unittest import mock
 from unittest import TestCase
 
@@ -18,8 +19,11 @@ class TestPowerDNS(TestCase):
         self.powerdns_api_url = "https://some-mock-url.com"
 
         self.common_response = test_utils.MockResponse(status_code=204)
-        self.apex_response = test_utils.MockResponse(status_code=200)
-        with mock.patch("requests.patch") as mock_requests_get:
+        # the server's zone listing
+        self.apex_response = test_utils.MockResponse(
+            status_code=200, content=[{"name": "example.com.", "id": "example.com."}]
+        )
+        with mock.patch("requests.Session.patch") as mock_requests_get:
             mock_requests_get.return_value = self.common_response
             self.dns_class = PowerDNSDns(
                 powerdns_api_key=self.powerdns_api_key, powerdns_api_url=self.powerdns_api_url
@@ -31,7 +35,7 @@ class TestPowerDNS(TestCase):
     def test_validate_powerdns_zone(self):
         fqdn = f"fu.bar.baz.{self.domain_name}"
 
-        with mock.patch("requests.get") as mock_requests_get, mock.patch(
+        with mock.patch("requests.Session.get") as mock_requests_get, mock.patch(
             "sewer.dns_providers.powerdns.PowerDNSDns.validate_powerdns_zone"
         ) as mock_validate_powerdns_zone:
 
@@ -44,7 +48,7 @@ class TestPowerDNS(TestCase):
         mock_validate_powerdns_zone.assert_called_with(fqdn)
 
     def test_could_not_determine_apex_domain(self):
-        with mock.patch("requests.get") as mock_requests_get:
+        with mock.patch("requests.Session.get") as mock_requests_get:
             mock_requests_get.return_value.status_code = 666
 
             self.assertRaises(
@@ -61,8 +65,8 @@ class TestPowerDNS(TestCase):
         )
 
     def test_powerdns_returns_correct_status_code(self):
-        with mock.patch("requests.patch") as mock_requests_patch, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.patch") as mock_requests_patch, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
 
             mock_requests_get.return_value = self.apex_response
@@ -76,9 +80,9 @@ class TestPowerDNS(TestCase):
             )
 
     def test_powerdns_is_called_by_create_dns_record(self):
-        with mock.patch("requests.patch") as mock_requests_patch, mock.patch(
+        with mock.patch("requests.Session.patch") as mock_requests_patch, mock.patch(
             "sewer.dns_providers.powerdns.PowerDNSDns.delete_dns_record"
-        ) as mock_delete_dns_record, mock.patch("requests.get") as mock_requests_get:
+        ) as mock_delete_dns_record, mock.patch("requests.Session.get") as mock_requests_get:
 
             mock_requests_get.return_value = self.apex_response
             mock_requests_patch.return_value = (
@@ -90,8 +94,8 @@ class TestPowerDNS(TestCase):
             )
 
     def test_powerdns_is_called_by_delete_dns_record(self):
-        with mock.patch("requests.patch") as mock_requests_patch, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.patch") as mock_requests_patch, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
 
             mock_requests_get.return_value = self.apex_response
@@ -100,3 +104,28 @@ class TestPowerDNS(TestCase):
                 domain_name=self.domain_name, domain_dns_value=self.domain_dns_value
             )
             self.assertTrue(mock_requests_patch.called)
+
+    def test_powerdns_setup_one_patch_per_zone(self):
+        challenges = [
+            {"ident_value": name, "key_auth": "key-auth-" + name}
+            for name in ("example.com", "example.com", "www.example.com")
+        ]
+        with mock.patch("requests.Session.patch") as mock_requests_patch, mock.patch(
+            "requests.Session.get"
+        ) as mock_requests_get:
+
+            mock_requests_get.return_value = self.apex_response
+            mock_requests_patch.return_value = self.common_response
+            self.assertEqual(self.dns_class.setup(challenges), [])
+
+        self.assertEqual(mock_requests_get.call_count, 1)
+        self.assertEqual(mock_requests_patch.call_count, 1)
+        self.assertEqual(
+            mock_requests_patch.call_args[0][0], self.powerdns_api_url + "/" + self.domain_name
+        )
+        rrsets = json.loads(mock_requests_patch.call_args[1]["data"])["rrsets"]
+        self.assertEqual(
+            [rrset["name"] for rrset in rrsets],
+            ["_acme-challenge.example.com.", "_acme-challenge.www.example.com."],
+        )
+        self.assertEqual(len(rrsets[0]["records"]), 2)
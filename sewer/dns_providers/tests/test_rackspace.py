@@ -1,6 +1,7 @@
 from unittest import mock
 from unittest import TestCase
 
+from sewer.clock import VirtualClock
 from sewer.dns_providers.rackspace import RackspaceDns
 
 from . import test_utils
@@ -17,8 +18,8 @@ class TestRackspace(TestCase):
         self.RACKSPACE_API_KEY = "mock-api-key"
         self.RACKSPACE_API_TOKEN = "mock-api-token"
 
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get, mock.patch(
             "sewer.dns_providers.rackspace.RackspaceDns.get_rackspace_credentials"
         ) as mock_get_credentials, mock.patch(
@@ -36,7 +37,7 @@ class TestRackspace(TestCase):
         pass
 
     def test_find_dns_zone_id(self):
-        with mock.patch("requests.get") as mock_requests_get:
+        with mock.patch("requests.Session.get") as mock_requests_get:
             # see: https://developer.rackspace.com/docs/cloud-dns/v1/api-reference/domains/
             mock_dns_zone_id = 1_239_932
             mock_requests_content = {
@@ -58,7 +59,7 @@ class TestRackspace(TestCase):
             self.assertTrue(mock_requests_get.called)
 
     def test_find_dns_record_id(self):
-        with mock.patch("requests.get") as mock_requests_get, mock.patch(
+        with mock.patch("requests.Session.get") as mock_requests_get, mock.patch(
             "sewer.dns_providers.rackspace.RackspaceDns.find_dns_zone_id"
         ) as mock_find_dns_zone_id:
             # see: https://developer.rackspace.com/docs/cloud-dns/v1/api-reference/records/
@@ -90,10 +91,12 @@ class TestRackspace(TestCase):
     def test_delete_dns_record_is_not_called_by_create_dns_record(self):
         with mock.patch(
             "sewer.dns_providers.rackspace.RackspaceDns.find_dns_zone_id"
-        ) as mock_find_dns_zone_id, mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        ) as mock_find_dns_zone_id, mock.patch(
+            "requests.Session.post"
+        ) as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get, mock.patch(
-            "requests.delete"
+            "requests.Session.delete"
         ) as mock_requests_delete, mock.patch(
             "sewer.dns_providers.rackspace.RackspaceDns.delete_dns_record"
         ) as mock_delete_dns_record, mock.patch(
@@ -112,9 +115,11 @@ class TestRackspace(TestCase):
             self.assertFalse(mock_delete_dns_record.called)
 
     def test_rackspace_is_called_by_create_dns_record(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
-        ) as mock_requests_get, mock.patch("requests.delete") as mock_requests_delete, mock.patch(
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
+        ) as mock_requests_get, mock.patch(
+            "requests.Session.delete"
+        ) as mock_requests_delete, mock.patch(
             "sewer.dns_providers.rackspace.RackspaceDns.delete_dns_record"
         ) as mock_delete_dns_record, mock.patch(
             "sewer.dns_providers.rackspace.RackspaceDns.find_dns_zone_id"
@@ -142,9 +147,11 @@ class TestRackspace(TestCase):
             )
 
     def test_rackspace_is_called_by_delete_dns_record(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
-        ) as mock_requests_get, mock.patch("requests.delete") as mock_requests_delete, mock.patch(
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
+        ) as mock_requests_get, mock.patch(
+            "requests.Session.delete"
+        ) as mock_requests_delete, mock.patch(
             "sewer.dns_providers.rackspace.RackspaceDns.find_dns_zone_id"
         ) as mock_find_dns_zone_id, mock.patch(
             "sewer.dns_providers.rackspace.RackspaceDns.poll_callback_url"
@@ -169,3 +176,11 @@ class TestRackspace(TestCase):
             }
             self.assertDictEqual(expected["headers"], mock_requests_delete.call_args[1]["headers"])
             self.assertEqual(expected["url"], mock_requests_delete.call_args[0][0])
+
+    def test_poll_callback_url_goes_by_provider_clock(self):
+        self.dns_class.clock = clock = VirtualClock()
+        with mock.patch("requests.Session.get") as mock_requests_get:
+            mock_requests_get.return_value = test_utils.MockResponse(200, {"status": "RUNNING"})
+            with self.assertRaises(ValueError):
+                self.dns_class.poll_callback_url("http://example.com/callbackUrl")
+        self.assertEqual(clock.elapsed, self.dns_class.HTTP_TIMEOUT + 1)
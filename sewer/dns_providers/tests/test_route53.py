@@ -131,3 +131,56 @@ class TestRoute53(TestCase):
             HostedZoneId="mocked-id",
             ChangeBatch=self.make_change_batch("DELETE", self.domain_name, self.domain_dns_value),
         )
+
+    @mock.patch("sewer.dns_providers.route53.boto3.client")
+    def test_route53_setup_one_change_batch_per_zone(self, mock_client):
+        dns_class = Route53Dns()
+        mock_client.return_value.get_paginator.return_value.paginate.return_value = (
+            self.mocked_find_zone_response()
+        )
+        mock_client.return_value.change_resource_record_sets.return_value = (
+            self.mocked_route53_set_record_response()
+        )
+        challenges = [
+            {"ident_value": name, "key_auth": "key-auth-" + name}
+            for name in ("example.com", "example.com", "www.example.com")
+        ]
+
+        self.assertEqual(dns_class.setup(challenges), [])
+        self.assertEqual(dns_class.clear(challenges), [])
+
+        calls = mock_client.return_value.change_resource_record_sets.call_args_list
+        self.assertEqual(len(calls), 2)
+        setup_changes = calls[0][1]["ChangeBatch"]["Changes"]
+        self.assertEqual([c["Action"] for c in setup_changes], ["UPSERT", "UPSERT"])
+        self.assertEqual(len(setup_changes[0]["ResourceRecordSet"]["ResourceRecords"]), 2)
+        clear_changes = calls[1][1]["ChangeBatch"]["Changes"]
+        self.assertEqual([c["Action"] for c in clear_changes], ["DELETE", "DELETE"])
+        self.assertEqual(
+            clear_changes[0]["ResourceRecordSet"], setup_changes[0]["ResourceRecordSet"]
+        )
+
+    @mock.patch("sewer.dns_providers.route53.boto3.client")
+    def test_route53_failed_change_batch_not_tracked(self, mock_client):
+        dns_class = Route53Dns()
+        mock_client.return_value.get_paginator.return_value.paginate.return_value = (
+            self.mocked_find_zone_response()
+        )
+        change = mock_client.return_value.change_resource_record_sets
+        change.side_effect = Exception("throttled")
+        challenges = [{"ident_value": "example.com", "key_auth": "key-auth-1"}]
+
+        self.assertEqual(dns_class.setup(challenges)[0][0], "failed")
+        self.assertEqual(dns_class._resource_records["_acme-challenge.example.com."], [])
+
+        # a retried setup sends just the one record, and a failed clear keeps it tracked
+        change.side_effect = None
+        change.return_value = self.mocked_route53_set_record_response()
+        self.assertEqual(dns_class.setup(challenges), [])
+        records = change.call_args[1]["ChangeBatch"]["Changes"][0]["ResourceRecordSet"]
+        self.assertEqual(len(records["ResourceRecords"]), 1)
+        change.side_effect = Exception("throttled")
+        self.assertEqual(dns_class.clear(challenges)[0][0], "failed")
+        self.assertEqual(
+            dns_class._resource_records["_acme-challenge.example.com."], records["ResourceRecords"]
+        )
@@ -21,6 +21,8 @@ class UnboundSsh(BaseDns):
         ...
     """
 
+    max_concurrency = 2
+
     def __init__(self, *, ssh_des, **kwargs):
         """
         ssh_des is a REQUIRED keyword option that specifies the "destination"
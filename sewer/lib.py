@@ -1,6 +1,12 @@
 import base64, codecs, json, logging, os
 from hashlib import sha256
-from typing import Any, Union
+from typing import Any, Dict, Union
+
+# orjson is an optional, faster JSON encoder; it produces the same compact form
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
 
 LoggerType = logging.Logger
 
@@ -19,6 +25,86 @@ class AcmeRegistrationError(AcmeError):
     pass
 
 
+class AcmeAuthorizationError(AcmeError):
+    "one or more authorizations failed; errors maps each identifier to its exception"
+
+    def __init__(self, errors: Dict[str, Exception]) -> None:
+        self.errors = errors
+        super().__init__(
+            "; ".join("%s: %s" % (ident, str(exc)[:100]) for ident, exc in errors.items())
+        )
+
+
+class AcmeDeadlineError(AcmeError):
+    "the issuance's time budget (see clock.Deadline) ran out"
+    pass
+
+
+class AcmeCancelledError(AcmeDeadlineError):
+    "the issuance was cancelled (Deadline.cancel) from another thread"
+    pass
+
+
+### RFC8555 problem documents (section 6.7) as typed exceptions
+
+ACME_ERROR_PREFIX = "urn:ietf:params:acme:error:"
+
+
+class AcmeProblem(AcmeError):
+    """
+    The server's problem document: type (without the ACME urn prefix),
+    detail, the HTTP status and the (whole) problem dict.  Subclasses mark
+    the problems that the retry policy treats specially.
+    """
+
+    def __init__(self, problem: Dict[str, Any], status: int) -> None:
+        self.problem = problem
+        self.status = status
+        self.type = str(problem.get("type", "")).replace(ACME_ERROR_PREFIX, "")
+        self.detail = problem.get("detail", "")
+        super().__init__("%s %s: %s" % (status, self.type or "problem", self.detail))
+
+
+class AcmeBadNonceError(AcmeProblem):
+    pass
+
+
+class AcmeRateLimitedError(AcmeProblem):
+    pass
+
+
+class AcmeServerError(AcmeProblem):
+    "serverInternal, or any 5xx response"
+    pass
+
+
+problem_classes = {
+    "badNonce": AcmeBadNonceError,
+    "rateLimited": AcmeRateLimitedError,
+    "serverInternal": AcmeServerError,
+}
+
+
+def acme_problem(response: Any) -> Union[AcmeProblem, None]:
+    """
+    returns the typed AcmeProblem for an error response, or None for success.
+    A 5xx response without a usable problem document is still an AcmeServerError.
+    """
+
+    status = response.status_code
+    if status < 400:
+        return None
+    try:
+        problem = response.json()
+    except ValueError:
+        problem = None
+    if not isinstance(problem, dict):
+        problem = {"detail": str(response.content[:40])}
+    ptype = str(problem.get("type", "")).replace(ACME_ERROR_PREFIX, "")
+    cls = problem_classes.get(ptype, AcmeServerError if 500 <= status else AcmeProblem)
+    return cls(problem, status)
+
+
 ### FIX ME ### can be more specific about response arg's type... somehow
 
 
@@ -57,6 +143,20 @@ def safe_base64(un_encoded_data: Union[str, bytes]) -> str:
     return r.decode("utf8")
 
 
+def safe_base64_bytes(un_encoded_data: bytes) -> bytes:
+    "safe_base64 without the str round trip, for building the JWS as bytes"
+
+    return base64.urlsafe_b64encode(un_encoded_data).rstrip(b"=")
+
+
+def json_dumps(obj: Any) -> str:
+    "compact JSON encoding, using orjson when it's installed"
+
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf8")
+    return json.dumps(obj, separators=(",", ":"))
+
+
 def dns_challenge(key_auth: str) -> str:
     "return the ACME challenge response for a DNS TXT record"
 
@@ -0,0 +1,113 @@
+"nonce.py - a pool of ACME Replay-Nonce values harvested from server responses"
+
+import threading, time
+from collections import deque
+from typing import Any, Callable, Deque, Optional, Tuple
+
+from .lib import AcmeError
+
+
+class AcmeNonceError(AcmeError):
+    pass
+
+
+class NoncePool:
+    """
+    RFC8555 section 7.2 says the server MAY (and LE does) provide a fresh nonce
+    in the Replay-Nonce header of every response.  Harvesting those means that
+    a signed POST normally needs no extra trip to newNonce before it can be
+    sent; only when the pool is empty do we have to ask for one.
+
+    * add(response) harvests the Replay-Nonce from any response (GET, HEAD, POST)
+    * get() returns the freshest unexpired nonce, fetching one if the pool is empty
+    * nonces older than max_age seconds are dropped rather than risk a badNonce
+    * if low_water > 0, a background thread refills the pool (using fetch, which
+      should be a HEAD to newNonce) whenever get() leaves fewer than low_water.
+
+    fetch is a callable returning a response; the pool takes the nonce from
+    that response's headers, so fetch must not add() the response itself or
+    the same nonce would be in the pool twice.  Any arguments to get() are
+    passed on to fetch (the background refill passes none).  The pool is safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Any],
+        *,
+        max_age: float = 60,
+        max_size: int = 16,
+        low_water: int = 0,
+    ) -> None:
+        self.fetch = fetch
+        self.max_age = max_age
+        self.low_water = low_water
+        self._nonces: Deque[Tuple[float, str]] = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+        self._refilling = False
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._nonces)
+
+    def add(self, response: Any) -> bool:
+        "harvest the nonce, if any, from response.  Returns True if there was one."
+
+        headers = getattr(response, "headers", None)
+        nonce = headers.get("Replay-Nonce") if headers else None
+        if nonce:
+            with self._lock:
+                self._nonces.append((time.monotonic(), nonce))
+            return True
+        return False
+
+    def get(self, *fetch_args: Any) -> str:
+        "return a fresh nonce, taken from the pool if possible"
+
+        nonce = self._pop()
+        if nonce is None:
+            self.add(self.fetch(*fetch_args))
+            nonce = self._pop()
+            if nonce is None:
+                raise AcmeNonceError("newNonce response did not have a Replay-Nonce header")
+        if self.low_water:
+            self._maybe_refill()
+        return nonce
+
+    def clear(self) -> None:
+        with self._lock:
+            self._nonces.clear()
+
+    ### internals
+
+    def _expire(self, now: float) -> None:
+        "call with lock held.  Oldest nonces are on the left."
+
+        while self._nonces and now - self._nonces[0][0] > self.max_age:
+            self._nonces.popleft()
+
+    def _pop(self) -> Optional[str]:
+        with self._lock:
+            self._expire(time.monotonic())
+            if self._nonces:
+                return self._nonces.pop()[1]
+        return None
+
+    def _maybe_refill(self) -> None:
+        with self._lock:
+            if self._refilling or len(self._nonces) >= self.low_water:
+                return
+            self._refilling = True
+        threading.Thread(target=self._refill, name="sewer-nonce-refill", daemon=True).start()
+
+    def _refill(self) -> None:
+        try:
+            while len(self) < self.low_water:
+                if not self.add(self.fetch()):
+                    break
+        except Exception:
+            # best effort only: get() will fetch synchronously if the pool runs dry
+            pass
+        finally:
+            with self._lock:
+                self._refilling = False
@@ -0,0 +1,104 @@
+"poll.py - polling ACME resources with Retry-After and jittered exponential backoff"
+
+import random, time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Iterator, Optional
+
+from .lib import AcmeError
+
+
+class AcmePollTimeout(AcmeError):
+    pass
+
+
+def retry_after(response: Any) -> Optional[float]:
+    """
+    Returns the delay in seconds requested by the response's Retry-After
+    header, or None if there isn't one (or it can't be parsed).  RFC7231
+    allows either delay-seconds or an HTTP-date.
+    """
+
+    headers = getattr(response, "headers", None)
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class Poller:
+    """
+    Repeats a request until its response satisfies done(response).
+
+    The first request is made at once.  Between requests it waits for the
+    server's Retry-After if one was given (but no more than max_retry_after),
+    otherwise for an exponentially growing delay from initial up to maximum,
+    with +/- jitter (a fraction) to keep many clients from polling in step.
+
+    It gives up, raising AcmePollTimeout, only when it has made at least
+    max_checks requests AND timeout seconds have passed since the first.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial: float = 1,
+        maximum: float = 8,
+        factor: float = 2,
+        jitter: float = 0.2,
+        max_checks: int = 3,
+        timeout: float = 24,
+        max_retry_after: float = 60,
+        sleep: Callable[[float], None] = time.sleep,
+        now: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.initial = min(initial, maximum)
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.max_checks = max_checks
+        self.timeout = timeout
+        self.max_retry_after = max_retry_after
+        self.sleep = sleep
+        self.now = now
+
+    def delays(self):
+        "the backoff schedule, without jitter: initial, initial*factor, ... maximum forever"
+
+        delay = self.initial
+        while True:
+            yield delay
+            delay = min(delay * self.factor, self.maximum)
+
+    def poll(self, fetch: Callable[[], Any], done: Callable[[Any], bool], what: str = "") -> Any:
+        start = self.now()
+        checks = 0
+        backoff = self.delays()
+        while True:
+            response = fetch()
+            checks += 1
+            if done(response):
+                return response
+            self.sleep(self.next_delay(response, checks, start, backoff, what))
+
+    def next_delay(
+        self, response: Any, checks: int, start: float, backoff: Iterator[float], what: str
+    ) -> float:
+        "how long to wait before the next check, or raise AcmePollTimeout if it's time to give up"
+
+        if checks >= self.max_checks and self.now() - start >= self.timeout:
+            raise AcmePollTimeout(
+                "%s not done after %s checks in %.1f seconds"
+                % (what or "poll", checks, self.now() - start)
+            )
+        hint = retry_after(response)
+        if hint is not None:
+            next(backoff)
+            return min(hint, self.max_retry_after)
+        return next(backoff) * random.uniform(1 - self.jitter, 1 + self.jitter)
@@ -0,0 +1,664 @@
+"protocol.py - the ACME order flow as a sans-IO state machine, with sync and async drivers"
+
+import asyncio, time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generator, List, NamedTuple, Optional, Sequence, Set, Tuple
+from typing import Union
+
+from .auth import ChalListType, ProviderBase
+from .cleanup import CleanupQueue
+from .clock import Deadline
+from .lib import AcmeAuthorizationError, AcmeDeadlineError, json_dumps, log_response, safe_base64
+from .poll import Poller, retry_after
+
+### Actions: what the protocol asks its driver to do.  The value sent back into the
+### generator is the action's result; a driver's exception is thrown into it instead.
+
+
+class Request(NamedTuple):
+    "sign and POST payload to url (payload '' is POST-as-GET); the result is the response"
+
+    url: str
+    payload: str = ""
+    needs_jwk: bool = False
+
+
+class Wait(NamedTuple):
+    "sleep this long; the result is None"
+
+    seconds: float
+
+
+class Call(NamedTuple):
+    "call the provider's setup, unpropagated or clear; the result is its errata list"
+
+    method: str
+    challenges: ChalListType
+
+
+class Parallel(NamedTuple):
+    """
+    run the steps (each itself a generator of actions) concurrently; the
+    result is the list of their results.  If any fail, AcmeAuthorizationError
+    is thrown, keyed by the corresponding identities.
+    """
+
+    steps: List[Generator]
+    identities: List[str]
+
+
+class Event(NamedTuple):
+    """
+    progress the driver may want to record; the result is None.  Names are:
+      order         a new order: order_url, finalize_url, authorizations
+      resume        the journaled order is being resumed: order_url, status
+      journal       changes to the order's journal record
+      challenge     a streamed challenge, to be added to those journaled
+                    before it's set up (streamed steps run in parallel, so
+                    each adds its own rather than replacing the list)
+      done          the order is finished with, drop its journal record
+      authz_valid   name, url, expires of a valid authorization
+      authz_distrust  the known_valid authorizations are suspect
+    """
+
+    name: str
+    data: Dict[str, Any]
+
+
+class Hook(NamedTuple):
+    """
+    a step a driver may do its own way: given a callback of this name, it
+    calls that with args; otherwise it runs default (itself a generator of
+    actions).  The result is the step's either way.  This is how Client's
+    overridable methods (get_identifier_authorization, send_csr, ...) stay
+    in the flow.
+    """
+
+    name: str
+    args: Tuple[Any, ...]
+    default: Generator
+
+
+ActionType = Union[Request, Wait, Call, Parallel, Event, Hook]
+StepType = Generator[ActionType, Any, Any]
+
+
+def chal_identifier(chal: Dict[str, str]) -> str:
+    "name for a challenge's identifier in error reports (wildcard and bare names are distinct)"
+
+    return ("*." if chal.get("wildcard") else "") + chal["ident_value"]
+
+
+def check_status(response: Any, ok: Sequence[int], what: str) -> Any:
+    if response.status_code not in ok:
+        raise ValueError(
+            "Error {what}: status_code={status_code} response={response}".format(
+                what=what, status_code=response.status_code, response=log_response(response)
+            )
+        )
+    return response
+
+
+class OrderProtocol:
+    """
+    One certificate order, RFC8555 section 7.4 from newOrder to certificate
+    download, with no I/O of its own.  issue() is a generator: it yields
+    actions (above) and is sent their results, finally returning the PEM
+    certificate.  Any driver can run it - SyncDriver and AsyncDriver below,
+    or a simulator answering with canned responses at CPU speed.
+
+    The inputs are everything the flow needs that would otherwise take I/O:
+    the directory, the key authorization function (the account thumbprint
+    is cached), the CSR, authorization URLs known to be valid and the
+    journal record of an interrupted attempt at this order, if any.
+    """
+
+    def __init__(
+        self,
+        *,
+        directory: Dict[str, Any],
+        identifiers: Sequence[str],
+        chal_types: Sequence[str],
+        key_authorization: Callable[[str], str],
+        csr: bytes,
+        csr_key: str = "",
+        poller: Optional[Poller] = None,
+        prop_delay: float = 0,
+        prop_timeout: float = 0,
+        prop_sleep_times: Sequence[float] = (1, 2, 4, 8),
+        known_valid: Set[str] = frozenset(),  # type: ignore
+        journal: Optional[Dict[str, Any]] = None,
+        now: Callable[[], float] = time.time,
+        stream: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.identifiers = list(identifiers)
+        self.chal_types = chal_types
+        self.key_authorization = key_authorization
+        self.csr = csr
+        self.csr_key = csr_key
+        self.poller = poller if poller else Poller()
+        self.prop_delay = prop_delay
+        self.prop_timeout = prop_timeout
+        self.prop_sleep_times = prop_sleep_times
+        self.known_valid = known_valid
+        self.journal = journal
+        self.now = now
+        self.stream = stream
+
+        self.order_url = ""
+        self.challenges: List[Dict[str, str]] = []
+
+    def issue(self, finalize: bool = True) -> StepType:
+        """
+        The whole order; the result is the certificate.  With finalize False
+        it stops once the order is ready (see Client.prevalidate), and the
+        result is the order's state, left in the journal for a later issue.
+        """
+
+        used_cache = False
+        try:
+            order = yield from self.resume()
+            if order is None:
+                order = yield from self.new_order()
+
+            if order["status"] == "pending":
+                used_cache = any(url in self.known_valid for url in order["authorizations"])
+                yield from self.authorize(order["authorizations"])
+                order["status"] = "ready"
+
+            if not finalize:
+                yield Event("journal", {"status": order["status"]})
+                return dict(order, order_url=self.order_url)
+
+            if order["status"] in ["pending", "ready"]:
+                yield Event("journal", {"status": "finalizing", "csr_key": self.csr_key})
+                finalize_url = order["finalize_url"]
+                certificate_url = yield Hook(
+                    "send_csr", (finalize_url,), self.finalize(finalize_url)
+                )
+            elif order["status"] == "processing":
+                certificate_url = (yield from self.poll_order(["valid"]))["certificate"]
+            else:
+                certificate_url = order["certificate_url"]
+
+            yield Event("journal", {"status": "valid", "certificate_url": certificate_url})
+            certificate = yield Hook(
+                "download_certificate", (certificate_url,), self.download(certificate_url)
+            )
+        except Exception:
+            if used_cache:
+                yield Event("authz_distrust", {})
+            raise
+        finally:
+            # best-effort attempt to clear challenges
+            failures = yield Call("clear", self.challenges)
+            if self.challenges and not failures:
+                yield Event("journal", {"challenges": []})
+
+        yield Event("done", {})
+        return certificate
+
+    ### the steps of issue()
+
+    def resume(self) -> StepType:
+        "pick up an interrupted order from its journal record, or return None"
+
+        record = self.journal
+        if record is None:
+            return None
+
+        if record.get("challenges"):
+            yield Call("clear", record["challenges"])
+            yield Event("journal", {"challenges": []})
+
+        order = None
+        if record.get("order_url"):
+            response = yield Request(record["order_url"])
+            if response.status_code in [200, 201]:
+                order = response.json()
+
+        status = order["status"] if order else "invalid"
+        if status in ["processing", "valid"] and record.get("csr_key") != self.csr_key:
+            status = "invalid"
+        if order is None or status == "invalid":
+            yield Event("done", {})
+            return None
+
+        self.order_url = record["order_url"]
+        yield Event("resume", {"order_url": self.order_url, "status": status})
+        return {
+            "status": status,
+            "finalize_url": record["finalize_url"],
+            "authorizations": record["authorizations"],
+            "certificate_url": order.get("certificate", ""),
+        }
+
+    def new_order(self) -> StepType:
+        authorizations, finalize_url, self.order_url = yield Hook(
+            "apply_for_cert_issuance", (), self.apply_for_cert_issuance()
+        )
+        yield Event(
+            "order",
+            {
+                "order_url": self.order_url,
+                "finalize_url": finalize_url,
+                "authorizations": authorizations,
+            },
+        )
+        return {"status": "pending", "finalize_url": finalize_url, "authorizations": authorizations}
+
+    def apply_for_cert_issuance(self) -> StepType:
+        "newOrder; the result is (authorizations, finalize_url, order_url)"
+
+        payload = {"identifiers": [{"type": "dns", "value": name} for name in self.identifiers]}
+        response = yield Request(self.directory["newOrder"], json_dumps(payload))
+        check_status(response, [201], "applying for certificate issuance")
+
+        order = response.json()
+        return order["authorizations"], order["finalize"], response.headers.get("Location", "")
+
+    def authorize(self, authorizations: Sequence[str]) -> StepType:
+        "get every authorization valid, setting up challenges only for the pending ones"
+
+        urls = [url for url in authorizations if url not in self.known_valid]
+        if self.stream:
+            streamed = yield Parallel([self.stream_challenge(url) for url in urls], urls)
+            challenges = [chal for chal in streamed if chal is not None]
+        else:
+            pending = yield Parallel([self.pending_challenge(url) for url in urls], urls)
+            challenges = [chal for chal in pending if chal is not None]
+
+        if challenges and not self.stream:
+            # journaled before they're published, so a crash can't orphan them
+            self.challenges = challenges
+            yield Event("journal", {"challenges": challenges})
+
+            failures = yield Call("setup", challenges)
+            if failures:
+                raise RuntimeError("get_certificate: challenge setup failed for %s" % failures)
+
+            yield Hook("propagation_delay", (challenges,), self.propagation_delay(challenges))
+
+            names = [chal_identifier(chal) for chal in challenges]
+            yield Parallel([self.respond_if_pending(chal) for chal in challenges], names)
+
+        if self.order_url:
+            yield from self.poll_order(["ready", "valid"])
+        else:
+            yield Parallel(
+                [
+                    self.check_authorization_status(chal["auth_url"], ["valid"])
+                    for chal in challenges
+                ],
+                [chal_identifier(chal) for chal in challenges],
+            )
+
+        # the pending expiry is a conservative stand-in for the valid one
+        for chal in challenges:
+            yield Event(
+                "authz_valid",
+                {
+                    "name": chal_identifier(chal),
+                    "url": chal["auth_url"],
+                    "expires": chal["expires"],
+                },
+            )
+
+    def pending_challenge(self, auth_url: str) -> StepType:
+        "the challenge item for auth_url, or None if the authorization is already valid"
+
+        identifier_auth = yield Hook(
+            "get_identifier_authorization", (auth_url,), self.get_identifier_authorization(auth_url)
+        )
+        chal = {
+            "ident_value": identifier_auth["domain"],
+            "token": identifier_auth["token"],
+            "key_auth": self.key_authorization(identifier_auth["token"]),
+            "wildcard": identifier_auth["wildcard"],
+            "auth_url": auth_url,
+            "chal_url": identifier_auth["challenge_url"],
+            "expires": identifier_auth.get("expires", ""),
+        }
+
+        if identifier_auth.get("status") == "valid":
+            yield Event(
+                "authz_valid",
+                {"name": chal_identifier(chal), "url": auth_url, "expires": chal["expires"]},
+            )
+            return None
+        return chal
+
+    def get_identifier_authorization(self, auth_url: str) -> StepType:
+        "see Client.get_identifier_authorization, whose result this is"
+
+        response = yield Request(auth_url)
+        check_status(response, [200, 201], "getting identifier authorization")
+        authz = response.json()
+
+        for c in authz["challenges"]:
+            if c["type"] in self.chal_types:
+                return {
+                    "domain": authz["identifier"]["value"],
+                    "url": auth_url,
+                    "wildcard": authz.get("wildcard"),
+                    "token": c["token"],
+                    "challenge_url": c["url"],
+                    "status": authz.get("status", "pending"),
+                    "expires": authz.get("expires", ""),
+                }
+        raise ValueError("no challenge of type %s offered for %s" % (self.chal_types, auth_url))
+
+    def stream_challenge(self, auth_url: str) -> StepType:
+        "see Client.stream_challenge: one authorization's challenge, from fetch to response"
+
+        chal = yield from self.pending_challenge(auth_url)
+        if chal is None:
+            return None
+        self.challenges.append(chal)
+        yield Event("challenge", {"challenge": chal})
+
+        failures = yield Call("setup", [chal])
+        if failures:
+            raise RuntimeError("get_certificate: challenge setup failed for %s" % failures)
+        yield Hook("propagation_delay", ([chal],), self.propagation_delay([chal]))
+        yield from self.respond_if_pending(chal)
+        return chal
+
+    def propagation_delay(self, challenges: ChalListType) -> StepType:
+        "see Client.propagation_delay"
+
+        if self.prop_delay:
+            yield Wait(self.prop_delay)
+
+        if self.prop_timeout:
+            unready = challenges
+            end_time = self.now() + self.prop_timeout
+            sleep_times = list(self.prop_sleep_times)
+            num_checks = 0
+
+            while unready:
+                errata = yield Call("unpropagated", unready)
+                num_checks += 1
+                if errata:
+                    if end_time < self.now():
+                        break
+                    yield Wait(sleep_times[min(num_checks, len(sleep_times)) - 1])
+                unready = [err[2] for err in errata]
+
+            if unready:
+                raise RuntimeError(
+                    "propagation_delay: time out after %s probes: %s" % (num_checks, unready)
+                )
+
+    def poll(self, url: str, done: Callable[[Any], bool], what: str) -> StepType:
+        "Poller.poll as actions"
+
+        start = self.poller.now()
+        checks = 0
+        backoff = self.poller.delays()
+        while True:
+            response = yield Request(url)
+            checks += 1
+            if done(response):
+                return response
+            yield Wait(self.poller.next_delay(response, checks, start, backoff, what))
+
+    def poll_authorization(self, auth_url: str, desired_status: List[str]) -> StepType:
+        def done(response: Any) -> bool:
+            status = response.json()["status"]
+            if status == "invalid" and status not in desired_status:
+                raise ValueError("authorization is invalid: %s" % log_response(response))
+            return status in desired_status
+
+        return (yield from self.poll(auth_url, done, "check_authorization_status"))
+
+    def check_authorization_status(self, auth_url: str, desired_status: List[str]) -> StepType:
+        "poll the authorization until it's in desired_status; the result is the response"
+
+        args = (auth_url, desired_status)
+        return (yield Hook("check_authorization_status", args, self.poll_authorization(*args)))
+
+    def respond_if_pending(self, chal: Dict[str, str]) -> StepType:
+        response = yield from self.check_authorization_status(
+            chal["auth_url"], ["pending", "valid"]
+        )
+        if response.json()["status"] == "pending":
+            args = (chal["key_auth"], chal["chal_url"])
+            yield Hook("respond_to_challenge", args, self.respond_to_challenge(*args))
+
+    def respond_to_challenge(self, key_authorization: str, challenge_url: str) -> StepType:
+        payload = json_dumps({"keyAuthorization": key_authorization})
+        return (yield Request(challenge_url, payload))
+
+    def poll_order(self, desired_status: List[str]) -> StepType:
+        def done(response: Any) -> bool:
+            check_status(response, [200, 201], "polling order")
+            return response.json()["status"] in desired_status + ["invalid"]
+
+        order = (yield from self.poll(self.order_url, done, "poll_order")).json()
+        if order["status"] == "invalid":
+            yield from self.order_failure(order)
+        return order
+
+    def order_failure(self, order: Dict[str, Any]) -> StepType:
+        "the order is invalid; raise an AcmeAuthorizationError for the identifiers that failed"
+
+        def failed_authorization(auth_url: str) -> StepType:
+            authz = (yield Request(auth_url)).json()
+            if authz.get("status") == "invalid":
+                errors = [c["error"] for c in authz.get("challenges", []) if "error" in c]
+                raise ValueError("authorization is invalid: %s" % (errors or authz))
+            return authz
+
+        urls = order.get("authorizations", [])
+        yield Parallel([failed_authorization(url) for url in urls], urls)
+        raise AcmeAuthorizationError({self.order_url: ValueError("order is invalid: %s" % order)})
+
+    def finalize(self, finalize_url: str) -> StepType:
+        "see Client.send_csr"
+
+        payload = json_dumps({"csr": safe_base64(self.csr)})
+        response = yield Request(finalize_url, payload)
+        check_status(response, [200, 201], "sending csr")
+
+        certificate_url = response.json().get("certificate")
+        if not certificate_url:
+            if not self.order_url:
+                self.order_url = response.headers.get("Location", "")
+            if not self.order_url:
+                raise ValueError(
+                    "send_csr: order is %s but there's no order URL to poll"
+                    % response.json().get("status")
+                )
+            hint = retry_after(response)
+            if hint:
+                yield Wait(min(hint, self.poller.max_retry_after))
+            certificate_url = (yield from self.poll_order(["valid"]))["certificate"]
+        return certificate_url
+
+    def download(self, certificate_url: str) -> StepType:
+        response = yield Request(certificate_url)
+        check_status(response, [200, 201], "fetching signed certificate")
+        return response.content.decode("utf-8")
+
+
+### Drivers
+
+
+def _parallel_result(identities: List[str], outcomes: List[Any]) -> List[Any]:
+    errors = dict(
+        (ident, res) for ident, res in zip(identities, outcomes) if isinstance(res, Exception)
+    )
+    for exc in errors.values():
+        if isinstance(exc, AcmeDeadlineError):
+            raise exc
+    if errors:
+        raise AcmeAuthorizationError(errors)
+    return outcomes
+
+
+class SyncDriver:
+    """
+    Runs a protocol step with blocking I/O: send(Request) returns the
+    response, Calls go to provider, Waits to sleep, Events to record.  The
+    steps of a Parallel run on up to max_workers threads.  A Hook is given
+    to the callback of that name in hooks, if there is one.  With a
+    deadline, Requests and Calls other than clear raise once it has passed
+    (sleep should be the deadline's own, to cut Waits short).  With a cleanup
+    queue, clear Calls are handed to it instead of waited for (the result
+    is defer's: no failures, the challenges are the queue's to clear).
+    """
+
+    def __init__(
+        self,
+        *,
+        send: Callable[[Request], Any],
+        provider: ProviderBase,
+        record: Optional[Callable[[Event], None]] = None,
+        sleep: Callable[[float], None] = time.sleep,
+        max_workers: int = 4,
+        cleanup: Optional[CleanupQueue] = None,
+        hooks: Optional[Dict[str, Callable[..., Any]]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> None:
+        self.send = send
+        self.provider = provider
+        self.record = record
+        self.sleep = sleep
+        self.max_workers = max(1, max_workers)
+        self.cleanup = cleanup
+        self.hooks = hooks if hooks else {}
+        self.deadline = deadline
+
+    def run(self, step: StepType) -> Any:
+        result, error = None, None  # type: Any, Optional[BaseException]
+        while True:
+            try:
+                action = step.send(result) if error is None else step.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            result, error = None, None
+            try:
+                result = self.perform(action)
+            except BaseException as exc:
+                # into the generator, so that its cleanup runs even for KeyboardInterrupt
+                error = exc
+
+    def perform(self, action: ActionType) -> Any:
+        if isinstance(action, Request):
+            if self.deadline is not None:
+                self.deadline.check("request")
+            return self.send(action)
+        if isinstance(action, Wait):
+            return self.sleep(action.seconds)
+        if isinstance(action, Call):
+            if action.method == "clear":
+                if self.cleanup is not None:
+                    return self.cleanup.defer(self.provider, action.challenges)
+            elif self.deadline is not None:
+                self.deadline.check("challenge %s" % action.method)
+            return getattr(self.provider, action.method)(action.challenges)
+        if isinstance(action, Event):
+            return self.record(action) if self.record else None
+        if isinstance(action, Parallel):
+            return _parallel_result(action.identities, self.run_all(action.steps))
+        if isinstance(action, Hook):
+            hook = self.hooks.get(action.name)
+            return hook(*action.args) if hook else self.run(action.default)
+        raise TypeError("unknown protocol action: %r" % (action,))
+
+    def run_all(self, steps: List[StepType]) -> List[Any]:
+        def outcome(step: StepType) -> Any:
+            try:
+                return self.run(step)
+            except Exception as exc:
+                return exc
+
+        if self.max_workers == 1 or len(steps) <= 1:
+            return [outcome(step) for step in steps]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(steps))) as pool:
+            return list(pool.map(outcome, steps))
+
+
+class AsyncDriver:
+    """
+    Runs a protocol step on an asyncio loop: send is a coroutine function,
+    Waits are asyncio.sleep, the (blocking) provider is called in executor
+    and the steps of a Parallel run concurrently.  With a deadline, Waits
+    are cut short by it, or by its cancel() (from any thread), and Requests, Waits and Calls raise once it has
+    passed (or been cancelled) - except for clear, which still happens.
+    As with SyncDriver, a cleanup queue takes over the clear Calls.  Hooks
+    always run their default steps: a blocking callback has no place here.
+    """
+
+    def __init__(
+        self,
+        *,
+        send: Callable[[Request], Any],
+        provider: ProviderBase,
+        record: Optional[Callable[[Event], None]] = None,
+        executor: Optional[Executor] = None,
+        deadline: Optional[Deadline] = None,
+        cleanup: Optional[CleanupQueue] = None,
+    ) -> None:
+        self.send = send
+        self.provider = provider
+        self.record = record
+        self.executor = executor
+        self.deadline = deadline
+        self.cleanup = cleanup
+
+    async def run(self, step: StepType) -> Any:
+        result, error = None, None  # type: Any, Optional[BaseException]
+        while True:
+            try:
+                action = step.send(result) if error is None else step.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            result, error = None, None
+            try:
+                result = await self.perform(action)
+            except BaseException as exc:
+                # into the generator, so that its cleanup runs even when the task is cancelled
+                error = exc
+
+    async def perform(self, action: ActionType) -> Any:
+        if isinstance(action, Request):
+            if self.deadline is not None:
+                self.deadline.check("request")
+            return await self.send(action)
+        if isinstance(action, Wait):
+            if self.deadline is None:
+                return await asyncio.sleep(action.seconds)
+            seconds = self.deadline.clip(action.seconds, "wait")
+            # cancel() may come from any thread; it wakes the wait through the loop
+            loop = asyncio.get_running_loop()
+            cancelled = asyncio.Event()
+            remove = self.deadline.on_cancel(lambda: loop.call_soon_threadsafe(cancelled.set))
+            try:
+                await asyncio.wait_for(cancelled.wait(), seconds)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                remove()
+            return self.deadline.check("wait")
+        if isinstance(action, Call):
+            if action.method == "clear":
+                if self.cleanup is not None:
+                    return self.cleanup.defer(self.provider, action.challenges)
+            elif self.deadline is not None:
+                self.deadline.check("challenge %s" % action.method)
+            method = getattr(self.provider, action.method)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, method, action.challenges)
+        if isinstance(action, Event):
+            return self.record(action) if self.record else None
+        if isinstance(action, Parallel):
+            outcomes = await asyncio.gather(
+                *(self.run(step) for step in action.steps), return_exceptions=True
+            )
+            return _parallel_result(action.identities, list(outcomes))
+        if isinstance(action, Hook):
+            return await self.run(action.default)
+        raise TypeError("unknown protocol action: %r" % (action,))
@@ -0,0 +1,74 @@
+"retry.py - retry policy for signed ACME requests"
+
+import random, time
+from typing import Any, Callable, Optional
+
+from .lib import acme_problem, AcmeBadNonceError, AcmeRateLimitedError, AcmeServerError
+from .poll import retry_after
+
+
+class RetryPolicy:
+    """
+    Wraps the sending of a signed request, send(), which must sign afresh
+    (with a new nonce) each time it is called.
+
+    * badNonce is retried at once, up to bad_nonce_retries times.  The error
+      response carries a fresh nonce, which the session's pool has already
+      harvested, so the retry costs just the one round trip.
+
+    * serverInternal, other 5xx responses and rateLimited are retried up to
+      max_retries times, waiting for the server's Retry-After or else an
+      exponential backoff (with jitter) from backoff up to max_backoff.
+      A Retry-After longer than max_retry_after isn't worth waiting for
+      (LE's rate limits can run to hours), so that raises at once.
+
+    When the retries are used up the typed AcmeProblem is raised.  Any other
+    response, success or not, is returned for the caller to check as before.
+    """
+
+    def __init__(
+        self,
+        *,
+        bad_nonce_retries: int = 3,
+        max_retries: int = 3,
+        backoff: float = 1,
+        max_backoff: float = 30,
+        max_retry_after: float = 60,
+        jitter: float = 0.2,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.bad_nonce_retries = bad_nonce_retries
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.jitter = jitter
+        self.sleep = sleep
+
+    def run(self, send: Callable[[], Any], sleep: Optional[Callable[[float], None]] = None) -> Any:
+        "sleep, if given, is used instead of the policy's own (eg., a Deadline's)"
+
+        if sleep is None:
+            sleep = self.sleep
+        bad_nonces = 0
+        retries = 0
+        delay = self.backoff
+        while True:
+            response = send()
+            problem = acme_problem(response)
+            if isinstance(problem, AcmeBadNonceError):
+                if bad_nonces >= self.bad_nonce_retries:
+                    raise problem
+                bad_nonces += 1
+                continue
+            if isinstance(problem, (AcmeServerError, AcmeRateLimitedError)):
+                hint = retry_after(response)
+                if retries >= self.max_retries or (hint or 0) > self.max_retry_after:
+                    raise problem
+                retries += 1
+                if hint is None:
+                    hint = delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+                    delay = min(delay * 2, self.max_backoff)
+                sleep(hint)
+                continue
+            return response
@@ -0,0 +1,416 @@
+"session.py - AcmeSession holds the long-lived state shared by many certificate orders"
+
+import platform, threading
+from typing import Any, Dict, Optional, Union
+
+import requests
+
+from .cleanup import CleanupQueue
+from .clock import Clock, Deadline, REAL_CLOCK
+from .coalesce import Coalescer
+from .config import ACME_DIRECTORY_URL_PRODUCTION
+from .crypto import AcmeAccount
+from .directory import directory_cache, DirectoryType
+from .lib import create_logger, json_dumps, log_response, safe_base64_bytes, sewer_meta
+from .lib import AcmeRegistrationError, LoggerType
+from .nonce import NoncePool
+from .retry import RetryPolicy
+from .store import AccountStore, AuthzCache, OrderJournal
+from .store import default_account_store, default_authz_cache, default_order_journal
+from .transport import shared_session
+
+
+class AcmeSession:
+    """
+    An AcmeSession is the account-and-server half of what used to be all in
+    Client: the account key (and its registration), the CA's directory, the
+    nonce pool and the HTTP connection pool, along with the signing of
+    requests.  It's intended to be long-lived, so that issuing many
+    certificates pays the setup costs once:
+
+        acme = AcmeSession(account=acct, ACME_DIRECTORY_URL=...)
+        for names in batch:
+            cert = acme.order(domain_name=names[0], domain_alt_names=names[1:],
+                              cert_key=..., provider=...).get_certificate()
+
+    order() returns a Client bound to this session.  A Client created without
+    one simply makes its own, so the old single-order usage is unchanged.
+    Everything here is safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        *,
+        account: AcmeAccount,
+        is_new_acct: bool = False,
+        contact_email: Optional[str] = None,
+        ACME_REQUEST_TIMEOUT: int = 7,
+        ACME_DIRECTORY_URL: str = ACME_DIRECTORY_URL_PRODUCTION,
+        ACME_VERIFY: bool = True,
+        ACME_DIRECTORY_TTL: int = 3600,
+        ACME_DIRECTORY_CACHE_DIR: Optional[str] = None,
+        ACME_NONCE_PREFETCH: int = 0,
+        ACME_POOL_SIZE: int = 10,
+        ACME_RETRIES: int = 2,
+        session: Optional[requests.Session] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        account_store: Optional[AccountStore] = None,
+        authz_cache: Optional[AuthzCache] = None,
+        order_journal: Optional[OrderJournal] = None,
+        coalescer: Optional[Coalescer] = None,
+        cleanup: Optional[CleanupQueue] = None,
+        clock: Optional[Clock] = None,
+        logger: Optional[LoggerType] = None,
+        LOG_LEVEL: str = "INFO",
+    ) -> None:
+
+        if not isinstance(account, AcmeAccount):
+            raise TypeError("The account argument must be an AcmeAccount.")
+
+        if not isinstance(contact_email, (type(None), str)):
+            raise ValueError("contact_email should be None or a string, not %s" % contact_email)
+
+        self.account = account
+        self.is_new_acct = is_new_acct
+        self.contact_email = contact_email
+        self.ACME_REQUEST_TIMEOUT = ACME_REQUEST_TIMEOUT
+        self.ACME_DIRECTORY_URL = ACME_DIRECTORY_URL
+        self.ACME_VERIFY = ACME_VERIFY
+        self.ACME_DIRECTORY_TTL = ACME_DIRECTORY_TTL
+        self.directory_cache = directory_cache(ACME_DIRECTORY_CACHE_DIR)
+
+        self.logger = logger if logger else create_logger(__name__, LOG_LEVEL)
+        self.User_Agent = self.get_user_agent()
+
+        # keep-alive connections are shared by all sessions using the same CA, unless injected
+        if session is None:
+            session = shared_session(
+                ACME_DIRECTORY_URL, pool_size=ACME_POOL_SIZE, retries=ACME_RETRIES
+            )
+        self.session = session
+
+        # nonces are harvested from every response; newNonce is only HEADed when the pool is dry
+        self.nonces = NoncePool(self._new_nonce, low_water=ACME_NONCE_PREFETCH)
+
+        # badNonce, 5xx and rateLimited responses to signed requests are retried here
+        self.clock = clock if clock else REAL_CLOCK
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy(sleep=self.clock.sleep)
+
+        # a known kid (from the key file or the store) makes registration free
+        self.account_store = account_store if account_store else default_account_store()
+
+        # valid authorizations, so repeat orders for the same names skip their challenges
+        self.authz_cache = authz_cache if authz_cache is not None else default_authz_cache()
+
+        # with a journal, an order interrupted by a crash is resumed by the next run
+        self.order_journal = order_journal if order_journal else default_order_journal()
+
+        # with a coalescer, concurrent orders for the same names share one (and its cert key)
+        self.coalescer = coalescer
+
+        # with a cleanup queue, challenges are cleared in the background after the download
+        self.cleanup = cleanup
+
+        self._register_lock = threading.Lock()
+
+    def order(self, **kwargs: Any) -> Any:
+        "returns a Client for one certificate order, sharing this session's state"
+
+        from .client import Client
+
+        return Client(acme_session=self, **kwargs)
+
+    ### the directory is loaded (from cache if possible) on first use, not in __init__
+
+    @property
+    def directory(self) -> DirectoryType:
+        return self.get_directory()
+
+    def get_directory(self, deadline: Optional[Deadline] = None) -> DirectoryType:
+        "the directory, with a fetch (if one is needed) bounded by deadline"
+
+        return self.directory_cache.get(
+            self.ACME_DIRECTORY_URL,
+            lambda url, headers: self._fetch_directory(url, headers, deadline),
+            self.ACME_DIRECTORY_TTL,
+            self.clock,
+        )
+
+    @property
+    def ACME_GET_NONCE_URL(self) -> str:
+        return self.directory["newNonce"]
+
+    @property
+    def ACME_TOS_URL(self) -> str:
+        return self.directory.get("meta", {}).get("termsOfService", "")
+
+    @property
+    def ACME_KEY_CHANGE_URL(self) -> str:
+        return self.directory["keyChange"]
+
+    @property
+    def ACME_NEW_ACCOUNT_URL(self) -> str:
+        return self.directory["newAccount"]
+
+    @property
+    def ACME_NEW_ORDER_URL(self) -> str:
+        return self.directory["newOrder"]
+
+    @property
+    def ACME_REVOKE_CERT_URL(self) -> str:
+        return self.directory["revokeCert"]
+
+    ### HTTP transport
+
+    def GET(
+        self,
+        url: str,
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> requests.Response:
+        """
+        wrap session.get (and post and head, below) to allow:
+          * injection of e.g. UserAgent header in one place rather than all over
+          * hides the pooled, keep-alive requests.Session (see transport.py)
+          * paves the way to inject the verify option, required to use pebble
+        """
+
+        return self._request("GET", url, headers=headers, deadline=deadline)
+
+    def HEAD(self, url: str, *, deadline: Optional[Deadline] = None) -> requests.Response:
+        return self._request("HEAD", url, deadline=deadline)
+
+    def POST(
+        self,
+        url: str,
+        *,
+        data: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> requests.Response:
+        return self._request("POST", url, data=data, headers=headers, deadline=deadline)
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        data: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        deadline: Optional[Deadline] = None,
+        harvest: bool = True,
+    ) -> requests.Response:
+        """
+        shared implementation for GET, POST and HEAD
+        * injects standard request options unless they are already given in headers
+          * header:UserAgent, timeout (no longer than the deadline, if any, allows)
+          * verify - this is a hack to make sewer accept pebble's intentionally bogus cert
+        * adds the response's Replay-Nonce to the pool unless harvest is False
+        """
+
+        if headers is None:
+            headers = {}
+
+        if "UserAgent" not in headers:
+            headers["UserAgent"] = self.User_Agent
+
+        timeout = self.ACME_REQUEST_TIMEOUT  # type: Union[int, float]
+        if deadline is not None:
+            timeout = deadline.clip(timeout, "%s %s" % (method, url))
+        kwargs = {"timeout": timeout}  # type: Dict[str, Any]
+
+        ### FIX ME ### can get current bogus cert from pebble, figure out how to use it here?
+
+        # if ACME_VERIFY is false, disable certificate check in request
+        if not self.ACME_VERIFY:
+            kwargs["verify"] = False
+
+        # this is what we'd do if damn near every test didn't mock Session.{get,post}
+        # response = self.session.request(method, url, headers=headers, **kwargs)
+
+        # awkward implementation to maintain compatibility with current mocked tests
+        if method == "GET":
+            # mypy seems to be confused if params isn't explicitly passed, wtf?
+            response = self.session.get(url, params=None, headers=headers, **kwargs)
+        elif method == "HEAD":
+            response = self.session.head(url, headers=headers, **kwargs)
+        elif method == "POST":
+            response = self.session.post(url, data, headers=headers, **kwargs)
+
+        if harvest:
+            self.nonces.add(response)
+        return response
+
+    @staticmethod
+    def get_user_agent():
+        return "python-requests/{requests_version} ({system}: {machine}) sewer {sewer_version} ({sewer_url})".format(
+            requests_version=requests.__version__,
+            system=platform.system(),
+            machine=platform.machine(),
+            sewer_version=sewer_meta("version"),
+            sewer_url=sewer_meta("url"),
+        )
+
+    def _fetch_directory(
+        self, url: str, headers: Dict[str, str], deadline: Optional[Deadline] = None
+    ) -> requests.Response:
+        "the DirectoryCache's fetch; status checking is left to the cache"
+
+        self.logger.debug("fetch_directory%s" % (" (revalidate)" if headers else ""))
+        return self.GET(url, headers=headers, deadline=deadline)
+
+    def get_acme_endpoints(self):
+        "uncached fetch of the directory; the session itself uses the cached directory property"
+
+        self.logger.debug("get_acme_endpoints")
+        get_acme_endpoints = self.GET(self.ACME_DIRECTORY_URL)
+        self.logger.debug(
+            "get_acme_endpoints_response. status_code={0}".format(get_acme_endpoints.status_code)
+        )
+        if get_acme_endpoints.status_code not in [200, 201]:
+            raise ValueError(
+                "Error while getting Acme endpoints: status_code={status_code} response={response}".format(
+                    status_code=get_acme_endpoints.status_code,
+                    response=log_response(get_acme_endpoints),
+                )
+            )
+        return get_acme_endpoints
+
+    ### account registration - done at most once per session, however many orders
+
+    def register(self, deadline: Optional[Deadline] = None):
+        with self._register_lock:
+            return self._register(deadline)
+
+    def _register(self, deadline: Optional[Deadline] = None):
+
+        self.logger.info("acme_register%s" % " (is new account)" if self.is_new_acct else "")
+
+        if self.account.has_kid():
+            self.logger.info("acme_register: key was already registered")
+            return None
+
+        store = self.account_store
+        if store is not None and store.recall(self.ACME_DIRECTORY_URL, self.account):
+            self.logger.info("acme_register: kid found in account store")
+            return None
+
+        payload: Dict[str, Any]
+        if not self.is_new_acct:
+            payload = {"onlyReturnExisting": True}
+        elif self.contact_email:
+            payload = {
+                "termsOfServiceAgreed": True,
+                "contact": ["mailto:{0}".format(self.contact_email)],
+            }
+        else:
+            payload = {"termsOfServiceAgreed": True}
+
+        url = self.get_directory(deadline)["newAccount"]
+        response = self.make_signed_acme_request(
+            url=url, payload=json_dumps(payload), needs_jwk=True, deadline=deadline
+        )
+        self.logger.debug(
+            "response. status_code={0}. response={1}".format(
+                response.status_code, log_response(response)
+            )
+        )
+
+        if response.status_code not in [201, 200, 409]:
+            raise AcmeRegistrationError(
+                "Error while registering: status_code={status_code} response={response}".format(
+                    status_code=response.status_code, response=log_response(response),
+                )
+            )
+
+        self.account.set_kid(response.headers["Location"])
+        if store is not None:
+            store.save(self.ACME_DIRECTORY_URL, self.account)
+
+        self.logger.info("acme_register_success")
+        return response
+
+    ### nonces and signed requests
+
+    def get_nonce(self, deadline: Optional[Deadline] = None):
+        """
+        https://tools.ietf.org/html/draft-ietf-acme-acme#section-6.4
+        Each request to an ACME server must include a fresh unused nonce
+        in order to protect against replay attacks.
+
+        Since every response carries a new nonce, this is usually satisfied
+        from the pool without a round trip of its own.
+        """
+        self.logger.debug("get_nonce")
+        return self.nonces.get(deadline)
+
+    def _new_nonce(self, deadline: Optional[Deadline] = None) -> requests.Response:
+        """
+        the NoncePool's fetch: HEAD newNonce, which is the RFC's preferred method.
+        Not harvested here - the pool takes this nonce itself, and hands it out once.
+        """
+
+        self.logger.debug("new_nonce")
+        url = self.get_directory(deadline)["newNonce"]
+        return self._request("HEAD", url, deadline=deadline, harvest=False)
+
+    def get_acme_header(self, url, needs_jwk=False):
+        """
+        https://tools.ietf.org/html/draft-ietf-acme-acme#section-6.2
+        The JWS Protected Header MUST include the following fields:
+        - "alg" (Algorithm)
+        - "jwk" (JSON Web Key, only for requests to new-account and revoke-cert resources)
+        - "kid" (Key ID, for all other requests). gotten from self.ACME_NEW_ACCOUNT_URL
+        - "nonce". gotten from self.ACME_GET_NONCE_URL
+        - "url"
+        """
+        self.logger.debug("get_acme_header")
+        header = {"alg": self.account.key_desc.alg, "nonce": self.get_nonce(), "url": url}
+
+        if needs_jwk:
+            header["jwk"] = self.account.jwk()
+        else:
+            header["kid"] = self.account.kid
+
+        return header
+
+    def make_signed_acme_request(self, url, payload, needs_jwk=False, deadline=None):
+        """
+        Sign and POST the request, re-signing (with a new nonce) whenever the
+        retry policy decides it's worth another try.  See retry.py.  With a
+        deadline, neither the request nor the policy's waits can overrun it.
+        """
+
+        self.logger.debug("make_signed_acme_request")
+        return self.retry_policy.run(
+            lambda: self._signed_request(url, payload, needs_jwk, deadline),
+            sleep=deadline.sleep if deadline is not None else None,
+        )
+
+    def _signed_request(self, url, payload, needs_jwk, deadline=None):
+        """
+        Builds the flattened JWS directly as bytes.  The protected header's
+        alg and jwk/kid members come pre-encoded from the account, so only
+        the nonce and url are encoded per request; the base64url pieces need
+        no JSON escaping.
+        """
+
+        if isinstance(payload, str):
+            payload = payload.encode("utf8")
+        payload64 = safe_base64_bytes(payload)
+        protected = b'{%s,"nonce":%s,"url":%s}' % (
+            self.account.jws_fragment(needs_jwk),
+            json_dumps(self.get_nonce(deadline)).encode("utf8"),
+            json_dumps(url).encode("utf8"),
+        )
+        protected64 = safe_base64_bytes(protected)
+        signature64 = safe_base64_bytes(self.account.sign_message(protected64 + b"." + payload64))
+        data = b'{"protected":"%s","payload":"%s","signature":"%s"}' % (
+            protected64,
+            payload64,
+            signature64,
+        )
+        headers = {"Content-Type": "application/jose+json"}
+        response = self.POST(url, data=data, headers=headers, deadline=deadline)
+        return response
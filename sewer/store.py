@@ -0,0 +1,335 @@
+"store.py - state kept on disk between runs, shared safely by parallel workers"
+
+import contextlib, hashlib, json, os, re, tempfile, threading, time
+from datetime import datetime, timezone
+from typing import Any, Dict, IO, Iterable, Iterator, Optional, Set
+
+from .crypto import AcmeAccount
+
+# fcntl is Unix-only; elsewhere the store works but doesn't lock against other processes
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+StateType = Dict[str, Any]
+
+
+def default_state_dir() -> str:
+    "$SEWER_STATE_DIR if that's set, else ~/.sewer"
+
+    return os.environ.get("SEWER_STATE_DIR") or os.path.join(os.path.expanduser("~"), ".sewer")
+
+
+def url_hash(url: str) -> str:
+    "short, filename-safe name for a URL (eg., the ACME directory)"
+
+    return hashlib.sha256(url.encode("utf8")).hexdigest()[:24]
+
+
+def rfc3339(timestamp: str) -> float:
+    "parse an RFC3339 timestamp as used by ACME (eg., 2020-10-01T15:04:05.123456789Z)"
+
+    m = re.match(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?(Z|[+-]\d\d:\d\d)$", timestamp)
+    if m is None:
+        raise ValueError("not an RFC3339 timestamp: %r" % timestamp)
+    when = datetime.strptime(m.group(1), "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+    offset = 0
+    if m.group(3) != "Z":
+        hours, minutes = m.group(3)[1:].split(":")
+        offset = (int(hours) * 3600 + int(minutes) * 60) * (1 if m.group(3)[0] == "+" else -1)
+    return when.timestamp() + float(m.group(2) or 0) - offset
+
+
+def atomic_write(path: str, data: bytes, mode: int = 0o600) -> None:
+    "write to a temp file and rename it over path, so readers never see a partial file"
+
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+@contextlib.contextmanager
+def file_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """
+    flock on path (created if need be).  Each use opens the file anew, so it
+    serializes threads of this process as well as other processes.
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class AccountStore:
+    """
+    Registered ACME accounts, keyed by the CA's directory URL and the
+    account key's thumbprint:
+
+        <root>/accounts/<url_hash(directory_url)>/<thumbprint>.json
+        <root>/accounts/<url_hash(directory_url)>/default
+
+    Each record holds the key (PEM), its kid, the directory URL and the time
+    the kid was learned; default names the account most recently saved for
+    that CA.  An account whose kid is in the store needs no newAccount round
+    trip at all.  Records are private keys, so they're written mode 0600.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._lock_path = os.path.join(root, "accounts", "lock")
+
+    def _dir(self, directory_url: str) -> str:
+        return os.path.join(self.root, "accounts", url_hash(directory_url))
+
+    def _read(self, path: str) -> Optional[StateType]:
+        try:
+            with open(path, "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def lookup(self, directory_url: str, thumbprint: Optional[str] = None) -> Optional[StateType]:
+        "the stored record for thumbprint (default: the CA's default account), or None"
+
+        dirname = self._dir(directory_url)
+        with file_lock(self._lock_path, shared=True):
+            if thumbprint is None:
+                try:
+                    with open(os.path.join(dirname, "default"), "r") as f:
+                        thumbprint = f.read().strip()
+                except OSError:
+                    return None
+            record = self._read(os.path.join(dirname, "%s.json" % thumbprint))
+        if record is None or record.get("directory_url") != directory_url:
+            return None
+        return record
+
+    def load(self, directory_url: str, thumbprint: Optional[str] = None) -> Optional[AcmeAccount]:
+        "returns the stored account (with its kid), or None if there isn't one"
+
+        record = self.lookup(directory_url, thumbprint)
+        if record is None:
+            return None
+        account = AcmeAccount.from_key_bytes(record["key"].encode())
+        if record.get("kid"):
+            account.set_kid(record["kid"], record.get("timestamp"))
+        return account
+
+    def recall(self, directory_url: str, account: AcmeAccount) -> bool:
+        "sets account's kid from the store if it's known there; returns True if it was"
+
+        if account.has_kid():
+            return True
+        record = self.lookup(directory_url, account.thumbprint())
+        if record is None or not record.get("kid"):
+            return False
+        account.set_kid(record["kid"], record.get("timestamp"))
+        return True
+
+    def save(self, directory_url: str, account: AcmeAccount, *, default: bool = True) -> None:
+        "store account (and its kid, if it has one) for this CA"
+
+        thumbprint = account.thumbprint()
+        record = {
+            "directory_url": directory_url,
+            "thumbprint": thumbprint,
+            "kid": account.kid if account.has_kid() else None,
+            "timestamp": account._timestamp if account.has_kid() else None,
+            "saved": time.time(),
+            "key": account.to_pem().decode(),
+        }
+        dirname = self._dir(directory_url)
+        with file_lock(self._lock_path):
+            atomic_write(os.path.join(dirname, "%s.json" % thumbprint), json.dumps(record).encode())
+            if default:
+                atomic_write(os.path.join(dirname, "default"), thumbprint.encode(), 0o644)
+
+
+class AuthzCache:
+    """
+    Valid authorizations, keyed by account (its kid) and identifier (the
+    name as ordered, so "*.example.com" is distinct from "example.com"),
+    each with its URL and expiry time.  An order whose authorization URL is
+    in the cache, unexpired, needs no challenge for that identifier: no
+    provider setup, no propagation wait, no clear.
+
+    Entries are treated as expired margin seconds early.  With root set, the
+    cache is kept on disk in <root>/authz/<url_hash(kid)>.json.
+    """
+
+    def __init__(self, root: Optional[str] = None, *, margin: float = 3600) -> None:
+        self.root = root
+        self.margin = margin
+        self._entries: Dict[str, Dict[str, StateType]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, kid: str) -> str:
+        return os.path.join(str(self.root), "authz", "%s.json" % url_hash(kid))
+
+    def _locked(self, kid: str, shared: bool = False) -> Any:
+        if not self.root:
+            return contextlib.nullcontext()
+        return file_lock(self._path(kid) + ".lock", shared)
+
+    def _load(self, kid: str) -> Dict[str, StateType]:
+        """
+        called with both locks held.  The disk copy, if any, is the truth:
+        other workers may have added or discarded entries.
+        """
+
+        entries = self._entries.setdefault(kid, {})
+        if self.root:
+            try:
+                with open(self._path(kid), "r") as f:
+                    entries = self._entries[kid] = json.load(f)
+            except (OSError, ValueError):
+                pass
+        now = time.time()
+        for name in [n for n, e in entries.items() if e["expires"] - self.margin <= now]:
+            del entries[name]
+        return entries
+
+    def _save(self, kid: str) -> None:
+        if self.root:
+            atomic_write(self._path(kid), json.dumps(self._entries[kid]).encode())
+
+    def get(self, kid: str, identifier: str) -> Optional[str]:
+        "the valid authorization URL for identifier, if there is one"
+
+        with self._lock, self._locked(kid, shared=True):
+            entry = self._load(kid).get(identifier)
+        return entry["url"] if entry else None
+
+    def valid_urls(self, kid: str, identifiers: Iterable[str]) -> Set[str]:
+        with self._lock, self._locked(kid, shared=True):
+            entries = self._load(kid)
+            return set(entries[i]["url"] for i in identifiers if i in entries)
+
+    def put(self, kid: str, identifier: str, url: str, expires: float) -> None:
+        with self._lock, self._locked(kid):
+            self._load(kid)[identifier] = {"url": url, "expires": expires}
+            self._save(kid)
+
+    def discard(self, kid: str, identifiers: Iterable[str]) -> None:
+        with self._lock, self._locked(kid):
+            entries = self._load(kid)
+            for i in identifiers:
+                entries.pop(i, None)
+            self._save(kid)
+
+
+class OrderJournal:
+    """
+    Write-ahead journal of certificate orders in progress, one record per
+    account and set of names:
+
+        <root>/orders/<url_hash(kid + names)>.json
+
+    get_certificate updates the record at each durable step - the order,
+    finalize and authorization URLs once the order exists, the challenges
+    just BEFORE the provider is asked to publish them, the CSR key's
+    fingerprint before finalizing, the certificate URL - and removes it once
+    the certificate is in hand.  A later run for the same names can then
+    resume the order, and clear any challenges left published by a run that
+    died before it could clean up.
+
+    A run claims the order (an flock on <record>.owner, held until it's
+    released) before it reads the record.  That tells a live run's record
+    from an orphan: the lock goes with the process that held it, so only
+    the records of runs that are gone can be claimed, and so resumed.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def _path(self, kid: str, names: Iterable[str]) -> str:
+        key = "\n".join([kid] + sorted(names))
+        return os.path.join(self.root, "orders", "%s.json" % url_hash(key))
+
+    def new(self, kid: str, names: Iterable[str]) -> StateType:
+        "an empty record (not yet written) for this order"
+
+        return {"kid": kid, "names": sorted(names), "status": "new", "challenges": []}
+
+    def claim(self, kid: str, names: Iterable[str]) -> Optional[IO[str]]:
+        """
+        Take ownership of this order's record, until release(claim).  None if
+        another run - in this process or another - has it.  Without fcntl
+        (not Unix) the claim always succeeds.
+        """
+
+        path = self._path(kid, names) + ".owner"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        claim = open(path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(claim.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                claim.close()
+                return None
+        return claim
+
+    def release(self, claim: IO[str]) -> None:
+        "closing the file drops its flock"
+
+        claim.close()
+
+    def load(self, kid: str, names: Iterable[str]) -> Optional[StateType]:
+        path = self._path(kid, names)
+        with file_lock(path + ".lock", shared=True):
+            try:
+                with open(path, "r") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return None
+
+    def write(self, record: StateType) -> None:
+        record["updated"] = time.time()
+        path = self._path(record["kid"], record["names"])
+        with file_lock(path + ".lock"):
+            atomic_write(path, json.dumps(record).encode())
+
+    def remove(self, record: StateType) -> None:
+        path = self._path(record["kid"], record["names"])
+        with file_lock(path + ".lock"):
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+
+
+def default_order_journal() -> Optional[OrderJournal]:
+    "None (no journal) unless $SEWER_STATE_DIR is set"
+
+    root = os.environ.get("SEWER_STATE_DIR")
+    return OrderJournal(root) if root else None
+
+
+def default_authz_cache() -> AuthzCache:
+    "memory-only unless $SEWER_STATE_DIR is set"
+
+    return AuthzCache(os.environ.get("SEWER_STATE_DIR"))
+
+
+def default_account_store() -> Optional[AccountStore]:
+    """
+    The library's default store: the one in $SEWER_STATE_DIR if that's set,
+    otherwise None (nothing is written to disk unless asked for).
+    """
+
+    root = os.environ.get("SEWER_STATE_DIR")
+    return AccountStore(root) if root else None
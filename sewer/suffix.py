@@ -0,0 +1,161 @@
+"""
+suffix.py - splitting a DNS name into subdomain and registered domain, offline
+
+Drivers that have no way to ask the service which zone a name is in take
+the registered domain (the label just above the public suffix) as the zone:
+x.example.co.uk -> ("x", "example.co.uk").  The public suffix rules come
+from a snapshot of the ICANN section of https://publicsuffix.org/list/
+compiled into a trie (public_suffix.json, next to this module), which is
+loaded once, on first use.  Nothing here ever touches the network.
+
+The snapshot records which version of the list it was compiled from; to
+see it, or to refresh the snapshot:
+
+    python -m sewer.suffix
+    python -m sewer.suffix public_suffix_list.dat sewer/public_suffix.json [version]
+
+The version is taken from the list's "// VERSION:" line when it has one,
+otherwise it has to be given.
+"""
+
+import functools, json, os, sys, threading
+from typing import Any, Dict, List, Optional, Tuple
+
+TrieType = Dict[str, Any]
+
+SNAPSHOT = os.path.join(os.path.dirname(__file__), "public_suffix.json")
+
+_trie: Optional[TrieType] = None
+_trie_lock = threading.Lock()
+
+
+def _load() -> TrieType:
+    global _trie
+
+    with _trie_lock:
+        if _trie is None:
+            with open(SNAPSHOT, "r", encoding="utf8") as f:
+                _trie = json.load(f)["rules"]
+    return _trie  # type: ignore
+
+
+def _suffix_length(labels: List[str]) -> int:
+    """
+    how many of labels (reversed: TLD first) are the public suffix.  In the
+    trie "" marks the end of a rule and "!" an exception; a "*" child is a
+    wildcard rule.  No rule matching means the TLD alone (the implicit "*").
+    """
+
+    node = _load()
+    length = 1
+    for depth, label in enumerate(labels):
+        if "*" in node:
+            length = max(length, depth + 1)
+        child = node.get(label)
+        if child is None:
+            break
+        if "!" in child:
+            return depth
+        if "" in child:
+            length = depth + 1
+        node = child
+    return length
+
+
+@functools.lru_cache(maxsize=4096)
+def split_domain(name: str) -> Tuple[str, str]:
+    """
+    returns (subdomain, registered domain) for name, eg.,
+    "a.b.example.co.uk" -> ("a.b", "example.co.uk").  The subdomain is ""
+    if name is the registered domain.  A name that is itself a public suffix
+    (or a bare TLD) comes back as ("", name).
+    """
+
+    labels = name.strip().lower().rstrip(".").split(".")
+    if labels and labels[0] == "*":
+        labels = labels[1:]
+    length = _suffix_length(labels[::-1])
+    if length >= len(labels):
+        return "", ".".join(labels)
+    cut = len(labels) - length - 1
+    return ".".join(labels[:cut]), ".".join(labels[cut:])
+
+
+def registered_domain(name: str) -> str:
+    "the registered domain name is in: www.example.co.uk -> example.co.uk"
+
+    return split_domain(name)[1]
+
+
+### building the snapshot
+
+
+def compile_rules(text: str) -> TrieType:
+    "the trie for the ICANN section of a public_suffix_list.dat"
+
+    rules: TrieType = {}
+    icann = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("// ===BEGIN ICANN"):
+            icann = True
+        elif line.startswith("// ===END ICANN"):
+            icann = False
+        if not icann or not line or line.startswith("//"):
+            continue
+        rule = line.split()[0]
+        exception = rule.startswith("!")
+        try:
+            rule = rule.lstrip("!").encode("idna").decode("ascii")
+        except UnicodeError:
+            continue
+        node = rules
+        for label in reversed(rule.lower().split(".")):
+            node = node.setdefault(label, {})
+        node["!" if exception else ""] = 1
+    return rules
+
+
+def list_version(text: str) -> Optional[str]:
+    "the version a public_suffix_list.dat gives in its header, if it does"
+
+    for line in text.splitlines():
+        if line.startswith("// VERSION:"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+
+def snapshot_version(path: str = SNAPSHOT) -> str:
+    "which version of the list the snapshot at path was compiled from"
+
+    with open(path, "r", encoding="utf8") as f:
+        return json.load(f).get("version", "unknown")
+
+
+def main(argv: List[str]) -> None:
+    if not argv:
+        print(snapshot_version())
+        return
+    if len(argv) not in (2, 3):
+        sys.exit(
+            "usage: python -m sewer.suffix [public_suffix_list.dat public_suffix.json [version]]"
+        )
+    src, dest = argv[:2]
+    with open(src, "r", encoding="utf8") as f:
+        text = f.read()
+    version = argv[2] if len(argv) == 3 else list_version(text)
+    if not version:
+        sys.exit("%s has no // VERSION: line, give the version after the destination" % src)
+    with open(dest, "w", encoding="utf8") as f:
+        data = {
+            "source": "https://publicsuffix.org/list/",
+            "license": "MPL-2.0",
+            "version": version,
+            "rules": compile_rules(text),
+        }
+        json.dump(data, f, separators=(",", ":"), sort_keys=True)
+    print("%s: version %s" % (dest, version))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
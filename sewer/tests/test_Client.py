@@ -12,15 +12,22 @@
 # scope.  So reminiscent of the bad side of ol' lint.
 
 
+import json, os, tempfile, threading, time
 from unittest import expectedFailure, mock, TestCase
 
 import cryptography
 
 import sewer.client
 
+from ..clock import Deadline, REAL_CLOCK, VirtualClock
 from ..config import ACME_DIRECTORY_URL_STAGING
 from ..crypto import AcmeKey, AcmeAccount
+from ..directory import clear_directory_caches
+from ..lib import AcmeAuthorizationError, AcmeCancelledError, AcmeDeadlineError
 from ..lib import AcmeRegistrationError
+from ..poll import AcmePollTimeout
+from ..session import AcmeSession
+from ..store import OrderJournal
 from . import test_utils
 
 LOG_LEVEL = "CRITICAL"
@@ -48,6 +55,14 @@ def usual_ACME(no_kid=False):
     return res
 
 
+def mock_nonce_head(test):
+    "an empty nonce pool HEADs newNonce; mock that for the whole test"
+
+    patcher = mock.patch("requests.Session.head", return_value=test_utils.MockResponse())
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
 class TestClient(TestCase):
     """
     Todo:
@@ -63,50 +78,70 @@ class TestClient(TestCase):
     # pylint: disable=E1125
 
     def setUp(self):
+        mock_nonce_head(self)
         self.domain_name = "example.com"
-        with mock.patch("requests.post", return_value=test_utils.MockResponse()), mock.patch(
-            "requests.get", return_value=test_utils.MockResponse()
-        ):
+        with mock.patch(
+            "requests.Session.post", return_value=test_utils.MockResponse()
+        ), mock.patch("requests.Session.get", return_value=test_utils.MockResponse()):
 
             self.provider = test_utils.ExmpleHttpProvider()
             self.client = sewer.client.Client(
                 domain_name=self.domain_name, provider=self.provider, **usual_ACME()
             )
+            # Client is lazy; load the directory while the mocks are in place
+            self.client.directory
 
     def tearDown(self):
         pass
 
     def test_get_get_acme_endpoints_failure_results_in_exception(self):
         with mock.patch(
-            "requests.post", return_value=test_utils.MockResponse(status_code=409)
-        ), mock.patch("requests.get", return_value=test_utils.MockResponse(status_code=409)):
+            "requests.Session.post", return_value=test_utils.MockResponse(status_code=409)
+        ), mock.patch(
+            "requests.Session.get", return_value=test_utils.MockResponse(status_code=409)
+        ):
 
             def mock_create_acme_client():
+                # construction is lazy: the directory isn't fetched until it's needed
                 sewer.client.Client(
                     domain_name="example.com",
                     provider=test_utils.ExmpleHttpProvider(),
                     ACME_DIRECTORY_URL=ACME_DIRECTORY_URL_STAGING,
                     LOG_LEVEL=LOG_LEVEL,
                     **keys_for_ACME(),
-                )
+                ).directory
+
+            clear_directory_caches()
 
             self.assertRaises(ValueError, mock_create_acme_client)
             with self.assertRaises(ValueError) as raised_exception:
                 mock_create_acme_client()
             self.assertIn("Error while getting Acme endpoints", str(raised_exception.exception))
 
+    def test_construction_does_no_io(self):
+        with mock.patch("requests.Session.post") as mock_post, mock.patch(
+            "requests.Session.get"
+        ) as mock_get:
+
+            sewer.client.Client(
+                domain_name="example.com", provider=test_utils.ExmpleHttpProvider(), **usual_ACME()
+            )
+            self.assertFalse(mock_post.called or mock_get.called)
+
     def test_user_agent_is_generated(self):
-        with mock.patch("requests.post", return_value=test_utils.MockResponse()), mock.patch(
-            "requests.get", return_value=test_utils.MockResponse()
-        ):
+        with mock.patch(
+            "requests.Session.post", return_value=test_utils.MockResponse()
+        ), mock.patch("requests.Session.get", return_value=test_utils.MockResponse()):
 
             for i in ["python-requests", "sewer", "https://github.com/komuw/sewer"]:
                 self.assertIn(i, self.client.User_Agent)
 
     def test_acme_registration_is_done(self):
-        with mock.patch("requests.post", return_value=test_utils.MockResponse()), mock.patch(
-            "requests.get", return_value=test_utils.MockResponse()
-        ), mock.patch("sewer.client.Client.acme_register") as mock_acme_registration:
+        with mock.patch(
+            "requests.Session.post", return_value=test_utils.MockResponse()
+        ), mock.patch("requests.Session.get", return_value=test_utils.MockResponse()), mock.patch(
+            "sewer.client.Client.acme_register"
+        ) as mock_acme_registration:
 
             self.client.cert()
             self.assertTrue(mock_acme_registration.called)
@@ -116,8 +151,10 @@ class TestClient(TestCase):
             domain_name=self.domain_name, provider=self.provider, **usual_ACME(no_kid=True)
         )
         with mock.patch(
-            "requests.post", return_value=test_utils.MockResponse(status_code=400)
-        ), mock.patch("requests.get", return_value=test_utils.MockResponse(status_code=400)):
+            "requests.Session.post", return_value=test_utils.MockResponse(status_code=400)
+        ), mock.patch(
+            "requests.Session.get", return_value=test_utils.MockResponse(status_code=400)
+        ):
 
             with self.assertRaises(AcmeRegistrationError):
                 client.get_certificate()
@@ -130,9 +167,9 @@ class TestClient(TestCase):
             "token": "token",
             "challenge_url": "challenge_url",
         }
-        with mock.patch("requests.post", return_value=test_utils.MockResponse()), mock.patch(
-            "requests.get", return_value=test_utils.MockResponse()
-        ), mock.patch(
+        with mock.patch(
+            "requests.Session.post", return_value=test_utils.MockResponse()
+        ), mock.patch("requests.Session.get", return_value=test_utils.MockResponse()), mock.patch(
             "sewer.client.Client.get_identifier_authorization", return_value=gia_return_value
         ) as mock_gia:
 
@@ -141,9 +178,9 @@ class TestClient(TestCase):
 
     def test_get_identifier_authorization_is_not_called(self):
         with mock.patch(
-            "requests.post", return_value=test_utils.MockResponse(status_code=400)
+            "requests.Session.post", return_value=test_utils.MockResponse(status_code=400)
         ), mock.patch(
-            "requests.get", return_value=test_utils.MockResponse(status_code=400)
+            "requests.Session.get", return_value=test_utils.MockResponse(status_code=400)
         ), mock.patch(
             "sewer.client.Client.acme_register",
             return_value=test_utils.MockResponse(status_code=201),
@@ -166,9 +203,9 @@ class TestClient(TestCase):
         valid_status_mock = mock.Mock()
         valid_status_mock.json.return_value = {"status": "valid"}
 
-        with mock.patch("requests.post", return_value=test_utils.MockResponse()), mock.patch(
-            "requests.get", return_value=test_utils.MockResponse()
-        ), mock.patch(
+        with mock.patch(
+            "requests.Session.post", side_effect=test_utils.pending_authz_post
+        ), mock.patch("requests.Session.get", return_value=test_utils.MockResponse()), mock.patch(
             "sewer.client.Client.respond_to_challenge"
         ) as mock_respond_to_challenge, mock.patch(
             "sewer.client.Client.check_authorization_status"
@@ -184,16 +221,18 @@ class TestClient(TestCase):
             self.assertTrue(mock_respond_to_challenge.called)
 
     def test_check_authorization_status_is_called(self):
-        with mock.patch("requests.post", return_value=test_utils.MockResponse()), mock.patch(
-            "requests.get", return_value=test_utils.MockResponse()
-        ), mock.patch("sewer.client.Client.check_authorization_status") as mock_cas:
+        with mock.patch(
+            "requests.Session.post", side_effect=test_utils.pending_authz_post
+        ), mock.patch("requests.Session.get", return_value=test_utils.MockResponse()), mock.patch(
+            "sewer.client.Client.check_authorization_status"
+        ) as mock_cas:
 
             self.client.cert()
             self.assertTrue(mock_cas.called)
 
     def test_get_certificate_is_called(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get, mock.patch(
             "sewer.client.Client.get_certificate"
         ) as mock_get_certificate:
@@ -203,8 +242,8 @@ class TestClient(TestCase):
             self.assertTrue(mock_get_certificate.called)
 
     def test_certificate_is_issued(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
             mock_requests_post.return_value = test_utils.MockResponse()
             mock_requests_get.return_value = test_utils.MockResponse()
@@ -220,9 +259,9 @@ class TestClient(TestCase):
             "challenge_url": "challenge_url",
         }
         with mock.patch(
-            "requests.post", return_value=test_utils.MockResponse(status_code=400)
+            "requests.Session.post", return_value=test_utils.MockResponse(status_code=400)
         ), mock.patch(
-            "requests.get", return_value=test_utils.MockResponse(status_code=400)
+            "requests.Session.get", return_value=test_utils.MockResponse(status_code=400)
         ), mock.patch(
             "sewer.client.Client.get_identifier_authorization", return_value=gia_return_value
         ), mock.patch(
@@ -239,9 +278,24 @@ class TestClient(TestCase):
                 mock_get_certificate()
             self.assertIn("Error applying for certificate", str(raised_exception.exception))
 
+    def test_nonces_are_harvested_not_fetched(self):
+        with mock.patch(
+            "requests.Session.post", return_value=test_utils.MockResponse()
+        ), mock.patch(
+            "requests.Session.get", return_value=test_utils.MockResponse()
+        ) as mock_requests_get, mock.patch(
+            "requests.Session.head", return_value=test_utils.MockResponse()
+        ) as mock_requests_head:
+
+            # at most the first signed request needs newNonce (if the directory was cached)
+            self.client.cert()
+            self.assertLessEqual(mock_requests_head.call_count, 1)
+            for call in mock_requests_get.call_args_list:
+                self.assertNotEqual(call[0][0], self.client.ACME_GET_NONCE_URL)
+
     def test_certificate_is_issued_for_renewal(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
             mock_requests_post.return_value = test_utils.MockResponse()
             mock_requests_get.return_value = test_utils.MockResponse()
@@ -275,8 +329,8 @@ class TestClientForSAN(TestClient):
             "staging.exampleSAN.com",
             "www.exampleSAN.com",
         ]
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
             mock_requests_post.return_value = test_utils.MockResponse()
             mock_requests_get.return_value = test_utils.MockResponse()
@@ -304,8 +358,8 @@ class TestClientForWildcard(TestClient):
             "staging.exampleSAN.com",
             "www.exampleSAN.com",
         ]
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
             mock_requests_post.return_value = test_utils.MockResponse()
             mock_requests_get.return_value = test_utils.MockResponse()
@@ -329,9 +383,10 @@ class TestClientDnsApiCompatibility(TestCase):
     # pylint: disable=E1125
 
     def setUp(self):
+        mock_nonce_head(self)
         self.domain_name = "example.com"
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get:
             mock_requests_post.return_value = test_utils.MockResponse()
             mock_requests_get.return_value = test_utils.MockResponse()
@@ -340,20 +395,26 @@ class TestClientDnsApiCompatibility(TestCase):
             self.client = sewer.client.Client(
                 domain_name=self.domain_name, dns_class=self.dns_class, **usual_ACME()
             )
+            self.client.directory
 
     def test_get_get_acme_endpoints_failure_results_in_exception_with(self):
         with mock.patch(
-            "requests.post", return_value=test_utils.MockResponse(status_code=409)
-        ), mock.patch("requests.get", return_value=test_utils.MockResponse(status_code=409)):
+            "requests.Session.post", return_value=test_utils.MockResponse(status_code=409)
+        ), mock.patch(
+            "requests.Session.get", return_value=test_utils.MockResponse(status_code=409)
+        ):
 
             def mock_create_acme_client():
+                # construction is lazy: the directory isn't fetched until it's needed
                 sewer.client.Client(
                     domain_name="example.com",
                     dns_class=test_utils.ExmpleDnsProvider(),  # NOTE: dns_class used here
                     ACME_DIRECTORY_URL=ACME_DIRECTORY_URL_STAGING,
                     LOG_LEVEL=LOG_LEVEL,
                     **keys_for_ACME(),
-                )
+                ).directory
+
+            clear_directory_caches()
 
             self.assertRaises(ValueError, mock_create_acme_client)
             with self.assertRaises(ValueError) as raised_exception:
@@ -361,23 +422,23 @@ class TestClientDnsApiCompatibility(TestCase):
             self.assertIn("Error while getting Acme endpoints", str(raised_exception.exception))
 
     def test_create_dns_record_is_called(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get, mock.patch(
             "sewer.tests.test_utils.ExmpleDnsProvider.create_dns_record"
         ) as mock_create_dns_record:
-            mock_requests_post.return_value = test_utils.MockResponse()
+            mock_requests_post.side_effect = test_utils.pending_authz_post
             mock_requests_get.return_value = test_utils.MockResponse()
             self.client.cert()
             self.assertTrue(mock_create_dns_record.called)
 
     def test_delete_dns_record_is_called(self):
-        with mock.patch("requests.post") as mock_requests_post, mock.patch(
-            "requests.get"
+        with mock.patch("requests.Session.post") as mock_requests_post, mock.patch(
+            "requests.Session.get"
         ) as mock_requests_get, mock.patch(
             "sewer.tests.test_utils.ExmpleDnsProvider.delete_dns_record"
         ) as mock_delete_dns_record:
-            mock_requests_post.return_value = test_utils.MockResponse()
+            mock_requests_post.side_effect = test_utils.pending_authz_post
             mock_requests_get.return_value = test_utils.MockResponse()
             self.client.cert()
             self.assertTrue(mock_delete_dns_record.called)
@@ -424,10 +485,383 @@ class TestClientUnits(TestCase):
 
     def test03_prop_timeout_timeout(self):
         # with default [1,2,4,8] sleep times and timeout of 2, needs 3 failures to timeout
-        p = test_utils.ExmpleDNS(prop_timeout=2, fail_prop_count=3)
+        clock = VirtualClock()
+        p = test_utils.ExmpleDNS(prop_timeout=2, fail_prop_count=3, clock=clock)
         with self.assertRaises(RuntimeError):
             self.mock_sewer(provider=p).propagation_delay(self.mock_challenges)
+        self.assertEqual(clock.sleeps, [1, 2])
 
     def test04_prop_timeout_delayed_okay(self):
-        p = test_utils.ExmpleDNS(prop_timeout=20, fail_prop_count=2)
+        clock = VirtualClock()
+        p = test_utils.ExmpleDNS(prop_timeout=20, fail_prop_count=2, clock=clock)
         self.mock_sewer(provider=p).propagation_delay(self.mock_challenges)
+        self.assertEqual(clock.sleeps, [1, 2])
+
+    # the Client's steps are the protocol's (Client.get_identifier_authorization)
+
+    def test05_no_offered_challenge_type(self):
+        client = self.mock_sewer(provider=test_utils.ExmpleHttpProvider())
+        authz = mock.Mock(status_code=200, headers={})
+        authz.json.return_value = {
+            "status": "pending",
+            "identifier": {"value": "example.com"},
+            "challenges": [{"type": "tls-alpn-01", "token": "t", "url": "http://localhost/c"}],
+        }
+        with mock.patch.object(client, "make_signed_acme_request", return_value=authz):
+            with self.assertRaisesRegex(ValueError, "no challenge of type"):
+                client.get_identifier_authorization("http://localhost/authz")
+
+    # order-level polling (Client.poll_order)
+
+    def order_response(self, status, retry_after=None):
+        response = mock.Mock(status_code=200, headers={})
+        response.json.return_value = {"status": status, "authorizations": []}
+        if retry_after:
+            response.headers["Retry-After"] = retry_after
+        return response
+
+    def test08_poll_order_honours_retry_after(self):
+        client = self.mock_sewer(provider=test_utils.ExmpleHttpProvider())
+        client.order_url = "http://localhost/order"
+        client.poller.sleep = mock.Mock()
+        with mock.patch.object(client, "make_signed_acme_request") as msar:
+            msar.side_effect = [
+                self.order_response("pending", "2"),
+                self.order_response("processing"),
+                self.order_response("ready"),
+            ]
+            self.assertEqual(client.poll_order()["status"], "ready")
+        self.assertEqual(msar.call_count, 3)
+        self.assertEqual(client.poller.sleep.call_args_list[0], mock.call(2.0))
+
+    def test09_poll_order_invalid_fails_fast(self):
+        client = self.mock_sewer(provider=test_utils.ExmpleHttpProvider())
+        client.order_url = "http://localhost/order"
+        with mock.patch.object(client, "make_signed_acme_request") as msar:
+            msar.return_value = self.order_response("invalid")
+            with self.assertRaises(AcmeAuthorizationError):
+                client.poll_order()
+        self.assertEqual(msar.call_count, 1)
+
+    # asynchronous finalization (Client.send_csr)
+
+    def test10_send_csr_polls_processing_order(self):
+        client = self.mock_sewer(provider=test_utils.ExmpleHttpProvider())
+        client.order_url = "http://localhost/order"
+        client.poller.sleep = mock.Mock()
+        valid = self.order_response("valid")
+        valid.json.return_value["certificate"] = "http://localhost/cert"
+        with mock.patch.object(client, "make_signed_acme_request") as msar:
+            msar.side_effect = [
+                self.order_response("processing", "3"),
+                self.order_response("processing"),
+                valid,
+            ]
+            self.assertEqual(client.send_csr("http://localhost/finalize"), "http://localhost/cert")
+        self.assertEqual(msar.call_count, 3)
+        self.assertEqual(client.poller.sleep.call_args_list[0], mock.call(3.0))
+
+    # valid authorizations need no challenge (Client.get_certificate with the authz cache)
+
+    def mock_issue(self, client, post):
+        with mock.patch("requests.Session.post", side_effect=post) as mock_post, mock.patch(
+            "requests.Session.get", return_value=test_utils.MockResponse()
+        ), mock.patch("requests.Session.head", return_value=test_utils.MockResponse()):
+            client.get_certificate()
+        return [c[0][0] for c in mock_post.call_args_list]
+
+    def valid_authz_post(self, url, *args, **kwargs):
+        response = test_utils.MockResponse()
+        if "authorization" in url:
+            content = response.json()
+            content["expires"] = "2999-01-01T00:00:00Z"
+            response.content_to_use_in_json_method = json.dumps(content).encode()
+        return response
+
+    def test11_valid_authorization_skips_provider(self):
+        provider = test_utils.ExmpleHttpProvider()
+        provider.setup = mock.Mock(return_value=[])
+        client = self.mock_sewer(provider=provider)
+        self.mock_issue(client, self.valid_authz_post)
+        self.assertFalse(provider.setup.called)
+        self.assertEqual(
+            client.acme.authz_cache.get(client.account.kid, "example.com"),
+            "http://localhost/authorization-url",
+        )
+
+    def test12_cached_authorization_not_fetched(self):
+        provider = test_utils.ExmpleHttpProvider()
+        provider.setup = mock.Mock(return_value=[])
+        client = self.mock_sewer(provider=provider)
+        self.mock_issue(client, self.valid_authz_post)
+        again = client.acme.order(
+            domain_name="example.com", cert_key=client.cert_key, provider=provider
+        )
+        urls = self.mock_issue(again, self.valid_authz_post)
+        self.assertNotIn("http://localhost/authorization-url", urls)
+        self.assertFalse(provider.setup.called)
+
+    def test13_pending_authorization_is_set_up(self):
+        provider = test_utils.ExmpleHttpProvider()
+        provider.setup = mock.Mock(return_value=[])
+        self.mock_issue(self.mock_sewer(provider=provider), test_utils.pending_authz_post)
+        self.assertEqual(provider.setup.call_count, 1)
+
+    # crash-safe order journal (OrderProtocol.resume)
+
+    def journaled_client(self, root, provider, **kwargs):
+        acme = AcmeSession(
+            account=self.mock_args["account"], LOG_LEVEL=LOG_LEVEL, order_journal=OrderJournal(root)
+        )
+        return acme.order(
+            domain_name="example.com",
+            cert_key=self.mock_args["cert_key"],
+            provider=provider,
+            **kwargs,
+        )
+
+    def test14_journal_removed_after_issue(self):
+        with tempfile.TemporaryDirectory() as root:
+            client = self.journaled_client(root, test_utils.ExmpleHttpProvider())
+            self.mock_issue(client, test_utils.pending_authz_post)
+            orders = os.listdir(os.path.join(root, "orders"))
+            self.assertEqual([name for name in orders if name.endswith(".json")], [])
+
+    def test15_resume_clears_orphans_and_skips_new_order(self):
+        provider = test_utils.ExmpleHttpProvider()
+        provider.clear = mock.Mock(return_value=[])
+        orphan = {"ident_value": "example.com", "auth_url": "http://localhost/authorization-url"}
+        with tempfile.TemporaryDirectory() as root:
+            client = self.journaled_client(root, provider)
+            record = client.journal.new(client.account.kid, client.all_domain_names)
+            record.update(
+                status="finalizing",
+                order_url="http://localhost/order",
+                finalize_url="http://localhost/finalize-url",
+                authorizations=["http://localhost/authorization-url"],
+                challenges=[orphan],
+                csr_key=client.cert_key.fingerprint(),
+            )
+            client.journal.write(record)
+            urls = self.mock_issue(client, test_utils.pending_authz_post)
+            self.assertIsNone(client.journal.load(client.account.kid, client.all_domain_names))
+        provider.clear.assert_any_call([orphan])
+        self.assertEqual(
+            urls, ["http://localhost/order", "http://localhost/certificate-url"],
+        )
+
+    # two-phase issuance (Client.prevalidate)
+
+    def ready_order_post(self, url, *args, **kwargs):
+        "authorizations are pending, the order (at MockResponse's Location) is ready"
+
+        response = test_utils.pending_authz_post(url)
+        if url == response.headers["Location"]:
+            content = response.json()
+            content["status"] = "ready"
+            response.content_to_use_in_json_method = json.dumps(content).encode()
+        return response
+
+    def test16_prevalidate_then_finalize(self):
+        provider = test_utils.ExmpleHttpProvider()
+        provider.setup = mock.Mock(return_value=[])
+        with tempfile.TemporaryDirectory() as root:
+            client = self.journaled_client(root, provider)
+            with mock.patch(
+                "requests.Session.post", side_effect=self.ready_order_post
+            ) as post, mock.patch(
+                "requests.Session.get", return_value=test_utils.MockResponse()
+            ), mock.patch(
+                "requests.Session.head", return_value=test_utils.MockResponse()
+            ):
+                order = client.prevalidate()
+            self.assertEqual(order["status"], "ready")
+            posted = [c[0][0] for c in post.call_args_list]
+            self.assertNotIn("http://localhost/finalize-url", posted)
+            record = client.journal.load(client.account.kid, client.all_domain_names)
+            self.assertEqual(record["status"], "ready")
+
+            later = self.journaled_client(root, provider)
+            urls = self.mock_issue(later, self.ready_order_post)
+            self.assertIsNone(later.journal.load(later.account.kid, later.all_domain_names))
+        self.assertEqual(provider.setup.call_count, 1)
+        self.assertEqual(urls[0], "https://localhost/acme/acct/1")
+        self.assertIn("http://localhost/finalize-url", urls)
+        self.assertNotIn("http://localhost/newOrder", urls)
+        self.assertNotIn("http://localhost/authorization-url", urls)
+
+    # injectable clock: the whole flow, timeouts included, in virtual time
+
+    def never_ready_post(self, url, *args, **kwargs):
+        "authorizations and the order (at MockResponse's Location) stay pending"
+
+        response = test_utils.MockResponse()
+        if "authorization" in url or url == response.headers["Location"]:
+            content = response.json()
+            content["status"] = "pending"
+            response.content_to_use_in_json_method = json.dumps(content).encode()
+        return response
+
+    def test17_virtual_clock_issuance_times_out(self):
+        clock = VirtualClock()
+        provider = test_utils.ExmpleDNS(fail_prop_count=0, prop_delay=30, clock=clock)
+        client = self.mock_sewer(provider=provider)
+        started = time.monotonic()
+        with self.assertRaises(AcmePollTimeout):
+            self.mock_issue(client, self.never_ready_post)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(clock.sleeps[0], 30)
+        self.assertGreaterEqual(clock.monotonic(), 30 + client.poller.timeout)
+
+    # deadline budget and cancellation
+
+    def test18_deadline_bounds_issuance_and_still_clears(self):
+        clock = VirtualClock()
+        provider = test_utils.ExmpleDNS(fail_prop_count=0, prop_delay=5, clock=clock)
+        provider.clear = mock.Mock(return_value=[])
+        client = sewer.client.Client(
+            provider=provider, deadline=Deadline(12, clock=clock), **self.mock_args
+        )
+        with self.assertRaises(AcmeDeadlineError):
+            self.mock_issue(client, self.never_ready_post)
+        self.assertEqual(clock.monotonic(), 12)
+        self.assertEqual(len(provider.clear.call_args[0][0]), 1)
+
+    def test19_cancel_from_another_thread(self):
+        provider = test_utils.ExmpleDNS(fail_prop_count=0, prop_delay=60)
+        provider.clear = mock.Mock(return_value=[])
+        deadline = Deadline()
+        client = sewer.client.Client(provider=provider, deadline=deadline, **self.mock_args)
+        threading.Timer(0.1, deadline.cancel, ["shutting down"]).start()
+        started = time.monotonic()
+        with self.assertRaises(AcmeCancelledError) as raised:
+            self.mock_issue(client, self.never_ready_post)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIn("shutting down", str(raised.exception))
+        self.assertTrue(provider.clear.called)
+
+    # streaming challenges (Client(stream_challenges=True))
+
+    def test20_streaming_sets_up_each_challenge_alone(self):
+        provider = test_utils.ExmpleHttpProvider()
+        provider.setup = mock.Mock(return_value=[])
+        provider.clear = mock.Mock(return_value=[])
+        client = sewer.client.Client(
+            provider=provider,
+            domain_alt_names=["www.example.com"],
+            stream_challenges=True,
+            **self.mock_args,
+        )
+        client.get_identifier_authorization = mock.Mock(
+            side_effect=lambda auth_url: {
+                "domain": auth_url.split("/")[-1],
+                "url": auth_url,
+                "wildcard": None,
+                "token": "token",
+                "challenge_url": "http://localhost/challenge-url",
+                "status": "pending",
+            }
+        )
+        client.apply_for_cert_issuance = mock.Mock(
+            return_value=(
+                ["http://localhost/authz/example.com", "http://localhost/authz/www.example.com"],
+                "http://localhost/finalize-url",
+            )
+        )
+        self.mock_issue(client, test_utils.pending_authz_post)
+        self.assertEqual(
+            sorted(c[0][0][0]["ident_value"] for c in provider.setup.call_args_list),
+            ["example.com", "www.example.com"],
+        )
+        self.assertEqual(len(provider.clear.call_args[0][0]), 2)
+
+    # a live run's journal record is not an orphan
+
+    def test21_claimed_journal_record_left_alone(self):
+        provider = test_utils.ExmpleHttpProvider()
+        provider.clear = mock.Mock(return_value=[])
+        live = {"ident_value": "example.com", "auth_url": "http://localhost/authorization-url"}
+        with tempfile.TemporaryDirectory() as root:
+            client = self.journaled_client(root, provider)
+            kid, names = client.account.kid, client.all_domain_names
+            record = client.journal.new(kid, names)
+            record.update(
+                status="pending",
+                order_url="http://localhost/order",
+                finalize_url="http://localhost/finalize-url",
+                authorizations=["http://localhost/authorization-url"],
+                challenges=[live],
+            )
+            client.journal.write(record)
+
+            claim = client.journal.claim(kid, names)
+            urls = self.mock_issue(client, test_utils.pending_authz_post)
+            self.assertIn("http://localhost/newOrder", urls)
+            self.assertNotIn(mock.call([live]), provider.clear.call_args_list)
+            self.assertEqual(client.journal.load(kid, names)["challenges"], [live])
+
+            client.journal.release(claim)
+            later = self.journaled_client(root, provider)
+            self.mock_issue(later, test_utils.pending_authz_post)
+            provider.clear.assert_any_call([live])
+            self.assertIsNone(later.journal.load(kid, names))
+
+    # providers that never ran ProviderBase.__init__ have no clock of their own
+
+    def test22_provider_without_clock_uses_real_clock(self):
+        class Bare(test_utils.ExmpleHttpProvider):
+            def __init__(self):
+                self.chal_types = ["http-01"]
+
+        self.assertIs(self.mock_sewer(Bare()).clock, REAL_CLOCK)
+
+    # streamed challenges are journaled concurrently, none may be lost
+
+    def test23_streamed_challenges_all_journaled_before_setup(self):
+        alt_names = ["a.example.com", "b.example.com", "c.example.com"]
+        all_names = ["example.com"] + alt_names
+        all_setting_up = threading.Barrier(len(all_names), timeout=5)
+        journaled = []
+
+        def setup(chals):
+            all_setting_up.wait()
+            record = client.journal.load(client.account.kid, client.all_domain_names)
+            journaled.append(sorted(c["ident_value"] for c in record["challenges"]))
+            return []
+
+        provider = test_utils.ExmpleHttpProvider()
+        provider.setup = mock.Mock(side_effect=setup)
+        provider.clear = mock.Mock(return_value=[])
+        with tempfile.TemporaryDirectory() as root:
+            client = self.journaled_client(
+                root, provider, domain_alt_names=alt_names, stream_challenges=True
+            )
+            client.get_identifier_authorization = mock.Mock(
+                side_effect=lambda auth_url: {
+                    "domain": auth_url.split("/")[-1],
+                    "url": auth_url,
+                    "wildcard": None,
+                    "token": "token",
+                    "challenge_url": "http://localhost/challenge-url",
+                    "status": "pending",
+                }
+            )
+            client.apply_for_cert_issuance = mock.Mock(
+                return_value=(
+                    ["http://localhost/authz/" + name for name in all_names],
+                    "http://localhost/finalize-url",
+                )
+            )
+            # the first stream to journal its challenge is the last to get it recorded
+            record, delayed = client.protocol_event, []
+
+            def slow_first(event):
+                if event.name in ("journal", "challenge") and not delayed:
+                    if event.data.get("challenge") or event.data.get("challenges"):
+                        delayed.append(event)
+                        time.sleep(0.2)
+                record(event)
+
+            client.protocol_event = slow_first
+            self.mock_issue(client, test_utils.pending_authz_post)
+        self.assertEqual(journaled, [sorted(all_names)] * len(all_names))
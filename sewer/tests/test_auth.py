@@ -128,3 +128,78 @@ class TestAuthDNS(unittest.TestCase):
             p.target_domain(chal) == "example.com.valid.com"
             and p.cname_domain(chal) == "_acme-challenge.example.com"
         )
+
+    ### grouping by zone and the bulk / per-record hooks
+
+    def _challenges(self, *names):
+        return [{"ident_value": name, "key_auth": "key-auth-" + name} for name in names]
+
+    def test06_records_by_zone(self):
+        p = auth.DNSProviderBase()
+        chals = self._challenges("a.example.com", "example.com", "example.com", "b.example.org")
+        self.assertEqual(
+            p.records_by_zone(chals),
+            {
+                "example.com": {
+                    "_acme-challenge.a.example.com": [chals[0]],
+                    "_acme-challenge.example.com": chals[1:3],
+                },
+                "example.org": {"_acme-challenge.b.example.org": [chals[3]]},
+            },
+        )
+
+    def test07_no_hooks_not_implemented(self):
+        with self.assertRaises(NotImplementedError):
+            auth.DNSProviderBase().setup(self._challenges("example.com"))
+
+    def test08_bulk_hooks_one_call_per_zone(self):
+        calls = []
+
+        class Bulk(auth.DNSProviderBase):
+            def setup_zone(self, zone, records):
+                calls.append((zone, sorted(records)))
+                return []
+
+            def setup_record(self, target, chal):
+                raise AssertionError("per-record hook used when bulk is implemented")
+
+        chals = self._challenges("a.example.com", "b.example.com", "c.example.org")
+        self.assertEqual(Bulk(max_concurrency=2).setup(chals), [])
+        self.assertEqual(
+            sorted(calls),
+            [
+                ("example.com", ["_acme-challenge.a.example.com", "_acme-challenge.b.example.com"]),
+                ("example.org", ["_acme-challenge.c.example.org"]),
+            ],
+        )
+
+    def test09_bulk_failure_fails_whole_zone(self):
+        class Bulk(auth.DNSProviderBase):
+            def clear_zone(self, zone, records):
+                if zone == "example.com":
+                    raise ValueError("zone is locked")
+                return []
+
+        chals = self._challenges("a.example.com", "b.example.com", "c.example.org")
+        errata = Bulk().clear(chals)
+        self.assertEqual(errata, [("failed", "zone is locked", c) for c in chals[:2]])
+
+    def test10_per_record_fallback(self):
+        calls = []
+
+        class PerRecord(auth.DNSProviderBase):
+            def setup_record(self, target, chal):
+                if chal["ident_value"] == "b.example.com":
+                    raise ValueError("bad name")
+                calls.append(target)
+
+        chals = self._challenges("a.example.com", "b.example.com", "c.example.org")
+        errata = PerRecord().setup(chals)
+        self.assertEqual(calls, ["_acme-challenge.a.example.com"])
+        self.assertEqual(
+            errata,
+            [
+                ("failed", "bad name", chals[1]),
+                ("skipped", "skipped after an earlier failure", chals[2]),
+            ],
+        )
@@ -39,3 +39,25 @@ class TestLib(unittest.TestCase):
     def test41_sewer_meta_okay(self):
         res = lib.sewer_meta("license")
         self.assertEqual(res, "MIT")
+
+    def test51_acme_problem_typed(self):
+        class problem_response(response):
+            def __init__(self, status_code, **kwargs):
+                super().__init__(**kwargs)
+                self.status_code = status_code
+
+        self.assertIsNone(lib.acme_problem(problem_response(200, json_val={})))
+        bad = lib.acme_problem(
+            problem_response(
+                400, json_val={"type": "urn:ietf:params:acme:error:badNonce", "detail": "stale"},
+            )
+        )
+        self.assertIsInstance(bad, lib.AcmeBadNonceError)
+        self.assertEqual((bad.type, bad.detail, bad.status), ("badNonce", "stale", 400))
+        self.assertIsInstance(
+            lib.acme_problem(problem_response(502, content_val=b"<html>")), lib.AcmeServerError
+        )
+        self.assertEqual(
+            type(lib.acme_problem(problem_response(403, json_val={"type": "other"}))),
+            lib.AcmeProblem,
+        )
@@ -93,3 +93,14 @@ class MockResponse(object):
     def json(self):
         json_d = json.loads(self.content_to_use_in_json_method.decode())
         return json_d
+
+
+def pending_authz_post(url, *args, **kwargs):
+    "Session.post side_effect: authorizations are pending, everything else is as MockResponse"
+
+    response = MockResponse()
+    if "authorization" in url:
+        content = response.json()
+        content["status"] = "pending"
+        response.content_to_use_in_json_method = json.dumps(content).encode()
+    return response
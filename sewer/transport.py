@@ -0,0 +1,94 @@
+"transport.py - pooled, keep-alive HTTP sessions shared by everything talking to one host"
+
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+### Only idempotent requests are retried by the adapter.  A signed POST carries a
+### nonce that's been used up once it reaches the server, so it has to be re-signed
+### rather than resent - that's for the ACME layer to do, not this one.
+
+RETRY_METHODS = frozenset(["GET", "HEAD"])
+RETRY_STATUS = (502, 503, 504)
+
+### DNS provider APIs are plain REST: PUT and DELETE are idempotent there, and are
+### retried along with GET and HEAD.  POST and PATCH never are.
+
+PROVIDER_RETRY_METHODS = frozenset(["GET", "HEAD", "PUT", "DELETE"])
+
+
+class TimeoutSession(requests.Session):
+    "a requests.Session whose requests get timeout seconds unless they say otherwise"
+
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:  # type: ignore
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+def new_session(
+    *,
+    pool_size: int = 10,
+    retries: int = 2,
+    methods: Iterable[str] = RETRY_METHODS,
+    timeout: Optional[float] = None,
+) -> requests.Session:
+    """
+    return a requests.Session with keep-alive connection pools of pool_size and
+    bounded, backed-off retries of connection errors and of requests using the
+    idempotent methods.  timeout, if given, is the default for every request.
+    """
+
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        allowed_methods=frozenset(methods),
+        status_forcelist=RETRY_STATUS,
+        backoff_factor=0.5,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = TimeoutSession(timeout)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_sessions: Dict[Tuple[str, int, int], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def shared_session(url: str, *, pool_size: int = 10, retries: int = 2) -> requests.Session:
+    """
+    returns the process-wide session for url's host (and the pool settings),
+    creating it on first use.  Every Client talking to the same CA shares the
+    one connection pool, which is safe across threads since each request
+    checks a connection out of the pool for its exclusive use.
+    """
+
+    parts = urlsplit(url)
+    key = ("%s://%s" % (parts.scheme, parts.netloc), pool_size, retries)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = new_session(pool_size=pool_size, retries=retries)
+    return session
+
+
+def close_shared_sessions() -> None:
+    "close and forget all the shared sessions (tests, or a long-lived process tidying up)"
+
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,115 @@
+"zones.py - which of a DNS service's zones a name is in, without asking the service every time"
+
+import json, threading
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .clock import Clock, REAL_CLOCK
+from .store import atomic_write
+
+ZoneListType = Dict[str, Any]
+
+
+def _labels(name: str) -> Iterator[str]:
+    "a name's labels from the root down: www.example.com -> com, example, www"
+
+    return reversed(name.strip().lower().rstrip(".").split("."))
+
+
+class ZoneIndex:
+    """
+    A label trie of a DNS service's zones, built from the driver's listing:
+    list_zones() -> {zone name: zone id (whatever the driver wants back)}.
+    lookup finds the zone holding a name by longest suffix match, so
+    _acme-challenge.www.sub.example.com lands in sub.example.com if that's a
+    zone of its own, else in example.com.
+
+    The listing is fetched on first use and again once it's ttl seconds old,
+    or when a name isn't found in a listing that's at least miss_ttl seconds
+    old (the zone may have been added since) - so a run of names that are in
+    no zone costs at most one extra fetch per miss_ttl.  With path set the listing is also kept
+    in that file, so later runs start with it.  Thread-safe; concurrent
+    lookups share a single fetch.
+    """
+
+    def __init__(
+        self,
+        list_zones: Callable[[], ZoneListType],
+        *,
+        ttl: float = 3600,
+        miss_ttl: float = 60,
+        path: Optional[str] = None,
+        clock: Optional[Clock] = None,
+    ) -> None:
+        self.list_zones = list_zones
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.path = path
+        self.clock = clock if clock else REAL_CLOCK
+        self.fetched: Optional[float] = None
+        self._root: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, name: str) -> Optional[Tuple[str, Any]]:
+        "returns (zone name, zone id) for the zone that holds name, or None if there's none"
+
+        with self._lock:
+            if self.fetched is None and not self._load():
+                self._fetch()
+            elif self.clock.time() - self.fetched >= self.ttl:  # type: ignore
+                self._fetch()
+            found = self._match(name)
+            if found is None and self.clock.time() - self.fetched >= self.miss_ttl:  # type: ignore
+                self._fetch()
+                found = self._match(name)
+            return found
+
+    def invalidate(self) -> None:
+        "forget the listing, so the next lookup fetches it again"
+
+        with self._lock:
+            self.fetched = None
+            self._root = {}
+
+    ### the trie: nested dicts keyed by label, with the zone (if any) under ""
+
+    def _build(self, zones: ZoneListType, fetched: float) -> None:
+        root: Dict[str, Any] = {}
+        for zone_name, zone_id in zones.items():
+            node = root
+            for label in _labels(zone_name):
+                node = node.setdefault(label, {})
+            node[""] = (zone_name.lower().rstrip("."), zone_id)
+        self._root = root
+        self.fetched = fetched
+
+    def _match(self, name: str) -> Optional[Tuple[str, Any]]:
+        node, found = self._root, None
+        for label in _labels(name):
+            node = node.get(label)  # type: ignore
+            if node is None:
+                break
+            found = node.get("", found)
+        return found
+
+    ### fetching, and disk persistence - errors there are not fatal, it's only a cache
+
+    def _fetch(self) -> None:
+        zones = self.list_zones()
+        self._build(zones, self.clock.time())
+        if self.path:
+            try:
+                data = {"fetched": self.fetched, "zones": zones}
+                atomic_write(self.path, json.dumps(data).encode())
+            except (OSError, TypeError, ValueError):
+                pass
+
+    def _load(self) -> bool:
+        if not self.path:
+            return False
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self._build(data["zones"], float(data["fetched"]))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return False
+        return True
@@ -0,0 +1,80 @@
+import asyncio, time
+from unittest import mock
+
+from sewer.aio import AsyncClient, get_certificates
+from sewer.crypto import AcmeAccount, AcmeKey
+from sewer.directory import clear_directory_caches
+from sewer.session import AcmeSession
+from sewer.tests.test_utils import ExmpleHttpProvider, MockResponse, pending_authz_post
+
+DIRECTORY_URL = "https://acme.aio.test/directory"
+
+
+def mocked(post=pending_authz_post):
+    clear_directory_caches()
+    return (
+        mock.patch("requests.Session.post", side_effect=post),
+        mock.patch("requests.Session.get", return_value=MockResponse()),
+        mock.patch("requests.Session.head", return_value=MockResponse()),
+    )
+
+
+def async_orders(n, provider):
+    acme = AcmeSession(
+        account=AcmeAccount.create("secp256r1"), ACME_DIRECTORY_URL=DIRECTORY_URL, LOG_LEVEL="ERROR"
+    )
+    return [
+        AsyncClient(
+            acme.order(
+                domain_name="n%s.example.com" % i,
+                cert_key=AcmeKey.create("secp256r1"),
+                provider=provider,
+            )
+        )
+        for i in range(n)
+    ]
+
+
+def test01_async_certificate():
+    provider = ExmpleHttpProvider()
+    provider.setup = mock.Mock(return_value=[])
+    post, get, head = mocked()
+    with post, get, head:
+        (client,) = async_orders(1, provider)
+        cert = asyncio.run(client.get_certificate())
+    assert "BEGIN CERTIFICATE" in cert
+    assert provider.setup.call_count == 1
+
+
+def test02_waits_overlap_on_one_loop():
+    provider = ExmpleHttpProvider()
+    provider.prop_delay = 1
+    post, get, head = mocked()
+    with post, get, head:
+        clients = async_orders(8, provider)
+        start = time.monotonic()
+        certs = asyncio.run(get_certificates(clients, limit=8))
+        elapsed = time.monotonic() - start
+    assert all("BEGIN CERTIFICATE" in cert for cert in certs)
+    assert elapsed < 4
+
+
+def test03_failures_are_returned():
+    post, get, head = mocked(post=lambda url, *args, **kwargs: MockResponse(status_code=400))
+    with post, get, head:
+        clients = async_orders(2, ExmpleHttpProvider())
+        results = asyncio.run(get_certificates(clients))
+    assert all(isinstance(r, Exception) for r in results)
+
+
+def test04_client_sync_driver():
+    provider = ExmpleHttpProvider()
+    provider.setup = mock.Mock(return_value=[])
+    post, get, head = mocked()
+    with post, get, head:
+        (aclient,) = async_orders(1, provider)
+        c = aclient.client
+        c.acme_register()
+        cert = c.protocol_driver().run(c.order_protocol().issue())
+    assert "BEGIN CERTIFICATE" in cert
+    assert provider.setup.call_count == 1
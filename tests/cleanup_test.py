@@ -0,0 +1,103 @@
+import fcntl, os, threading
+from unittest import mock
+
+from sewer.cleanup import CleanupQueue
+from sewer.clock import VirtualClock
+from sewer.crypto import AcmeAccount, AcmeKey
+from sewer.directory import clear_directory_caches
+from sewer.session import AcmeSession
+from sewer.tests.test_utils import ExmpleHttpProvider, MockResponse, pending_authz_post
+
+CHALS = [{"ident_value": "a.example.com"}, {"ident_value": "b.example.com"}]
+
+
+def provider(clear):
+    p = ExmpleHttpProvider()
+    p.clear = mock.Mock(side_effect=clear)
+    return p
+
+
+def test01_defer_returns_at_once():
+    release = threading.Event()
+    p = provider(lambda chals: release.wait(5) and [])
+    q = CleanupQueue()
+    assert q.defer(p, CHALS) == []
+    assert not release.is_set()
+    release.set()
+    assert q.flush(5)
+    p.clear.assert_called_once_with(CHALS)
+
+
+def test02_failures_are_retried_with_backoff():
+    results = [[("failed", "busy", CHALS[1])], []]
+    p = provider(lambda chals: results.pop(0))
+    clock = VirtualClock()
+    q = CleanupQueue(clock=clock, backoff=3)
+    q.defer(p, CHALS)
+    assert q.flush(5)
+    assert p.clear.call_args_list == [mock.call(CHALS), mock.call([CHALS[1]])]
+    assert clock.sleeps == [3]
+    assert q.failed == []
+
+
+def test03_persistent_queue_recovered_by_later_run(tmp_path):
+    failing = provider(lambda chals: [("failed", "down", c) for c in chals])
+    q = CleanupQueue(str(tmp_path), attempts=2, clock=VirtualClock())
+    assert q.defer(failing, CHALS) == []
+    assert q.flush(5)
+    assert len(q.failed) == 1
+    assert len(os.listdir(os.path.join(str(tmp_path), "cleanup"))) == 1
+
+    working = provider(lambda chals: [])
+    later = CleanupQueue(str(tmp_path))
+    assert later.recover(working) == 1
+    assert later.flush(5)
+    working.clear.assert_called_once_with(CHALS)
+    assert os.listdir(os.path.join(str(tmp_path), "cleanup")) == []
+
+
+def test04_get_certificate_does_not_wait_for_clear():
+    clear_directory_caches()
+    release = threading.Event()
+    p = provider(lambda chals: release.wait(5) and [])
+    q = CleanupQueue()
+    with mock.patch("requests.Session.post", side_effect=pending_authz_post), mock.patch(
+        "requests.Session.get", return_value=MockResponse()
+    ), mock.patch("requests.Session.head", return_value=MockResponse()):
+        acme = AcmeSession(
+            account=AcmeAccount.create("secp256r1"),
+            ACME_DIRECTORY_URL="https://acme.cleanup.test/directory",
+            cleanup=q,
+            LOG_LEVEL="ERROR",
+        )
+        client = acme.order(
+            domain_name="example.com", cert_key=AcmeKey.create("secp256r1"), provider=p
+        )
+        assert "BEGIN CERTIFICATE" in client.get_certificate()
+    assert not release.is_set()
+    release.set()
+    assert q.flush(5)
+    assert p.clear.call_count == 1
+
+
+def test05_persisted_cleanup_claimed_by_one_run(tmp_path):
+    failing = provider(lambda chals: [("failed", "down", c) for c in chals])
+    q = CleanupQueue(str(tmp_path), attempts=1)
+    q.defer(failing, CHALS)
+    assert q.flush(5)
+    (name,) = os.listdir(os.path.join(str(tmp_path), "cleanup"))
+
+    working = provider(lambda chals: [])
+    later = CleanupQueue(str(tmp_path))
+    # another run is clearing it
+    with open(os.path.join(str(tmp_path), "cleanup", name)) as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX)
+        assert later.recover(working) == 1
+        assert later.flush(5)
+    assert not working.clear.called
+    # nothing's left queued, so it can be recovered again, and done
+    assert later._queued == set()
+    assert later.recover(working) == 1
+    assert later.flush(5)
+    working.clear.assert_called_once_with(CHALS)
+    assert later._queued == set()
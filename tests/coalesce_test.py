@@ -0,0 +1,131 @@
+import os, threading, time
+from unittest import mock
+
+from sewer.coalesce import Coalescer, flight_key
+from sewer.crypto import AcmeAccount, AcmeKey
+from sewer.directory import clear_directory_caches
+from sewer.session import AcmeSession
+from sewer.tests.test_utils import ExmpleHttpProvider, MockResponse, pending_authz_post
+
+
+def concurrently(funcs):
+    "call each of funcs in its own thread, a little apart; returns their results or exceptions"
+
+    results = [None] * len(funcs)
+
+    def one(i):
+        try:
+            results[i] = funcs[i]()
+        except Exception as exc:
+            results[i] = exc
+
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(len(funcs))]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    for t in threads:
+        t.join()
+    return results
+
+
+def slow_issue(calls, result=None, error=None):
+    def issue():
+        calls.append(1)
+        time.sleep(0.2)
+        if error:
+            raise error
+        return result or {"certificate": "cert%s" % len(calls), "key": "key"}
+
+    return issue
+
+
+def test01_flight_key_normalizes_names():
+    a = flight_key("https://ca/dir", ["B.example.com.", "a.example.com"], "rsa2048")
+    b = flight_key("https://ca/dir", ["a.example.com", "b.example.com", "a.example.com"], "rsa2048")
+    assert a == b
+    assert a != flight_key("https://ca/dir", ["a.example.com", "b.example.com"], "secp256r1")
+    assert a != flight_key("https://other/dir", ["a.example.com", "b.example.com"], "rsa2048")
+
+
+def test02_in_process_waiters_share_one_issue():
+    calls = []
+    coalescer = Coalescer()
+    issue = slow_issue(calls)
+    results = concurrently([lambda: coalescer.run("k", issue)] * 4)
+    assert len(calls) == 1
+    assert all(r == {"certificate": "cert1", "key": "key"} for r in results)
+
+
+def test03_failure_is_shared_then_forgotten():
+    calls = []
+    coalescer = Coalescer()
+    issue = slow_issue(calls, error=ValueError("no"))
+    results = concurrently([lambda: coalescer.run("k", issue)] * 3)
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert coalescer.run("k", lambda: {"certificate": "again"}) == {"certificate": "again"}
+
+
+def test04_across_processes_through_lock_file(tmp_path):
+    # separate Coalescers share nothing in memory, just as separate processes wouldn't
+    calls = []
+    coalescers = [Coalescer(str(tmp_path)) for i in range(3)]
+    issue = slow_issue(calls)
+    results = concurrently([lambda c=c: c.run("k", issue) for c in coalescers])
+    assert len(calls) == 1
+    assert all(r == {"certificate": "cert1", "key": "key"} for r in results)
+    # the last to read the result (and its key) removed it
+    assert not (tmp_path / "flights" / "k.json").exists()
+    # but a later, not concurrent, request issues afresh
+    assert coalescers[0].run("k", slow_issue(calls))["certificate"] == "cert2"
+
+
+def test05_concurrent_clients_place_one_order():
+    clear_directory_caches()
+    provider = ExmpleHttpProvider()
+    provider.setup = mock.Mock(side_effect=lambda chals: time.sleep(0.2) or [])
+    with mock.patch("requests.Session.post", side_effect=pending_authz_post) as post, mock.patch(
+        "requests.Session.get", return_value=MockResponse()
+    ), mock.patch("requests.Session.head", return_value=MockResponse()):
+        acme = AcmeSession(
+            account=AcmeAccount.create("secp256r1"),
+            ACME_DIRECTORY_URL="https://acme.coalesce.test/directory",
+            coalescer=Coalescer(),
+            LOG_LEVEL="ERROR",
+        )
+        acme.register()
+        clients = [
+            acme.order(
+                domain_name="example.com",
+                domain_alt_names=["www.example.com"] if i % 2 else ["WWW.example.com"],
+                cert_key=AcmeKey.create("secp256r1"),
+                provider=provider,
+            )
+            for i in range(3)
+        ]
+        certs = concurrently([c.get_certificate for c in clients])
+    assert all("BEGIN CERTIFICATE" in cert for cert in certs)
+    assert [c[0][0] for c in post.call_args_list].count(acme.ACME_NEW_ORDER_URL) == 1
+    assert provider.setup.call_count == 1
+    assert len(set(c.cert_key.to_pem() for c in clients)) == 1
+
+
+def test06_result_not_left_for_dead_waiters(tmp_path):
+    (tmp_path / "flights" / "k.waiting").mkdir(parents=True)
+    # a waiter that died still has its file, but no longer a lock on it
+    (tmp_path / "flights" / "k.waiting" / "gone").touch()
+    calls = []
+    assert Coalescer(str(tmp_path)).run("k", slow_issue(calls))["certificate"] == "cert1"
+    assert not (tmp_path / "flights" / "k.json").exists()
+    assert not list((tmp_path / "flights" / "k.waiting").iterdir())
+
+
+def test07_waiter_still_registering_left_alone(tmp_path):
+    waiting = tmp_path / "flights" / "k.waiting"
+    waiting.mkdir(parents=True)
+    # one waiter has created its file but not yet locked it; another died doing so long ago
+    (waiting / "new.tmp").touch()
+    (waiting / "old.tmp").touch()
+    os.utime(str(waiting / "old.tmp"), (time.time() - 3600,) * 2)
+    Coalescer(str(tmp_path)).run("k", slow_issue([]))
+    assert [p.name for p in waiting.iterdir()] == ["new.tmp"]
@@ -75,3 +75,22 @@ def test31_read_key_write_acct_read_acct():
 
 
 ### TODO ### CSR tests
+
+
+def test41_thumbprint_and_jws_fragment():
+    import base64, hashlib, json
+
+    acct = AcmeAccount.read_pem("tests/data/secp256r1.pem")
+    canonical = json.dumps(acct.jwk(), sort_keys=True, separators=(",", ":")).encode()
+    expected = base64.urlsafe_b64encode(hashlib.sha256(canonical).digest()).rstrip(b"=")
+    assert acct.thumbprint() == expected.decode()
+    assert acct.thumbprint() is acct.thumbprint()
+
+    jwk_header = json.loads(b"{" + acct.jws_fragment(True) + b"}")
+    assert jwk_header == {"alg": "ES256", "jwk": acct.jwk()}
+
+    acct.kid = "https://example.com/acct/1"
+    assert json.loads(b"{" + acct.jws_fragment() + b"}")["kid"] == "https://example.com/acct/1"
+    del acct.kid
+    acct.kid = "https://example.com/acct/2"
+    assert json.loads(b"{" + acct.jws_fragment() + b"}")["kid"] == "https://example.com/acct/2"
@@ -0,0 +1,93 @@
+import json, threading
+
+import pytest
+
+from sewer.clock import VirtualClock
+from sewer.directory import DirectoryCache
+
+URL = "https://acme.example/directory"
+DIRECTORY = {"newNonce": "https://acme.example/new-nonce"}
+
+
+class response:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(body or {}).encode()
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class fetcher:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, url, headers):
+        self.calls.append((url, dict(headers)))
+        return self.responses.pop(0)
+
+
+def test01_cached_within_ttl():
+    fetch = fetcher(response(body=DIRECTORY))
+    cache = DirectoryCache()
+    assert cache.get(URL, fetch) == DIRECTORY
+    assert cache.get(URL, fetch) == DIRECTORY
+    assert len(fetch.calls) == 1
+
+
+def test02_conditional_revalidation():
+    fetch = fetcher(response(body=DIRECTORY, headers={"ETag": '"v1"'}), response(304))
+    cache = DirectoryCache()
+    cache.get(URL, fetch, ttl=0)
+    assert cache.get(URL, fetch, ttl=0) == DIRECTORY
+    assert fetch.calls[1][1] == {"If-None-Match": '"v1"'}
+
+
+def test03_error_raises_and_caches_nothing():
+    fetch = fetcher(response(409), response(body=DIRECTORY))
+    cache = DirectoryCache()
+    with pytest.raises(ValueError, match="Error while getting Acme endpoints"):
+        cache.get(URL, fetch)
+    assert cache.get(URL, fetch) == DIRECTORY
+
+
+def test04_disk_cache_shared(tmp_path):
+    fetch = fetcher(response(body=DIRECTORY))
+    DirectoryCache(str(tmp_path)).get(URL, fetch)
+    assert DirectoryCache(str(tmp_path)).get(URL, fetch) == DIRECTORY
+    assert len(fetch.calls) == 1
+
+
+def test05_ttl_goes_by_given_clock():
+    fetch = fetcher(response(body=DIRECTORY), response(body=DIRECTORY))
+    clock = VirtualClock()
+    cache = DirectoryCache()
+    cache.get(URL, fetch, ttl=600, clock=clock)
+    clock.advance(599)
+    cache.get(URL, fetch, ttl=600, clock=clock)
+    assert len(fetch.calls) == 1
+    clock.advance(1)
+    cache.get(URL, fetch, ttl=600, clock=clock)
+    assert len(fetch.calls) == 2
+
+
+def test06_slow_fetch_holds_up_only_its_own_url():
+    cache = DirectoryCache()
+    started, release = threading.Event(), threading.Event()
+
+    def slow(url, headers):
+        started.set()
+        release.wait(5)
+        return response(body=DIRECTORY)
+
+    t = threading.Thread(target=cache.get, args=(URL, slow))
+    t.start()
+    assert started.wait(5)
+    try:
+        other = "https://other.example/directory"
+        assert cache.get(other, fetcher(response(body=DIRECTORY))) == DIRECTORY
+    finally:
+        release.set()
+        t.join()
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from sewer.nonce import AcmeNonceError, NoncePool
+
+
+class response:
+    def __init__(self, nonce=None):
+        self.headers = {"Replay-Nonce": nonce} if nonce else {}
+
+
+class fetcher:
+    "counts calls, returns numbered nonces"
+
+    def __init__(self, with_nonce=True):
+        self.count = 0
+        self.with_nonce = with_nonce
+
+    def __call__(self):
+        self.count += 1
+        return response("fetched-%s" % self.count if self.with_nonce else None)
+
+
+def test01_harvested_nonce_used_without_fetch():
+    fetch = fetcher()
+    pool = NoncePool(fetch)
+    pool.add(response("harvested"))
+    assert pool.get() == "harvested"
+    assert fetch.count == 0
+
+
+def test02_empty_pool_fetches():
+    fetch = fetcher()
+    pool = NoncePool(fetch)
+    assert pool.get() == "fetched-1"
+    assert fetch.count == 1
+    assert len(pool) == 0
+
+
+def test03_freshest_first_and_no_reuse():
+    pool = NoncePool(fetcher())
+    pool.add(response("old"))
+    pool.add(response("new"))
+    assert pool.get() == "new"
+    assert pool.get() == "old"
+    assert pool.get() == "fetched-1"
+
+
+def test04_response_without_nonce_ignored():
+    pool = NoncePool(fetcher())
+    assert not pool.add(response())
+    assert not pool.add(object())
+    assert len(pool) == 0
+
+
+def test05_stale_nonces_expire():
+    fetch = fetcher()
+    pool = NoncePool(fetch, max_age=0.01)
+    pool.add(response("stale"))
+    time.sleep(0.02)
+    assert len(pool) == 0
+    assert pool.get() == "fetched-1"
+
+
+def test06_fetch_without_nonce_raises():
+    pool = NoncePool(fetcher(with_nonce=False))
+    with pytest.raises(AcmeNonceError):
+        pool.get()
+
+
+def test07_background_refill():
+    fetch = fetcher()
+    pool = NoncePool(fetch, low_water=3)
+    pool.add(response("harvested"))
+    assert pool.get() == "harvested"
+    for _ in range(100):
+        if len(pool) >= 3:
+            break
+        time.sleep(0.01)
+    assert len(pool) == 3
+    assert fetch.count == 3
@@ -0,0 +1,85 @@
+import pytest
+
+from sewer.poll import AcmePollTimeout, Poller, retry_after
+
+
+class response:
+    def __init__(self, status, retry=None):
+        self.status = status
+        self.headers = {"Retry-After": retry} if retry else {}
+
+
+class clock:
+    "virtual time: sleep advances now"
+
+    def __init__(self):
+        self.t = 0.0
+        self.sleeps = []
+
+    def now(self):
+        return self.t
+
+    def sleep(self, secs):
+        self.sleeps.append(secs)
+        self.t += secs
+
+
+def poller(c, **kwargs):
+    return Poller(sleep=c.sleep, now=c.now, **kwargs)
+
+
+def responses(*items):
+    items = list(items)
+    return lambda: items.pop(0)
+
+
+def is_ready(r):
+    return r.status == "ready"
+
+
+def test01_retry_after_seconds_and_date():
+    assert retry_after(response("x", "7")) == 7
+    assert retry_after(response("x")) is None
+    assert retry_after(response("x", "not a date")) is None
+    assert retry_after(response("x", "Wed, 21 Oct 2015 07:28:00 GMT")) == 0
+
+
+def test02_first_check_is_immediate():
+    c = clock()
+    res = poller(c).poll(responses(response("ready")), is_ready)
+    assert res.status == "ready" and c.sleeps == []
+
+
+def test03_backoff_grows_to_maximum():
+    c = clock()
+    fetch = responses(*[response("pending")] * 5 + [response("ready")])
+    poller(c, initial=1, maximum=4, jitter=0, timeout=100).poll(fetch, is_ready)
+    assert c.sleeps == [1, 2, 4, 4, 4]
+
+
+def test04_jitter_stays_in_bounds():
+    c = clock()
+    fetch = responses(*[response("pending")] * 20 + [response("ready")])
+    poller(c, initial=2, maximum=2, jitter=0.25, timeout=100).poll(fetch, is_ready)
+    assert all(1.5 <= s <= 2.5 for s in c.sleeps)
+
+
+def test05_retry_after_honoured_and_capped():
+    c = clock()
+    fetch = responses(response("pending", "3"), response("pending", "500"), response("ready"))
+    poller(c, jitter=0, timeout=1000, max_retry_after=60).poll(fetch, is_ready)
+    assert c.sleeps == [3, 60]
+
+
+def test06_timeout_needs_both_checks_and_time():
+    c = clock()
+    with pytest.raises(AcmePollTimeout):
+        poller(c, initial=1, maximum=1, jitter=0, max_checks=3, timeout=10).poll(
+            lambda: response("pending"), is_ready
+        )
+    assert len(c.sleeps) == 10
+
+    c = clock()
+    with pytest.raises(AcmePollTimeout):
+        poller(c, maximum=0, max_checks=3, timeout=0).poll(lambda: response("pending"), is_ready)
+    assert c.sleeps == [0, 0]
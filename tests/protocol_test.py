@@ -0,0 +1,265 @@
+import asyncio, json, threading, time
+from unittest import mock
+
+import pytest
+
+from sewer.cleanup import CleanupQueue
+from sewer.clock import Deadline
+from sewer.lib import AcmeAuthorizationError, AcmeCancelledError
+from sewer.poll import Poller
+from sewer.protocol import AsyncDriver, Event, OrderProtocol, SyncDriver, Wait
+
+CA = "https://ca.test"
+CERT = "-----BEGIN CERTIFICATE-----\nsimulated\n-----END CERTIFICATE-----\n"
+
+
+class response:
+    def __init__(self, body=None, status_code=200, headers=None, content=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content if content is not None else json.dumps(body).encode()
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeCA:
+    "just enough of an ACME server to answer one order, keeping count of what it was asked"
+
+    def __init__(self, names, authz_status="pending", processing=0):
+        self.names = names
+        self.authz = dict((n, authz_status) for n in names)
+        self.processing = processing
+        self.order_status = "pending"
+        self.requests = []
+
+    def order(self):
+        return {
+            "status": self.order_status,
+            "authorizations": [CA + "/authz/" + n for n in self.names],
+            "finalize": CA + "/finalize",
+            "certificate": CA + "/cert" if self.order_status == "valid" else None,
+        }
+
+    def __call__(self, req):
+        self.requests.append(req)
+        path = req.url[len(CA) :]
+        if path == "/new-order":
+            return response(self.order(), 201, {"Location": CA + "/order"})
+        if path.startswith("/authz/"):
+            name = path[7:]
+            return response(
+                {
+                    "status": self.authz[name],
+                    "identifier": {"value": name},
+                    "challenges": [
+                        {"type": "dns-01", "token": "t-" + name, "url": CA + "/chal/" + name}
+                    ],
+                    "expires": "2999-01-01T00:00:00Z",
+                }
+            )
+        if path.startswith("/chal/"):
+            self.authz[path[6:]] = "valid"
+            return response({})
+        if path == "/order":
+            if self.order_status == "pending" and all(s == "valid" for s in self.authz.values()):
+                self.order_status = "ready"
+            elif self.order_status == "processing":
+                self.processing -= 1
+                if self.processing <= 0:
+                    self.order_status = "valid"
+            return response(self.order())
+        if path == "/finalize":
+            self.order_status = "processing" if self.processing else "valid"
+            return response(self.order(), headers={"Retry-After": "1"})
+        if path == "/cert":
+            return response(content=CERT.encode())
+        raise AssertionError("unexpected request %s" % req.url)
+
+
+def protocol(names, **kwargs):
+    return OrderProtocol(
+        directory={"newOrder": CA + "/new-order"},
+        identifiers=names,
+        chal_types=["dns-01"],
+        key_authorization=lambda token: token + ".thumb",
+        csr=b"csr",
+        poller=Poller(jitter=0),
+        **kwargs,
+    )
+
+
+def provider():
+    p = mock.Mock()
+    p.setup.return_value = p.clear.return_value = p.unpropagated.return_value = []
+    return p
+
+
+def test01_simulated_order_at_cpu_speed():
+    names = ["a.example", "b.example"]
+    ca, prov, events, sleeps = FakeCA(names, processing=2), provider(), [], []
+    driver = SyncDriver(send=ca, provider=prov, record=events.append, sleep=sleeps.append)
+    assert driver.run(protocol(names).issue()) == CERT
+
+    (setup_chals,) = prov.setup.call_args[0]
+    assert sorted(c["ident_value"] for c in setup_chals) == names
+    assert setup_chals[0]["key_auth"] == "t-a.example.thumb"
+    prov.clear.assert_called_once_with(setup_chals)
+    assert 1 in sleeps  # the finalize response's Retry-After
+    assert [e.name for e in events if e.name in ("order", "done")] == ["order", "done"]
+
+
+def test02_valid_authorizations_need_no_challenges():
+    names = ["a.example"]
+    ca, prov, events = FakeCA(names, authz_status="valid"), provider(), []
+    SyncDriver(send=ca, provider=prov, record=events.append, sleep=lambda s: None).run(
+        protocol(names).issue()
+    )
+    assert not prov.setup.called
+    assert (
+        Event(
+            "authz_valid",
+            {
+                "name": "a.example",
+                "url": CA + "/authz/a.example",
+                "expires": "2999-01-01T00:00:00Z",
+            },
+        )
+        in events
+    )
+
+
+def test03_known_valid_are_not_fetched():
+    names = ["a.example"]
+    ca = FakeCA(names, authz_status="valid")
+    SyncDriver(send=ca, provider=provider(), sleep=lambda s: None).run(
+        protocol(names, known_valid={CA + "/authz/a.example"}).issue()
+    )
+    assert CA + "/authz/a.example" not in [r.url for r in ca.requests]
+
+
+def test04_resume_from_journal():
+    names = ["a.example"]
+    ca, prov = FakeCA(names), provider()
+    ca.order_status = "ready"
+    orphans = [{"ident_value": "a.example"}]
+    journal = {
+        "order_url": CA + "/order",
+        "finalize_url": CA + "/finalize",
+        "authorizations": [CA + "/authz/a.example"],
+        "challenges": orphans,
+    }
+    SyncDriver(send=ca, provider=prov, sleep=lambda s: None).run(
+        protocol(names, journal=journal).issue()
+    )
+    prov.clear.assert_any_call(orphans)
+    assert CA + "/new-order" not in [r.url for r in ca.requests]
+    assert not prov.setup.called
+
+
+def test05_errors_still_clear_challenges():
+    names = ["a.example"]
+    ca, prov = FakeCA(names), provider()
+    prov.setup.return_value = [("failed", "", {})]
+    with pytest.raises(RuntimeError):
+        SyncDriver(send=ca, provider=prov, sleep=lambda s: None).run(protocol(names).issue())
+    assert prov.clear.call_args[0][0]
+
+
+def test06_async_driver():
+    names = ["a.example", "b.example", "c.example"]
+    ca, prov = FakeCA(names), provider()
+
+    async def send(req):
+        await asyncio.sleep(0)
+        return ca(req)
+
+    result = asyncio.run(AsyncDriver(send=send, provider=prov).run(protocol(names).issue()))
+    assert result == CERT
+
+
+def test07_parallel_failures_are_collected():
+    names = ["a.example", "b.example"]
+    ca = FakeCA(names)
+
+    def send(req):
+        if req.url.endswith("/authz/b.example"):
+            return response({}, status_code=404)
+        return ca(req)
+
+    with pytest.raises(AcmeAuthorizationError) as raised:
+        SyncDriver(send=send, provider=provider(), sleep=lambda s: None).run(
+            protocol(names).issue()
+        )
+    assert list(raised.value.errors) == [CA + "/authz/b.example"]
+
+
+def test08_streaming_does_not_wait_for_the_slowest():
+    names = ["slow.example", "a.example", "b.example"]
+    ca = FakeCA(names)
+    others_answered = threading.Event()
+    answered = []
+
+    def send(req):
+        if "/chal/" in req.url:
+            answered.append(req.url.rsplit("/", 1)[1])
+            if len(answered) == 2:
+                others_answered.set()
+        return ca(req)
+
+    def setup(chals):
+        assert len(chals) == 1
+        if chals[0]["ident_value"] == "slow.example":
+            # only a streaming pipeline gets the others answered while this one is stuck
+            assert others_answered.wait(5)
+        return []
+
+    prov = provider()
+    prov.setup.side_effect = setup
+    driver = SyncDriver(send=send, provider=prov, sleep=lambda s: None, max_workers=3)
+    assert driver.run(protocol(names, stream=True).issue()) == CERT
+    assert answered[-1] == "slow.example"
+    assert prov.setup.call_count == 3
+    (cleared,) = prov.clear.call_args[0]
+    assert sorted(c["ident_value"] for c in cleared) == sorted(names)
+
+
+def test09_prevalidate_stops_at_ready():
+    names = ["a.example"]
+    ca, prov, events = FakeCA(names), provider(), []
+    driver = SyncDriver(send=ca, provider=prov, record=events.append, sleep=lambda s: None)
+    order = driver.run(protocol(names).issue(finalize=False))
+    assert order["status"] == "ready" and order["order_url"] == CA + "/order"
+    assert CA + "/finalize" not in [r.url for r in ca.requests]
+    assert Event("journal", {"status": "ready"}) in events
+    assert "done" not in [e.name for e in events]
+    prov.clear.assert_called_once()
+
+
+@pytest.mark.parametrize("persistent", [False, True])
+def test10_deferred_challenges_handed_over(tmp_path, persistent):
+    names = ["a.example"]
+    ca, prov, events = FakeCA(names), provider(), []
+    queue = CleanupQueue(str(tmp_path) if persistent else None)
+    driver = SyncDriver(
+        send=ca, provider=prov, record=events.append, sleep=lambda s: None, cleanup=queue
+    )
+    assert driver.run(protocol(names).issue()) == CERT
+    assert queue.flush(5)
+    prov.clear.assert_called_once()
+    # whichever the queue, it has taken the challenges over from the journal
+    assert Event("journal", {"challenges": []}) in events
+
+
+def test11_async_wait_woken_by_cancel():
+    deadline = Deadline()
+
+    def step():
+        yield Wait(30)
+
+    threading.Timer(0.1, deadline.cancel, args=("stop",)).start()
+    driver = AsyncDriver(send=None, provider=provider(), deadline=deadline)
+    started = time.monotonic()
+    with pytest.raises(AcmeCancelledError, match="stop"):
+        asyncio.run(driver.run(step()))
+    assert time.monotonic() - started < 5
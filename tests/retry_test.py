@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from sewer.lib import AcmeBadNonceError, AcmeRateLimitedError, AcmeServerError
+from sewer.retry import RetryPolicy
+
+
+class response:
+    def __init__(self, status_code=200, ptype=None, headers=None):
+        self.status_code = status_code
+        body = {"type": "urn:ietf:params:acme:error:" + ptype, "detail": "x"} if ptype else {}
+        self.content = json.dumps(body).encode()
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class sender:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def policy(**kwargs):
+    sleeps = []
+    return RetryPolicy(sleep=sleeps.append, jitter=0, **kwargs), sleeps
+
+
+def test01_success_passes_through():
+    p, sleeps = policy()
+    send = sender(response(201))
+    assert p.run(send).status_code == 201
+    assert send.calls == 1 and sleeps == []
+
+
+def test02_bad_nonce_retried_without_sleep():
+    p, sleeps = policy()
+    send = sender(response(400, "badNonce"), response(400, "badNonce"), response(200))
+    assert p.run(send).status_code == 200
+    assert send.calls == 3 and sleeps == []
+
+
+def test03_bad_nonce_exhausted():
+    p, sleeps = policy(bad_nonce_retries=1)
+    with pytest.raises(AcmeBadNonceError):
+        p.run(sender(response(400, "badNonce"), response(400, "badNonce")))
+
+
+def test04_server_errors_back_off():
+    p, sleeps = policy(backoff=1, max_backoff=3)
+    send = sender(response(500), response(503, "serverInternal"), response(502), response(200))
+    assert p.run(send).status_code == 200
+    assert sleeps == [1, 2, 3]
+
+
+def test05_retry_after_used_and_bounded():
+    p, sleeps = policy(max_retry_after=60)
+    send = sender(response(429, "rateLimited", {"Retry-After": "5"}), response(200))
+    assert p.run(send).status_code == 200
+    assert sleeps == [5]
+    with pytest.raises(AcmeRateLimitedError):
+        p.run(sender(response(429, "rateLimited", {"Retry-After": "3600"})))
+
+
+def test06_server_error_exhausted():
+    p, sleeps = policy(max_retries=2)
+    with pytest.raises(AcmeServerError):
+        p.run(sender(response(500), response(500), response(500)))
+    assert len(sleeps) == 2
+
+
+def test07_other_problems_returned_to_caller():
+    p, sleeps = policy()
+    assert p.run(sender(response(403, "unauthorized"))).status_code == 403
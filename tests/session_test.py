@@ -0,0 +1,150 @@
+import base64, json
+from unittest import mock
+
+import pytest
+
+from sewer.client import Client
+from sewer.clock import Deadline, VirtualClock
+from sewer.crypto import AcmeAccount, AcmeKey
+from sewer.directory import clear_directory_caches
+from sewer.lib import AcmeDeadlineError
+from sewer.session import AcmeSession
+from sewer.tests.test_utils import ExmpleHttpProvider, MockResponse
+
+DIRECTORY_URL = "https://acme.session.test/directory"
+
+
+@pytest.fixture
+def acme():
+    clear_directory_caches()
+    with mock.patch("requests.Session.post", return_value=MockResponse()), mock.patch(
+        "requests.Session.get", return_value=MockResponse()
+    ), mock.patch("requests.Session.head", return_value=MockResponse()):
+        yield AcmeSession(
+            account=AcmeAccount.create("secp256r1"),
+            is_new_acct=True,
+            ACME_DIRECTORY_URL=DIRECTORY_URL,
+            LOG_LEVEL="CRITICAL",
+        )
+
+
+def order(acme, name):
+    return acme.order(
+        domain_name=name,
+        cert_key=AcmeKey.create("secp256r1"),
+        provider=ExmpleHttpProvider(),
+        ACME_AUTH_STATUS_WAIT_PERIOD=0,
+        LOG_LEVEL="CRITICAL",
+    )
+
+
+def test01_orders_share_session_state(acme):
+    c1 = order(acme, "one.example.com")
+    c2 = order(acme, "two.example.com")
+    assert isinstance(c1, Client)
+    assert c1.acme is acme and c2.acme is acme
+    assert c1.account is c2.account is acme.account
+
+
+def test02_many_orders_one_registration_one_directory_fetch(acme):
+    with mock.patch.object(acme, "_register", wraps=acme._register) as register:
+        for name in ("one.example.com", "two.example.com", "three.example.com"):
+            assert "BEGIN CERTIFICATE" in order(acme, name).get_certificate()
+    assert acme.account.has_kid()
+    # only the first call got past the has_kid check to actually post newAccount
+    assert register.call_count == 3
+    posts = [c[0][0] for c in acme.session.post.call_args_list]
+    assert posts.count(acme.ACME_NEW_ACCOUNT_URL) == 1
+    gets = [c[0][0] for c in acme.session.get.call_args_list]
+    assert gets.count(DIRECTORY_URL) == 1
+
+
+def test03_account_must_match_session(acme):
+    with pytest.raises(ValueError):
+        Client(
+            domain_name="example.com",
+            cert_key=AcmeKey.create("secp256r1"),
+            account=AcmeAccount.create("secp256r1"),
+            acme_session=acme,
+            provider=ExmpleHttpProvider(),
+        )
+
+
+def test04_session_requires_account():
+    with pytest.raises(TypeError):
+        AcmeSession(account="not an account")
+
+
+def test05_bad_nonce_resigned_with_nonce_from_error(acme):
+    bad = MockResponse(status_code=400)
+    bad.content_to_use_in_json_method = json.dumps(
+        {"type": "urn:ietf:params:acme:error:badNonce", "detail": "stale"}
+    ).encode()
+    bad.headers["Replay-Nonce"] = "fresh-from-error"
+    acme.account.kid = "https://acme.session.test/acct/1"
+    acme.nonces.clear()
+    acme.nonces.add(MockResponse())
+    with mock.patch("requests.Session.post", side_effect=[bad, MockResponse()]) as post:
+        assert acme.make_signed_acme_request("https://acme.session.test/x", "").status_code == 201
+    protected = json.loads(post.call_args_list[1][0][1])["protected"]
+    header = json.loads(base64.urlsafe_b64decode(protected + "=" * (-len(protected) % 4)))
+    assert header["nonce"] == "fresh-from-error"
+
+
+def test06_signed_request_is_flattened_jws(acme):
+    acme.account.kid = "https://acme.session.test/acct/1"
+    acme.nonces.clear()
+    acme.nonces.add(MockResponse())
+    with mock.patch("requests.Session.post", return_value=MockResponse()) as post:
+        acme.make_signed_acme_request("https://acme.session.test/y", '{"a":1}')
+    body = json.loads(post.call_args[0][1])
+    assert sorted(body) == ["payload", "protected", "signature"]
+
+    def decode(s):
+        return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+    header = json.loads(decode(body["protected"]))
+    assert header["kid"] == "https://acme.session.test/acct/1"
+    assert header["url"] == "https://acme.session.test/y"
+    assert header["alg"] == acme.account.key_desc.alg
+    assert json.loads(decode(body["payload"])) == {"a": 1}
+
+
+def test07_request_timeout_clipped_to_deadline(acme):
+    clock = VirtualClock()
+    deadline = Deadline(30, clock=clock)
+    acme.make_signed_acme_request("https://acme.session.test/x", "", True, deadline=deadline)
+    assert acme.session.post.call_args[1]["timeout"] == acme.ACME_REQUEST_TIMEOUT
+    clock.advance(28)
+    acme.make_signed_acme_request("https://acme.session.test/x", "", True, deadline=deadline)
+    assert acme.session.post.call_args[1]["timeout"] == 2
+    clock.advance(2)
+    with pytest.raises(AcmeDeadlineError):
+        acme.make_signed_acme_request("https://acme.session.test/x", "", True, deadline=deadline)
+
+
+def test08_new_nonce_handed_out_once(acme):
+    acme.directory
+    acme.nonces.clear()
+    heads = [MockResponse() for _ in range(4)]
+    for n, response in enumerate(heads):
+        response.headers["Replay-Nonce"] = "n%s" % n
+    with mock.patch("requests.Session.head", side_effect=heads) as head:
+        nonces = [acme.get_nonce() for _ in range(4)]
+    assert nonces == ["n0", "n1", "n2", "n3"]
+    assert head.call_count == 4
+    assert len(acme.nonces) == 0
+
+
+def test09_directory_and_new_nonce_clipped_to_deadline(acme):
+    clock = VirtualClock()
+    deadline = Deadline(30, clock=clock)
+    clock.advance(28)
+    acme.nonces.clear()
+    acme.get_nonce(deadline)
+    assert acme.session.get.call_args[1]["timeout"] == 2
+    assert acme.session.head.call_args[1]["timeout"] == 2
+    clock.advance(2)
+    acme.nonces.clear()
+    with pytest.raises(AcmeDeadlineError):
+        acme.get_nonce(deadline)
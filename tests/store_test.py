@@ -0,0 +1,113 @@
+import os, time
+from unittest import mock
+
+from sewer.crypto import AcmeAccount
+from sewer.directory import clear_directory_caches
+from sewer.session import AcmeSession
+from sewer.store import AccountStore, AuthzCache, OrderJournal, rfc3339
+from sewer.tests.test_utils import MockResponse
+
+URL = "https://acme.store.test/directory"
+KID = "https://acme.store.test/acct/1"
+
+
+def key_file(tmp_path, key_type="secp256r1"):
+    "a fresh account key in a pem file, so a test can read the same key more than once"
+
+    path = str(tmp_path / ("%s.pem" % key_type))
+    if not os.path.exists(path):
+        AcmeAccount.create(key_type).write_pem(path)
+    return path
+
+
+def test01_save_and_load_account(tmp_path):
+    store = AccountStore(str(tmp_path))
+    assert store.load(URL) is None
+
+    acct = AcmeAccount.read_pem(key_file(tmp_path))
+    acct.set_kid(KID, 1234.5)
+    store.save(URL, acct)
+
+    loaded = store.load(URL)
+    assert loaded.kid == KID and loaded._timestamp == 1234.5
+    assert loaded.thumbprint() == acct.thumbprint()
+    assert store.load("https://other.ca/directory") is None
+
+    (path,) = [p for p in (tmp_path / "accounts").rglob("*.json")]
+    assert os.stat(str(path)).st_mode & 0o077 == 0
+
+
+def test02_recall_sets_kid_by_thumbprint(tmp_path):
+    store = AccountStore(str(tmp_path))
+    acct = AcmeAccount.read_pem(key_file(tmp_path))
+    assert not store.recall(URL, acct)
+    acct.set_kid(KID)
+    store.save(URL, acct)
+
+    fresh = AcmeAccount.read_pem(key_file(tmp_path))
+    assert store.recall(URL, fresh) and fresh.kid == KID
+    other = AcmeAccount.read_pem(key_file(tmp_path, "secp384r1"))
+    assert not store.recall(URL, other)
+
+
+def test03_register_uses_and_updates_store(tmp_path):
+    clear_directory_caches()
+    store = AccountStore(str(tmp_path))
+    registered = MockResponse()
+    registered.headers["Location"] = KID
+    with mock.patch("requests.Session.post", return_value=registered) as post, mock.patch(
+        "requests.Session.get", return_value=MockResponse()
+    ), mock.patch("requests.Session.head", return_value=MockResponse()):
+        acct = AcmeAccount.read_pem(key_file(tmp_path))
+        AcmeSession(account=acct, ACME_DIRECTORY_URL=URL, account_store=store).register()
+        assert post.call_count == 1
+
+        again = AcmeAccount.read_pem(key_file(tmp_path))
+        AcmeSession(account=again, ACME_DIRECTORY_URL=URL, account_store=store).register()
+        assert post.call_count == 1
+        assert again.kid == KID
+
+
+def test04_authz_cache_expiry_and_persistence(tmp_path):
+    cache = AuthzCache(str(tmp_path), margin=60)
+    now = time.time()
+    cache.put(KID, "example.com", "https://acme.store.test/authz/1", now + 86400)
+    cache.put(KID, "*.example.com", "https://acme.store.test/authz/2", now + 30)
+    assert cache.get(KID, "example.com") == "https://acme.store.test/authz/1"
+    assert cache.get(KID, "*.example.com") is None  # inside the margin
+    assert cache.get("https://acme.store.test/acct/2", "example.com") is None
+
+    other_worker = AuthzCache(str(tmp_path))
+    assert other_worker.valid_urls(KID, ["example.com", "www.example.com"]) == {
+        "https://acme.store.test/authz/1"
+    }
+    other_worker.discard(KID, ["example.com"])
+    assert AuthzCache(str(tmp_path)).get(KID, "example.com") is None
+
+
+def test05_rfc3339():
+    assert rfc3339("1970-01-02T00:00:00Z") == 86400
+    assert rfc3339("1970-01-02T01:00:00.25+01:00") == 86400.25
+
+
+def test06_order_journal(tmp_path):
+    journal = OrderJournal(str(tmp_path))
+    record = journal.new(KID, ["www.example.com", "example.com"])
+    record["order_url"] = "https://acme.store.test/order/1"
+    journal.write(record)
+    assert journal.load(KID, ["example.com", "www.example.com"])["order_url"] == record["order_url"]
+    assert journal.load(KID, ["example.com"]) is None
+    journal.remove(record)
+    assert journal.load(KID, ["www.example.com", "example.com"]) is None
+
+
+def test07_order_journal_claim(tmp_path):
+    journal = OrderJournal(str(tmp_path))
+    claim = journal.claim(KID, ["example.com"])
+    assert claim is not None
+    assert journal.claim(KID, ["example.com"]) is None
+    other = journal.claim(KID, ["example.org"])
+    assert other is not None
+    journal.release(claim)
+    journal.release(journal.claim(KID, ["example.com"]))
+    journal.release(other)
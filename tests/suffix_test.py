@@ -0,0 +1,81 @@
+from unittest import mock
+
+import pytest
+
+from sewer import suffix
+from sewer.auth import DNSProviderBase
+from sewer.dns_providers.cloudns import _split_domain_name
+from sewer.dns_providers.gandi import GandiDns
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("example.com", ("", "example.com")),
+        ("a.b.example.com", ("a.b", "example.com")),
+        ("x.example.co.uk", ("x", "example.co.uk")),
+        ("_acme-challenge.www.Example.CO.UK.", ("_acme-challenge.www", "example.co.uk")),
+        ("*.example.com.au", ("", "example.com.au")),
+        # wildcard rule *.kawasaki.jp with exception !city.kawasaki.jp
+        ("a.b.kawasaki.jp", ("", "a.b.kawasaki.jp")),
+        ("x.city.kawasaki.jp", ("x", "city.kawasaki.jp")),
+        # no rule at all: the TLD alone is the suffix
+        ("www.example.notarealtld", ("www", "example.notarealtld")),
+        ("co.uk", ("", "co.uk")),
+    ],
+)
+def test01_split_domain(name, expected):
+    assert suffix.split_domain(name) == expected
+
+
+def test02_snapshot_loaded_once_and_offline():
+    with mock.patch("socket.socket", side_effect=AssertionError("network used")):
+        suffix.split_domain.cache_clear()
+        with mock.patch.object(suffix, "_trie", None), mock.patch(
+            "json.load", wraps=suffix.json.load
+        ) as load:
+            for name in ("a.example.co.uk", "b.example.co.uk", "a.example.org"):
+                suffix.split_domain(name)
+        assert load.call_count == 1
+
+
+def test03_compile_rules():
+    text = "\n".join(
+        [
+            "// ===BEGIN ICANN DOMAINS===",
+            "uk",
+            "co.uk",
+            "*.ck",
+            "!www.ck",
+            "// ===END ICANN DOMAINS===",
+            "// ===BEGIN PRIVATE DOMAINS===",
+            "github.io",
+            "// ===END PRIVATE DOMAINS===",
+        ]
+    )
+    assert suffix.compile_rules(text) == {
+        "uk": {"": 1, "co": {"": 1}},
+        "ck": {"*": {"": 1}, "www": {"!": 1}},
+    }
+
+
+def test04_drivers_use_registered_domain():
+    assert DNSProviderBase().zone_for("_acme-challenge.www.example.co.uk") == "example.co.uk"
+    assert _split_domain_name("www.example.co.uk") == ("example.co.uk", "_acme-challenge.www")
+    assert GandiDns.split_domain("example.co.uk") == ["@", "example.co.uk"]
+
+
+def test05_snapshot_records_version(tmp_path, capsys):
+    suffix.main([])
+    assert capsys.readouterr().out.strip() == suffix.snapshot_version() != "unknown"
+
+    src, dest = tmp_path / "list.dat", tmp_path / "suffix.json"
+    src.write_text("// VERSION: 2024-01-02_03-04-05_UTC\n// ===BEGIN ICANN DOMAINS===\nuk\n")
+    suffix.main([str(src), str(dest)])
+    assert suffix.snapshot_version(str(dest)) == "2024-01-02_03-04-05_UTC"
+    suffix.main([str(src), str(dest), "20240102.0304-1"])
+    assert suffix.snapshot_version(str(dest)) == "20240102.0304-1"
+
+    src.write_text("// ===BEGIN ICANN DOMAINS===\nuk\n")
+    with pytest.raises(SystemExit):
+        suffix.main([str(src), str(dest)])
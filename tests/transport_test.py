@@ -0,0 +1,56 @@
+import threading
+from unittest import mock
+
+from sewer.auth import DNSProviderBase
+from sewer.transport import close_shared_sessions, new_session, shared_session
+
+
+def test01_new_session_pool_and_retries():
+    session = new_session(pool_size=7, retries=3)
+    adapter = session.get_adapter("https://acme.example/directory")
+    assert adapter._pool_maxsize == 7
+    assert adapter.max_retries.total == 3
+    assert "POST" not in adapter.max_retries.allowed_methods
+
+
+def test02_shared_session_per_host():
+    close_shared_sessions()
+    s1 = shared_session("https://acme.example/directory")
+    s2 = shared_session("https://acme.example/acme/new-order")
+    s3 = shared_session("https://other.example/directory")
+    s4 = shared_session("https://acme.example/directory", pool_size=20)
+    assert s1 is s2
+    assert s1 is not s3
+    assert s1 is not s4
+    close_shared_sessions()
+    assert shared_session("https://acme.example/directory") is not s1
+
+
+def test03_shared_session_threads_agree():
+    close_shared_sessions()
+    got = []
+    threads = [
+        threading.Thread(target=lambda: got.append(shared_session("https://acme.example/")))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(id(s) for s in got)) == 1
+
+
+def test04_provider_session_timeout_and_retries():
+    p = DNSProviderBase(max_concurrency=16, http_timeout=20, http_retries=4)
+    session = p.http
+    assert p.http is session
+    adapter = session.get_adapter("https://api.dns.example/zones")
+    assert adapter._pool_maxsize == 16
+    assert adapter.max_retries.total == 4
+    assert {"PUT", "DELETE"} <= adapter.max_retries.allowed_methods
+    assert not {"POST", "PATCH"} & adapter.max_retries.allowed_methods
+
+    with mock.patch("requests.Session.send") as send:
+        session.get("https://api.dns.example/zones")
+        session.get("https://api.dns.example/zones", timeout=3)
+    assert [call[1]["timeout"] for call in send.call_args_list] == [20, 3]
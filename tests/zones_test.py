@@ -0,0 +1,83 @@
+from unittest import mock
+
+from sewer.auth import DNSProviderBase
+from sewer.clock import VirtualClock
+from sewer.zones import ZoneIndex
+
+ZONES = {"example.com": "Z1", "sub.example.com.": "Z2", "example.org": "Z3"}
+
+
+def test01_longest_suffix_match():
+    index = ZoneIndex(lambda: ZONES)
+    assert index.lookup("_acme-challenge.www.example.com") == ("example.com", "Z1")
+    assert index.lookup("_acme-challenge.a.sub.example.com.") == ("sub.example.com", "Z2")
+    assert index.lookup("SUB.Example.COM") == ("sub.example.com", "Z2")
+    assert index.lookup("example.org") == ("example.org", "Z3")
+    assert index.lookup("xexample.com") is None
+
+
+def test02_listed_once_until_ttl_expires():
+    list_zones = mock.Mock(return_value=ZONES)
+    clock = VirtualClock()
+    index = ZoneIndex(list_zones, ttl=600, clock=clock)
+    for name in ("a.example.com", "b.example.com", "c.example.org"):
+        index.lookup(name)
+    assert list_zones.call_count == 1
+    clock.advance(600)
+    index.lookup("a.example.com")
+    assert list_zones.call_count == 2
+
+
+def test03_miss_relists_once():
+    listings = [{"example.com": "Z1"}, {"example.com": "Z1", "example.net": "Z4"}]
+    list_zones = mock.Mock(side_effect=lambda: listings.pop(0))
+    clock = VirtualClock()
+    index = ZoneIndex(list_zones, miss_ttl=60, clock=clock)
+    assert index.lookup("a.example.com") == ("example.com", "Z1")
+    assert index.lookup("a.example.net") is None
+    clock.advance(60)
+    assert index.lookup("a.example.net") == ("example.net", "Z4")
+    assert list_zones.call_count == 2
+
+
+def test04_persisted_listing_used_by_later_run(tmp_path):
+    path = str(tmp_path / "zones.json")
+    clock = VirtualClock()
+    ZoneIndex(lambda: ZONES, path=path, clock=clock).lookup("example.com")
+
+    list_zones = mock.Mock(return_value=ZONES)
+    later = ZoneIndex(list_zones, ttl=600, path=path, clock=clock)
+    assert later.lookup("www.sub.example.com") == ("sub.example.com", "Z2")
+    assert not list_zones.called
+    clock.advance(600)
+    later.lookup("www.sub.example.com")
+    assert list_zones.call_count == 1
+
+
+def test05_provider_zone_for_uses_index():
+    class Listed(DNSProviderBase):
+        list_zones = mock.Mock(return_value=ZONES)
+
+        def setup_record(self, target, chal):
+            pass
+
+    p = Listed()
+    chals = [{"ident_value": name, "key_auth": "k"} for name in ("a.sub.example.com", "x.net")]
+    assert p.zone_for("_acme-challenge.a.sub.example.com") == "Z2"
+    errata = p.setup(chals)
+    assert [(status, chal) for status, _, chal in errata] == [
+        ("failed", chals[1]),
+        ("skipped", chals[0]),
+    ]
+    assert Listed.list_zones.call_count == 1
+
+
+def test06_misses_relist_at_most_once_per_miss_ttl():
+    list_zones = mock.Mock(return_value=ZONES)
+    clock = VirtualClock()
+    index = ZoneIndex(list_zones, miss_ttl=60, clock=clock)
+    assert index.lookup("www.example.com") == ("example.com", "Z1")
+    clock.advance(60)
+    for name in ("a.example.net", "b.example.net", "c.example.net"):
+        assert index.lookup(name) is None
+    assert list_zones.call_count == 2